@@ -1,7 +1,41 @@
 # Initialize agent package
-from .agent import SalesAgent
-from .data_handler import DataHandler
-from .session_manager import SessionManager
-from .utils import generate_lead_id, simulate_time_advance
+from importlib import import_module
 
-__all__ = ['SalesAgent', 'DataHandler', 'SessionManager', 'generate_lead_id', 'simulate_time_advance']
\ No newline at end of file
+# Exports are resolved on first access (PEP 562), so importing the package
+# does not load the storage stack until something actually uses it
+_EXPORTS = {
+    'SalesAgent': '.agent',
+    'AsyncSalesAgent': '.async_agent',
+    'ResponseDispatcher': '.dispatcher',
+    'DataHandler': '.data_handler',
+    'SessionManager': '.session_manager',
+    'Session': '.session_manager',
+    'Flow': '.flow',
+    'OutboundQueue': '.channels',
+    'Message': '.channels',
+    'ConsoleChannel': '.channels',
+    'MemoryChannel': '.channels',
+    'FileChannel': '.channels',
+    'RateLimiter': '.rate_limit',
+    'DeferredQueue': '.rate_limit',
+    'IdempotencyCache': '.idempotency',
+    'IntentClassifier': '.intent',
+    'LeadConflictError': '.storage',
+    'lead_etag': '.storage',
+    'generate_lead_id': '.utils',
+    'simulate_time_advance': '.utils',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,17 +1,63 @@
-from typing import Dict, Optional, List
+from typing import Any, Dict, Optional, List, Tuple
+import logging
 import threading
 import time
 from datetime import datetime, timedelta
+from .channels import Channel, ConsoleChannel, Message, OutboundQueue
 from .data_handler import DataHandler
-from .session_manager import SessionManager
+from .idempotency import MISSING, IdempotencyCache
+from .intent import IntentClassifier
+from .rate_limit import DeferredQueue, RateLimiter
+from .session_manager import Session, SessionManager
+
+logger = logging.getLogger(__name__)
+
+# New session (None ends it), lead column updates and reply of one turn
+Turn = Optional[Tuple[Optional[Session], Dict[str, str], Optional[str]]]
 
 class SalesAgent:
-    def __init__(self, data_file: str = 'leads.csv'):
-        self.data_handler = DataHandler(data_file)
-        self.session_manager = SessionManager()
+    # Hours a lead may leave the consent prompt unanswered before its
+    # session is dropped and the lead marked no_response
+    initial_ttl_hours = 72
+
+    def __init__(self, data_file: str = 'leads.csv',
+                 session_options: Optional[Dict[str, Any]] = None,
+                 channel: Optional[Channel] = None,
+                 outbox_options: Optional[Dict[str, Any]] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 reply_cache: Optional[IdempotencyCache] = None,
+                 intent_classifier: Optional[IntentClassifier] = None, **storage_options):
+        """Create an agent storing leads in ``data_file``.
+
+        ``session_options`` are passed to SessionManager (e.g. ``shards``,
+        ``max_resident`` or ``initial_ttl_hours``, which defaults to
+        ``SalesAgent.initial_ttl_hours``; None keeps such sessions). Messages to leads go
+        out through ``channel`` (printed to the console by default) from a
+        background OutboundQueue configured by ``outbox_options``. With a
+        ``rate_limiter`` follow-ups beyond its limits wait in
+        ``follow_ups`` and go out on later checks. ``reply_cache`` holds
+        the replies to messages handled with a ``message_id``, and
+        ``intent_classifier`` reads consent from replies to the opening
+        message. Remaining keyword arguments configure lead storage through
+        DataHandler.
+        """
+        self.data_handler = DataHandler(data_file, **storage_options)
+        self.session_manager = SessionManager(**{
+            'initial_ttl_hours': self.initial_ttl_hours, **(session_options or {})})
+        self.outbox = OutboundQueue(channel or ConsoleChannel(), **(outbox_options or {}))
+        self.follow_ups = DeferredQueue(rate_limiter) if rate_limiter else None
+        self.reply_cache = reply_cache or IdempotencyCache()
+        self.intents = intent_classifier or IntentClassifier()
         self.running = False
+        self._closed = False
         self.follow_up_thread = None
-        self.follow_up_interval = 60  # seconds between follow-up checks
+        self.follow_up_hours = 24  # inactivity before a follow-up is sent
+        # Optional cap in seconds between follow-up checks; by default the
+        # monitor sleeps until the next session deadline
+        self.follow_up_interval: Optional[float] = None
+        self._wakeup = threading.Condition()
+        self._woken = False
+        self.session_manager.on_deadline = self._deadline_moved
 
     def start(self):
         """Start the agent and follow-up monitoring."""
@@ -24,25 +70,83 @@ class SalesAgent:
 
     def stop(self):
         """Stop the agent and clean up."""
+        self.outbox.flush()
+        self.data_handler.flush()
+        self.session_manager.flush()
         if not self.running:
             return
         
-        self.running = False
+        with self._wakeup:
+            self.running = False
+            self._wakeup.notify_all()
         if self.follow_up_thread and self.follow_up_thread.is_alive():
             self.follow_up_thread.join()
         print("Sales Agent stopped.")
 
+    def close(self):
+        """Stop the agent and release its threads, files and journal.
+
+        The agent cannot be used afterwards; closing it again does nothing.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.stop()
+        self.outbox.close()
+        self.data_handler.close()
+        self.session_manager.close()
+
+    def __enter__(self) -> 'SalesAgent':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     def _start_follow_up_monitor(self):
-        """Start a background thread to monitor for follow-ups."""
+        """Start a background thread to monitor for follow-ups.
+
+        The thread sleeps until the earliest session deadline, or until
+        activity schedules an earlier one or ``stop()`` is called.
+        """
         def follow_up_monitor():
             while self.running:
                 self.check_for_follow_ups()
-                time.sleep(self.follow_up_interval)
+                with self._wakeup:
+                    # Deadlines moved during the check are in next_deadline
+                    self._woken = False
+                deadline = self.session_manager.next_deadline(self.follow_up_hours)
+                with self._wakeup:
+                    self._wakeup.wait_for(
+                        lambda: not self.running or self._woken,
+                        self._seconds_until(deadline))
 
         self.follow_up_thread = threading.Thread(target=follow_up_monitor)
         self.follow_up_thread.daemon = True
         self.follow_up_thread.start()
 
+    def _seconds_until(self, deadline: Optional[datetime]) -> Optional[float]:
+        """Monitor sleep before ``deadline``, or None to wait for a wakeup.
+
+        Deferred follow-ups shorten the sleep to when the rate limiter
+        lets the next one through.
+        """
+        waits = []
+        if deadline is not None:
+            waits.append(max((deadline - datetime.now()).total_seconds(), 0))
+        if self.follow_ups is not None:
+            retry = self.follow_ups.retry_after()
+            if retry is not None:
+                waits.append(retry)
+        if self.follow_up_interval is not None:
+            waits.append(self.follow_up_interval)
+        return min(waits, default=None)
+
+    def _deadline_moved(self):
+        """Wake the follow-up monitor to reschedule."""
+        with self._wakeup:
+            self._woken = True
+            self._wakeup.notify_all()
+
     def trigger_agent(self, lead_id: str, name: str) -> bool:
         """Trigger the agent for a new lead."""
         if not lead_id or not name:
@@ -57,89 +161,169 @@ class SalesAgent:
         self.session_manager.create_session(lead_id, {'name': name})
         
         # Send initial message
-        initial_message = (
+        self.outbox.send(Message(lead_id, name, self._initial_message(name)))
+        
+        return True
+
+    def trigger_agents(self, batch: List[Tuple[str, str]]) -> List[str]:
+        """Trigger the agent for many ``(lead_id, name)`` pairs at once.
+
+        Leads are stored with one batched write, sessions are created in
+        bulk and the initial messages go out together. Returns the ids of
+        the leads that were triggered.
+        """
+        names = {lead_id: name for lead_id, name in batch if lead_id and name}
+        added = self.data_handler.add_leads(names.items())
+        skipped = len(names) - len(added)
+        if skipped:
+            print(f"{skipped} leads already exist")
+
+        self.session_manager.create_sessions(
+            {lead_id: {'name': names[lead_id]} for lead_id in added}
+        )
+
+        self.outbox.send_many(
+            Message(lead_id, names[lead_id], self._initial_message(names[lead_id]))
+            for lead_id in added
+        )
+        return added
+
+    @staticmethod
+    def _initial_message(name: str) -> str:
+        """Opening message asking a lead for consent."""
+        return (
             f"Hey {name}, thank you for filling out the form. "
             "I'd like to gather some information from you. Is that okay?"
         )
-        print(f"Message sent to {name} (ID: {lead_id}): {initial_message}")
-        
-        return True
 
-    def handle_response(self, lead_id: str, response: str) -> Optional[str]:
-        """Handle a lead's response and return the next message if any."""
+    def handle_response(self, lead_id: str, response: str,
+                        message_id: Optional[str] = None) -> Optional[str]:
+        """Handle a lead's response and return the next message if any.
+
+        A turn is one unit of work: the session is read once, the new
+        session and the lead's column updates are worked out in memory,
+        and then the lead is written with a single storage update and the
+        session committed with a single call. A lead missing from storage
+        leaves the session untouched.
+
+        With a ``message_id`` a redelivered message gets the reply computed
+        the first time, from ``reply_cache``, without touching storage or
+        the session. Deliveries of one lead are expected one at a time, as
+        ResponseDispatcher and AsyncSalesAgent guarantee.
+        """
         if not lead_id or not response:
             return None
-        
-        lead_data = self.data_handler.get_lead(lead_id)
-        if not lead_data:
-            return None
-        
+
+        if message_id is None:
+            return self._handle_turn(lead_id, response)
+        key = (lead_id, message_id)
+        reply = self.reply_cache.get(key)
+        if reply is MISSING:
+            reply = self._handle_turn(lead_id, response)
+            self.reply_cache.put(key, reply)
+        return reply
+
+    def _handle_turn(self, lead_id: str, response: str) -> Optional[str]:
+        """Run one conversation turn."""
         session = self.session_manager.get_session(lead_id)
         if not session:
             return None
         
         # Handle initial consent
         if session['state'] == 'initial':
-            return self._handle_initial_response(lead_id, lead_data, session, response)
+            turn = self._handle_initial_response(session, response)
         
         # Handle question responses
         elif session['state'] == 'questioning':
-            return self._handle_question_response(lead_id, lead_data, session, response)
-        
-        return None
-
-    def _handle_initial_response(self, lead_id: str, lead_data: Dict, 
-                               session: Dict, response: str) -> Optional[str]:
-        """Handle the initial consent response."""
-        if response.lower() in ['yes', 'y', 'sure', 'ok', 'okay']:
-            self.session_manager.update_session(lead_id, {'state': 'questioning'})
-            self.data_handler.update_lead(lead_id, {'status': 'in_progress'})
-            next_question = self.session_manager.get_next_question(lead_id)
-            if next_question:
-                return next_question['text']
+            turn = self._handle_question_response(session, response)
+
         else:
-            self.data_handler.update_lead(lead_id, {'status': 'no_response'})
-            self.session_manager.end_session(lead_id)
-            return "Alright, no problem. Have a great day!"
-        return None
+            return None
+
+        if turn is None:
+            return None
+        next_session, updates, reply = turn
+        if not self.data_handler.update_lead(lead_id, updates):
+            return None
+        self.session_manager.commit_session(lead_id, next_session)
+        if self.follow_ups is not None:
+            # The lead is talking again; a deferred nudge would be stale
+            self.follow_ups.discard(lead_id)
+        return reply
+
+    def _handle_initial_response(self, session: Session, response: str) -> Turn:
+        """Handle the initial consent response.
 
-    def _handle_question_response(self, lead_id: str, lead_data: Dict,
-                                session: Dict, response: str) -> Optional[str]:
+        A lead asking to be contacted later stays at the consent prompt;
+        anything that is not consent or deferral counts as a refusal.
+        """
+        intent = self.intents.classify_one(response)
+        if intent == 'consent':
+            next_session = self.session_manager.advance(
+                session.replace(state='questioning', last_activity=datetime.now()))
+            next_question = self.session_manager.question(next_session)
+            return (next_session, {'status': 'in_progress'},
+                    next_question['text'] if next_question else None)
+
+        if intent == 'deferral':
+            return (session.replace(last_activity=datetime.now()), {'status': 'pending'},
+                    "No problem, just reply whenever you're ready.")
+
+        return (None, {'status': 'no_response'},
+                "Alright, no problem. Have a great day!")
+
+    def _handle_question_response(self, session: Session, response: str) -> Turn:
         """Handle responses to questions."""
         current_question = session['current_question']
         if not current_question:
             return None
         
-        # Record the answer
-        self.session_manager.record_answer(lead_id, current_question, response)
-        
+        # Record the answer and move on; the flow may branch on the answer
+        next_session = self.session_manager.advance(
+            session.with_answer(current_question, response, datetime.now()))
+        next_question = self.session_manager.question(next_session)
+
         # Update data storage
         updates = {current_question: response}
-        if current_question == 'interest':  # Last question
-            updates['status'] = 'secured'
-        self.data_handler.update_lead(lead_id, updates)
-        
-        # Get next question
-        next_question = self.session_manager.get_next_question(lead_id)
         if next_question:
-            return next_question['text']
-        else:
-            self.session_manager.end_session(lead_id)
-            return "Thank you for providing all the information! We'll be in touch soon."
+            return next_session, updates, next_question['text']
+
+        # Last question
+        updates['status'] = 'secured'
+        return (None, updates,
+                "Thank you for providing all the information! We'll be in touch soon.")
 
     def check_for_follow_ups(self):
         """Check for leads that need follow-up messages."""
-        inactive_sessions = self.session_manager.check_inactive_sessions(hours=24)
-        
-        for lead_id, session in inactive_sessions.items():
-            lead_data = self.data_handler.get_lead(lead_id)
-            if lead_data and lead_data['status'] == 'in_progress':
-                # Send follow-up message
-                follow_up = (
-                    "Just checking in to see if you're still interested. "
-                    "Let me know when you're ready to continue."
-                )
-                print(f"Follow-up sent to {lead_data['name']} (ID: {lead_id}): {follow_up}")
-                
-                # Update last activity to prevent immediate follow-up
-                self.session_manager.update_session(lead_id, {})
\ No newline at end of file
+        # Leads that never answered the consent prompt within the TTL
+        expired = self.session_manager.expire_sessions()
+        if expired:
+            self.data_handler.update_leads(
+                {lead_id: {'status': 'no_response'} for lead_id in expired})
+            print(f"Consent prompt expired for {len(expired)} leads")
+
+        start = time.perf_counter()
+        inactive_sessions = self.session_manager.check_inactive_sessions(
+            hours=self.follow_up_hours)
+
+        # One batched lookup, filtered by status inside the store
+        due = self.data_handler.get_leads(inactive_sessions, status='in_progress')
+        follow_up = (
+            "Just checking in to see if you're still interested. "
+            "Let me know when you're ready to continue."
+        )
+        messages = [Message(lead_id, lead_data['name'], follow_up, 'follow_up')
+                    for lead_id, lead_data in due.items()]
+        if self.follow_ups is not None:
+            # Send what the rate limits allow; the rest drains on later ticks
+            self.follow_ups.add(messages)
+            messages = self.follow_ups.drain()
+        self.outbox.send_many(messages)
+
+        # Update last activity to prevent immediate follow-up; leads that
+        # got none are rescheduled too so the monitor does not spin on them
+        self.session_manager.touch_sessions(inactive_sessions)
+        logger.info("Follow-up sweep: %d candidates, %d follow-ups in %.3fs",
+                    len(inactive_sessions), len(due), time.perf_counter() - start)
+        if self.follow_ups is not None and len(self.follow_ups):
+            logger.info("Follow-up backlog: %d deferred", len(self.follow_ups))
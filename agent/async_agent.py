@@ -0,0 +1,174 @@
+import asyncio
+import weakref
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .agent import SalesAgent
+from .data_handler import DataHandler
+from .session_manager import SessionManager
+
+class AsyncSalesAgent:
+    """SalesAgent for use inside an asyncio event loop.
+
+    Every call that may touch storage runs on a thread pool, so the loop
+    keeps serving other conversations while a lead is read or written.
+    Turns of the same lead are serialized with a per-lead lock; different
+    leads proceed concurrently, bounded by the pool size.
+
+    The conversation logic is the synchronous SalesAgent's, which this
+    class wraps rather than reimplements, so both agents behave the same.
+    Follow-up checks run as an asyncio task that sleeps until the next
+    session deadline and that ``stop()`` cancels immediately.
+    """
+
+    def __init__(self, data_file: str = 'leads.csv',
+                 session_options: Optional[Dict[str, Any]] = None,
+                 executor: Optional[Executor] = None, max_workers: Optional[int] = None,
+                 **storage_options):
+        """Create an agent storing leads in ``data_file``.
+
+        ``executor`` runs the blocking calls; by default the agent owns a
+        ThreadPoolExecutor with ``max_workers`` threads. Other arguments are
+        those of SalesAgent.
+        """
+        self.agent = SalesAgent(data_file, session_options=session_options,
+                                **storage_options)
+        self.follow_up_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._max_workers = max_workers
+        self._lead_locks: 'weakref.WeakValueDictionary[str, asyncio.Lock]' = \
+            weakref.WeakValueDictionary()
+
+    @property
+    def data_handler(self) -> DataHandler:
+        """Lead storage of the wrapped agent."""
+        return self.agent.data_handler
+
+    @property
+    def session_manager(self) -> SessionManager:
+        """Conversation state of the wrapped agent."""
+        return self.agent.session_manager
+
+    @property
+    def running(self) -> bool:
+        """Whether the follow-up task is active."""
+        return self.follow_up_task is not None and not self.follow_up_task.done()
+
+    async def start(self):
+        """Start follow-up monitoring as a task on the running loop."""
+        if self.running:
+            return
+
+        self._wakeup = asyncio.Event()
+        self.session_manager.on_deadline = partial(
+            self._deadline_moved, asyncio.get_running_loop(), self._wakeup)
+        self.follow_up_task = asyncio.create_task(self._follow_up_monitor())
+        print("Sales Agent started and monitoring for follow-ups...")
+
+    async def stop(self):
+        """Cancel follow-up monitoring and flush messages and storage."""
+        was_running = self.running
+        if self.follow_up_task is not None:
+            self.follow_up_task.cancel()
+            try:
+                await self.follow_up_task
+            except asyncio.CancelledError:
+                pass
+            self.follow_up_task = None
+            self.session_manager.on_deadline = self.agent._deadline_moved
+
+        await self._run(self.agent.outbox.flush)
+        await self._run(self.agent.data_handler.flush)
+        await self._run(self.agent.session_manager.flush)
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if was_running:
+            print("Sales Agent stopped.")
+
+    async def close(self):
+        """Stop and release the wrapped agent's threads, files and journal.
+
+        Leaving an ``async with`` block closes the agent; closing it again
+        does nothing.
+        """
+        if self.agent._closed:
+            return
+        await self.stop()
+        await asyncio.get_running_loop().run_in_executor(None, self.agent.close)
+
+    async def __aenter__(self) -> 'AsyncSalesAgent':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def trigger_agent(self, lead_id: str, name: str) -> bool:
+        """Trigger the agent for a new lead."""
+        async with self._lead_lock(lead_id):
+            return await self._run(self.agent.trigger_agent, lead_id, name)
+
+    async def trigger_agents(self, batch: List[Tuple[str, str]]) -> List[str]:
+        """Trigger the agent for many ``(lead_id, name)`` pairs at once."""
+        return await self._run(self.agent.trigger_agents, batch)
+
+    async def handle_response(self, lead_id: str, response: str,
+                              message_id: Optional[str] = None) -> Optional[str]:
+        """Handle a lead's response and return the next message if any.
+
+        A repeated ``message_id`` gets the first delivery's reply.
+        """
+        async with self._lead_lock(lead_id):
+            return await self._run(self.agent.handle_response, lead_id, response,
+                                   message_id)
+
+    async def check_for_follow_ups(self):
+        """Check for leads that need follow-up messages."""
+        await self._run(self.agent.check_for_follow_ups)
+
+    async def _follow_up_monitor(self):
+        """Check for follow-ups whenever the next session deadline passes.
+
+        Scheduling follows the wrapped agent's ``follow_up_hours`` and
+        ``follow_up_interval``.
+        """
+        while True:
+            await self.check_for_follow_ups()
+            self._wakeup.clear()
+            deadline = await self._run(self.session_manager.next_deadline,
+                                       self.agent.follow_up_hours)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(),
+                                       self.agent._seconds_until(deadline))
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    def _deadline_moved(loop: asyncio.AbstractEventLoop, wakeup: asyncio.Event):
+        """Wake the follow-up task from whichever thread moved a deadline."""
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            pass  # the loop has been closed
+
+    def _lead_lock(self, lead_id: str) -> asyncio.Lock:
+        """Lock serializing the turns of one lead.
+
+        Locks live only while some coroutine holds or waits for them.
+        """
+        lock = self._lead_locks.get(lead_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._lead_locks[lead_id] = lock
+        return lock
+
+    async def _run(self, func: Callable, *args) -> Any:
+        """Run a blocking call on the executor."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                thread_name_prefix='sales-agent')
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args))
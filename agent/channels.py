@@ -0,0 +1,210 @@
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+class Message(NamedTuple):
+    """One outbound message to a lead."""
+    lead_id: str
+    name: str
+    text: str
+    kind: str = 'message'  # 'message' or 'follow_up'
+    enqueued_at: float = 0.0  # time.perf_counter() when queued
+
+class Channel(Protocol):
+    """Delivery backend used by OutboundQueue.
+
+    ``send_batch`` delivers every message or raises; a raised batch is
+    retried as a whole, so delivery is at least once.
+    """
+
+    def send_batch(self, messages: List[Message]):
+        """Deliver a batch of messages."""
+
+class ConsoleChannel:
+    """Print messages to stdout, the way SalesAgent always reported them."""
+
+    PREFIXES = {'message': "Message sent to", 'follow_up': "Follow-up sent to"}
+
+    def send_batch(self, messages: List[Message]):
+        """Print the batch with a single write."""
+        print('\n'.join(
+            f"{self.PREFIXES.get(message.kind, 'Message sent to')} "
+            f"{message.name} (ID: {message.lead_id}): {message.text}"
+            for message in messages
+        ))
+
+class MemoryChannel:
+    """Keep delivered messages in a list; a stand-in for tests."""
+
+    def __init__(self):
+        self.sent: List[Message] = []
+        self.batches = 0
+
+    def send_batch(self, messages: List[Message]):
+        """Record the batch."""
+        self.sent.extend(messages)
+        self.batches += 1
+
+class FileChannel:
+    """Append messages as JSON lines to a local file."""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def send_batch(self, messages: List[Message]):
+        """Append the batch with a single write."""
+        lines = ''.join(
+            json.dumps({'lead_id': message.lead_id, 'name': message.name,
+                        'kind': message.kind, 'text': message.text}) + '\n'
+            for message in messages
+        )
+        with open(self.file_path, 'a', encoding='utf-8') as file:
+            file.write(lines)
+
+# Queue item telling the sender to exit
+_STOP = None
+
+class OutboundQueue:
+    """Bounded queue of outbound messages drained by a background sender.
+
+    ``send`` only enqueues, so callers never wait on delivery. The sender
+    thread coalesces queued messages into batches of up to ``batch_size``,
+    waiting at most ``batch_window`` seconds for a batch to fill, and
+    hands each batch to the channel. A failing batch is retried up to
+    ``retries`` times with jittered exponential backoff before it is
+    dropped and counted as failed. When ``max_queue`` messages are
+    waiting, ``send`` blocks until the sender catches up.
+
+    Delivery latency (enqueue to successful send) of the last
+    ``latency_window`` messages is kept for the percentiles in
+    ``metrics()``.
+    """
+
+    def __init__(self, channel: Channel, max_queue: int = 10000,
+                 batch_size: int = 100, batch_window: float = 0.05,
+                 retries: int = 5, backoff: float = 0.05,
+                 latency_window: int = 10000):
+        if max_queue < 1 or batch_size < 1:
+            raise ValueError("max_queue and batch_size must be at least 1")
+        self.channel = channel
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.retries = retries
+        self.backoff = backoff
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max_queue)
+        self._latencies: deque = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._stats = {'sent': 0, 'failed': 0, 'batches': 0, 'retries': 0}
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def send(self, message: Message, timeout: Optional[float] = None):
+        """Queue a message for delivery.
+
+        Blocks while the queue is full; with a ``timeout`` raises
+        ``queue.Full`` if no room frees up in time.
+        """
+        self.send_many([message], timeout=timeout)
+
+    def send_many(self, messages: Iterable[Message], timeout: Optional[float] = None):
+        """Queue several messages in order."""
+        if self._closed:
+            raise RuntimeError("Outbound queue is closed")
+        self._ensure_sender()
+        now = time.perf_counter()
+        for message in messages:
+            self._queue.put(message._replace(enqueued_at=now), timeout=timeout)
+
+    def flush(self):
+        """Wait until every queued message was delivered or given up on."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Deliver what is queued and stop the sender."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def metrics(self) -> Dict[str, float]:
+        """Delivery counters, queue depth and latency percentiles in seconds."""
+        with self._lock:
+            metrics = dict(self._stats)
+            latencies = sorted(self._latencies)
+        metrics['queued'] = self._queue.qsize()
+        for percentile in (50, 95, 99):
+            metrics[f'latency_p{percentile}'] = (
+                latencies[min(len(latencies) - 1, len(latencies) * percentile // 100)]
+                if latencies else 0.0
+            )
+        return metrics
+
+    def _ensure_sender(self):
+        """Start the sender thread on first use."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name='sales-outbound')
+                self._thread.start()
+
+    def _run(self):
+        """Collect batches and deliver them until stopped."""
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.task_done()
+                return
+
+            batch = [first]
+            stop = False
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    message = (self._queue.get(timeout=remaining) if remaining > 0
+                               else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                if message is _STOP:
+                    stop = True
+                    break
+                batch.append(message)
+
+            self._deliver(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _deliver(self, batch: List[Message]):
+        """Send one batch, retrying with backoff."""
+        for attempt in range(self.retries + 1):
+            try:
+                self.channel.send_batch(batch)
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception("Dropping %d outbound messages after %d attempts",
+                                     len(batch), attempt + 1)
+                    with self._lock:
+                        self._stats['failed'] += len(batch)
+                    return
+                with self._lock:
+                    self._stats['retries'] += 1
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            else:
+                now = time.perf_counter()
+                with self._lock:
+                    self._stats['sent'] += len(batch)
+                    self._stats['batches'] += 1
+                    self._latencies.extend(now - message.enqueued_at for message in batch)
+                return
@@ -1,90 +1,211 @@
-import csv
-import os
-from typing import Dict, Optional, List
-import pandas as pd
+import random
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, Optional, List, Tuple
+from .storage import (
+    LEAD_COLUMNS, LeadConflictError, LeadStore, TimestampLike, create_store,
+    format_timestamp, lead_etag, typed_frame
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 class DataHandler:
-    def __init__(self, file_path: str = 'leads.csv'):
+    COLUMNS = LEAD_COLUMNS
+
+    def __init__(self, file_path: str = 'leads.csv', backend: Optional[str] = None,
+                 **options):
+        """Create a handler for the leads table.
+
+        ``backend`` selects the storage implementation (``'csv'`` or
+        ``'sqlite'``); by default it follows the file extension, so
+        ``leads.db`` uses SQLite and anything else the CSV store. Remaining
+        keyword arguments are passed to the backend, e.g. ``in_memory`` or
+        ``journal`` for CSV files.
+        """
         self.file_path = file_path
-        self._ensure_file_exists()
-
-    def _ensure_file_exists(self):
-        """Ensure the CSV file exists with the correct headers."""
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, 'w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow([
-                    'lead_id', 'name', 'age', 'country', 
-                    'interest', 'status', 'last_updated'
-                ])
+        self.store: LeadStore = create_store(file_path, backend, **options)
 
     def add_lead(self, lead_id: str, name: str) -> bool:
         """Add a new lead with initial information."""
         if not lead_id or not name:
             return False
-        
-        df = self._read_data()
-        
-        if lead_id in df['lead_id'].values:
-            return False
-        
-        new_data = {
-            'lead_id': [lead_id],
-            'name': [name],
-            'age': [None],
-            'country': [None],
-            'interest': [None],
-            'status': ['pending'],
-            'last_updated': [pd.Timestamp.now()]
-        }
-        
-        new_df = pd.DataFrame(new_data)
-        df = pd.concat([df, new_df], ignore_index=True)
-        self._write_data(df)
-        return True
-
-    def update_lead(self, lead_id: str, updates: Dict[str, str]) -> bool:
-        """Update lead information."""
+
+        return self.store.add(self._new_row(lead_id, name))
+
+    def update_lead(self, lead_id: str, updates: Dict[str, str],
+                    expected_etag: Optional[str] = None) -> bool:
+        """Update lead information.
+
+        Pass the ``lead_etag`` of the row you read as ``expected_etag`` to get
+        ``LeadConflictError`` instead of overwriting someone else's change.
+        """
         if not lead_id or not updates:
             return False
-        
-        df = self._read_data()
-        
-        if lead_id not in df['lead_id'].values:
-            return False
-        
-        for column, value in updates.items():
-            if column in df.columns:
-                df.loc[df['lead_id'] == lead_id, column] = value
-        
+
+        values = {column: value for column, value in updates.items()
+                  if column in self.COLUMNS}
         # Always update the timestamp
-        df.loc[df['lead_id'] == lead_id, 'last_updated'] = pd.Timestamp.now()
-        
-        self._write_data(df)
-        return True
+        values['last_updated'] = self._now()
+        return self.store.update(lead_id, values, expected_etag=expected_etag)
+
+    def modify_lead(self, lead_id: str,
+                    modify: Callable[[Dict[str, str]], Optional[Dict[str, str]]],
+                    retries: int = 5, backoff: float = 0.01) -> bool:
+        """Read-modify-write a lead with optimistic concurrency.
+
+        ``modify`` receives the current row and returns the updates to apply
+        (or nothing to leave the lead alone). If another writer changes the
+        lead in between, the row is re-read and ``modify`` called again after
+        a jittered exponential backoff, up to ``retries`` times before
+        ``LeadConflictError`` propagates.
+        """
+        for attempt in range(retries + 1):
+            lead_data = self.get_lead(lead_id)
+            if lead_data is None:
+                return False
+
+            updates = modify(dict(lead_data))
+            if not updates:
+                return True
+            try:
+                return self.update_lead(lead_id, updates,
+                                        expected_etag=lead_etag(lead_data))
+            except LeadConflictError:
+                if attempt == retries:
+                    raise
+                time.sleep(random.uniform(0, backoff * 2 ** attempt))
+        return False
 
     def get_lead(self, lead_id: str) -> Optional[Dict[str, str]]:
         """Get lead information."""
         if not lead_id:
             return None
-        
-        df = self._read_data()
-        lead_data = df[df['lead_id'] == lead_id]
-        
-        if lead_data.empty:
-            return None
-        
-        return lead_data.iloc[0].to_dict()
+
+        return self.store.get(lead_id)
 
     def get_all_leads(self) -> Dict[str, Dict[str, str]]:
         """Get all leads information."""
-        df = self._read_data()
-        return {row['lead_id']: row.to_dict() for _, row in df.iterrows()}
+        return self.store.get_all()
+
+    def iter_leads(self, chunksize: int = 10000) -> Iterator[Dict[str, str]]:
+        """Stream every lead as a dict without materializing the table.
+
+        CSV files are read ``chunksize`` rows at a time, so memory stays
+        constant however large the file grows.
+        """
+        if chunksize < 1:
+            raise ValueError("chunksize must be positive")
+
+        return self.store.iter_rows(chunksize)
+
+    def leads_frame(self, columns: Optional[List[str]] = None) -> 'pd.DataFrame':
+        """Get leads as a typed DataFrame holding only ``columns``.
+
+        ``age`` is nullable ``Int64``, ``last_updated`` a datetime and
+        status, country and interest are categoricals.
+        """
+        columns = list(columns or self.COLUMNS)
+        unknown = set(columns) - set(self.COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown lead columns: {sorted(unknown)}")
 
-    def _read_data(self) -> pd.DataFrame:
-        """Read the CSV data."""
-        return pd.read_csv(self.file_path)
+        return typed_frame(self.store.frame(columns))
+
+    def add_leads(self, leads: Iterable[Tuple[str, str]]) -> List[str]:
+        """Add many ``(lead_id, name)`` pairs with one storage write.
+
+        Leads that already exist, or repeat within the batch, are skipped.
+        Returns the ids that were added.
+        """
+        rows = [self._new_row(lead_id, name) for lead_id, name in leads
+                if lead_id and name]
+        if not rows:
+            return []
+
+        return self.store.add_many(rows)
+
+    def update_leads(self, updates: Dict[str, Dict[str, str]]) -> List[str]:
+        """Apply updates for many leads with one storage write.
+
+        Returns the ids that existed and were updated.
+        """
+        now = self._now()
+        values = {
+            lead_id: {**{column: value for column, value in lead_updates.items()
+                         if column in self.COLUMNS},
+                      'last_updated': now}
+            for lead_id, lead_updates in updates.items()
+            if lead_id and lead_updates
+        }
+        if not values:
+            return []
+
+        return self.store.update_many(values)
+
+    def get_leads(self, lead_ids: Iterable[str], **criteria) -> Dict[str, Dict[str, str]]:
+        """Get many leads with one storage read; unknown ids are omitted.
+
+        Column values in ``criteria`` narrow the result inside the store,
+        e.g. ``get_leads(ids, status='in_progress')``.
+        """
+        unknown = set(criteria) - set(self.COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown lead columns: {sorted(unknown)}")
+
+        lead_ids = [lead_id for lead_id in lead_ids if lead_id]
+        if not lead_ids:
+            return {}
+
+        return self.store.get_many(lead_ids, **criteria)
+
+    def query(self, updated_before: Optional[TimestampLike] = None,
+              updated_after: Optional[TimestampLike] = None,
+              **criteria) -> Dict[str, Dict[str, str]]:
+        """Get leads matching all given column values.
+
+        For example ``query(status='secured', interest='Cloud')`` or
+        ``query(status='in_progress', updated_before=cutoff)``. The
+        ``last_updated`` bounds are exclusive. Stores that keep leads in
+        memory answer from secondary indexes on status, country, interest
+        and last_updated.
+        """
+        unknown = set(criteria) - set(self.COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown lead columns: {sorted(unknown)}")
+
+        if updated_before is not None:
+            updated_before = format_timestamp(updated_before)
+        if updated_after is not None:
+            updated_after = format_timestamp(updated_after)
+        return self.store.query(updated_before=updated_before,
+                                updated_after=updated_after, **criteria)
+
+    def flush(self):
+        """Persist any writes the backend is still buffering."""
+        self.store.flush()
+
+    def close(self):
+        """Flush and release the storage backend."""
+        self.store.close()
+
+    def metrics(self) -> Dict[str, float]:
+        """Storage lock contention, optimistic-conflict and I/O counters."""
+        return self.store.metrics()
+
+    def _new_row(self, lead_id: str, name: str) -> Dict:
+        """Build the initial record for a lead."""
+        return {
+            'lead_id': lead_id,
+            'name': name,
+            'age': float('nan'),
+            'country': float('nan'),
+            'interest': float('nan'),
+            'status': 'pending',
+            'last_updated': self._now()
+        }
 
-    def _write_data(self, df: pd.DataFrame):
-        """Write data to CSV."""
-        df.to_csv(self.file_path, index=False)
\ No newline at end of file
+    @staticmethod
+    def _now() -> str:
+        """Timestamp in the format written to storage."""
+        return format_timestamp(datetime.now())
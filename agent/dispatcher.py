@@ -0,0 +1,156 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .agent import SalesAgent
+
+# Queue item telling a worker to exit
+_STOP = None
+
+class _Worker:
+    """One thread with its own bounded queue of replies to handle."""
+
+    def __init__(self, index: int, agent: SalesAgent, queue_size: int):
+        self.index = index
+        self.agent = agent
+        self.queue: 'queue.Queue' = queue.Queue(maxsize=queue_size)
+        self.handled = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.busy_seconds = 0.0
+        self.thread = threading.Thread(target=self._run, daemon=True,
+                                       name=f"sales-dispatch-{index}")
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            lead_id, response, message_id, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            start = time.perf_counter()
+            try:
+                reply = self.agent.handle_response(lead_id, response, message_id)
+            except Exception as error:
+                self.errors += 1
+                future.set_exception(error)
+            else:
+                self.handled += 1
+                future.set_result(reply)
+            self.busy_seconds += time.perf_counter() - start
+
+class ResponseDispatcher:
+    """Handle lead replies on a pool of worker threads.
+
+    Each lead is hashed to one worker, so the replies of a lead are
+    handled strictly in the order they were submitted while different
+    leads proceed in parallel. Every worker has a bounded queue; when it
+    is full ``submit`` blocks (or times out), pushing back on the producer
+    instead of buffering without limit.
+
+    Workers are threads rather than processes: conversation state lives
+    in the agent's in-process SessionManager, which worker processes
+    could not share.
+    """
+
+    def __init__(self, agent: SalesAgent, workers: int = 4, queue_size: int = 1000):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        self.agent = agent
+        self._workers = [_Worker(index, agent, queue_size) for index in range(workers)]
+        # Guards ``running`` and counts submits in progress, so stop() only
+        # queues the exit marker behind every accepted reply
+        self._state = threading.Condition()
+        self._submitting = 0
+        self._started_at: Optional[float] = None
+        self._stopped_at: Optional[float] = None
+        self.running = False
+
+    def start(self):
+        """Start the worker threads."""
+        with self._state:
+            if self.running:
+                return
+            if self._stopped_at is not None:
+                raise RuntimeError("A stopped dispatcher cannot be restarted")
+            self.running = True
+            self._started_at = time.perf_counter()
+            for worker in self._workers:
+                worker.thread.start()
+
+    def stop(self, wait: bool = True):
+        """Stop accepting replies and let workers finish what is queued.
+
+        With ``wait`` the call returns once every queued reply is handled.
+        """
+        with self._state:
+            if not self.running:
+                return
+            self.running = False
+            self._state.wait_for(lambda: self._submitting == 0)
+            self._stopped_at = time.perf_counter()
+        for worker in self._workers:
+            worker.queue.put(_STOP)
+        if wait:
+            for worker in self._workers:
+                worker.thread.join()
+
+    def __enter__(self) -> 'ResponseDispatcher':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def submit(self, lead_id: str, response: str,
+               callback: Optional[Callable[[Future], Any]] = None,
+               timeout: Optional[float] = None,
+               message_id: Optional[str] = None) -> Future:
+        """Queue a reply and return a Future of the agent's answer.
+
+        ``callback`` is called with the future once it is done and
+        ``message_id`` is passed on to ``handle_response``. Blocks
+        while the lead's worker queue is full; with a ``timeout`` raises
+        ``queue.Full`` if no room frees up in time.
+        """
+        with self._state:
+            if not self.running:
+                raise RuntimeError("Dispatcher is not running")
+            self._submitting += 1
+        try:
+            worker = self._workers[hash(lead_id) % len(self._workers)]
+            future: Future = Future()
+            if callback is not None:
+                future.add_done_callback(callback)
+            worker.queue.put((lead_id, response, message_id, future), timeout=timeout)
+            worker.max_depth = max(worker.max_depth, worker.queue.qsize())
+            return future
+        finally:
+            with self._state:
+                self._submitting -= 1
+                self._state.notify_all()
+
+    def handle_responses(self, messages: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """Handle ``(lead_id, response)`` pairs and return the replies in order."""
+        futures = [self.submit(lead_id, response) for lead_id, response in messages]
+        return [future.result() for future in futures]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-worker counters, queue depth and throughput in replies/s."""
+        if self._started_at is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._stopped_at or time.perf_counter()) - self._started_at
+        return [{
+            'worker': worker.index,
+            'handled': worker.handled,
+            'errors': worker.errors,
+            'queue_depth': worker.queue.qsize(),
+            'max_queue_depth': worker.max_depth,
+            'busy_seconds': worker.busy_seconds,
+            'throughput': worker.handled / elapsed if elapsed else 0.0,
+        } for worker in self._workers]
@@ -0,0 +1,102 @@
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+# Step index meaning "no more questions"
+END = -1
+
+# The questionnaire SalesAgent has always asked
+DEFAULT_STEPS = [
+    {'key': 'age', 'text': 'What is your age?'},
+    {'key': 'country', 'text': 'Which country are you from?'},
+    {'key': 'interest', 'text': 'What product or service are you interested in?'}
+]
+
+StepSpec = Mapping[str, Any]
+
+class Flow:
+    """A questionnaire compiled into a transition table.
+
+    Each step is a mapping with the answer ``key`` it collects and the
+    ``text`` to ask. By default a step leads to the one listed after it.
+    ``next`` names another step's key (or ``'end'``) to jump to instead,
+    and ``branches`` maps answers, compared case-insensitively, to the
+    step that follows them:
+
+        {'key': 'budget', 'text': 'Budget? (A/B/C)',
+         'branches': {'a': 'end', 'c': 'timeline'}}
+
+    Jumping forward skips the steps in between. Steps whose key a session
+    already has an answer for are skipped as well. Transitions are
+    resolved to step indexes once, so advancing a session is a couple of
+    dict lookups however long the flow is.
+    """
+
+    def __init__(self, steps: Iterable[StepSpec]):
+        steps = [dict(step) for step in steps]
+        if not steps:
+            raise ValueError("A flow needs at least one step")
+
+        keys = [step['key'] for step in steps]
+        if len(set(keys)) != len(keys):
+            raise ValueError("Flow step keys must be unique")
+        index = {key: position for position, key in enumerate(keys)}
+        index['end'] = END
+
+        def resolve(target: str, source: str) -> int:
+            if target not in index:
+                raise ValueError(f"Step {source!r} leads to unknown step {target!r}")
+            return index[target]
+
+        self.keys: Tuple[str, ...] = tuple(keys)
+        self.questions: Tuple[Mapping[str, str], ...] = tuple(
+            MappingProxyType({'key': step['key'], 'text': step['text']})
+            for step in steps
+        )
+        self._default: List[int] = []
+        self._branches: List[Dict[str, int]] = []
+        for position, step in enumerate(steps):
+            following = position + 1 if position + 1 < len(steps) else END
+            self._default.append(resolve(step['next'], step['key'])
+                                 if 'next' in step else following)
+            self._branches.append({
+                self._normalize(answer): resolve(target, step['key'])
+                for answer, target in step.get('branches', {}).items()
+            })
+
+    @property
+    def start(self) -> int:
+        """Index of the first step."""
+        return 0
+
+    def question(self, step: int) -> Mapping[str, str]:
+        """Read-only question (``key`` and ``text``) of a step."""
+        return self.questions[step]
+
+    def advance(self, step: Optional[int], answers: Mapping[str, Any]) -> int:
+        """Step to ask next for a session at ``step`` with ``answers``.
+
+        ``step`` is None for a session that has not been asked anything.
+        Steps are followed for as long as their key is already answered; a
+        loop of answered steps ends the flow.
+        """
+        step = self.start if step is None else step
+        for _ in range(len(self.keys)):
+            if step == END or self.keys[step] not in answers:
+                return step
+            answer = answers[self.keys[step]]
+            step = self._branches[step].get(self._normalize(answer),
+                                            self._default[step])
+        return step if step == END or self.keys[step] not in answers else END
+
+    @staticmethod
+    def _normalize(answer: Any) -> str:
+        """Branch lookup form of an answer."""
+        return str(answer).strip().lower()
+
+def compile_flow(flow: Union['Flow', Iterable[StepSpec], None]) -> Flow:
+    """Return ``flow`` compiled, or the default flow for None."""
+    if flow is None:
+        return Flow(DEFAULT_STEPS)
+    if isinstance(flow, Flow):
+        return flow
+    return Flow(flow)
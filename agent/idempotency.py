@@ -0,0 +1,102 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Marks a lookup that found nothing, since None is a valid cached reply
+MISSING = object()
+
+class IdempotencyCache:
+    """Bounded cache of replies keyed by inbound message id.
+
+    Entries expire ``ttl`` seconds after they were stored and the least
+    recently used ones are evicted beyond ``max_entries``, so memory stays
+    bounded however many messages pass through. Hits, misses and an
+    estimate of the memory held are reported by ``metrics()``.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_entries < 1 or ttl <= 0:
+            raise ValueError("max_entries must be at least 1 and ttl positive")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """Cached value of ``key``, or ``MISSING``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                self._drop(key)
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        """Store ``value`` for ``key``, evicting old entries as needed."""
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._bytes += self._size(key, value)
+            self._expire()
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        """Forget every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def metrics(self) -> Dict[str, float]:
+        """Hit rate, entry count and approximate memory in bytes."""
+        with self._lock:
+            metrics = dict(self._stats)
+            lookups = metrics['hits'] + metrics['misses']
+            metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0.0
+            metrics['entries'] = len(self._entries)
+            metrics['memory_bytes'] = self._bytes
+            return metrics
+
+    def _expire(self):
+        """Drop expired entries from the old end; the caller holds the lock.
+
+        Only the least recently used entries are looked at, so a stale
+        entry that was recently read waits for its own lookup or eviction.
+        """
+        now = self.clock()
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            self._drop(key)
+            self._stats['expired'] += 1
+
+    def _drop(self, key: Hashable):
+        """Remove one entry; the caller holds the lock."""
+        _, value = self._entries.pop(key)
+        self._bytes -= self._size(key, value)
+
+    @staticmethod
+    def _size(key: Hashable, value: Any) -> int:
+        """Approximate bytes held by one entry."""
+        size = sys.getsizeof(key) + sys.getsizeof(value) + 64  # entry tuple and slot
+        if isinstance(key, tuple):
+            size += sum(sys.getsizeof(part) for part in key)
+        return size
@@ -0,0 +1,278 @@
+"""Classify lead replies as consent, refusal or deferral.
+
+Replies are turned into hashed word and character n-gram features and
+scored by a one-vs-rest logistic model. The model is trained offline with
+scikit-learn from ``agent/data/intents.csv``:
+
+    python -m agent.intent train
+
+which writes the weights of the features seen in training to
+``agent/data/intent_model.json``. That file ships with the package, so
+classifying needs neither scikit-learn nor training at run time: a reply
+costs one pass over its n-grams and a few dictionary lookups.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from operator import mul
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+DATA_PATH = os.path.join(DATA_DIR, 'intents.csv')
+MODEL_PATH = os.path.join(DATA_DIR, 'intent_model.json')
+
+INTENTS = ('consent', 'refusal', 'deferral')
+# Replies that are none of the above (an answer, a question, noise); also
+# returned when no intent reaches the classifier's ``min_confidence``
+UNKNOWN = 'unknown'
+
+# Layout version of the saved model file
+MODEL_VERSION = 2
+# Size of the hashed feature space
+N_FEATURES = 2 ** 18
+
+_SPACES = re.compile(r'\s+')
+_EDGE_PUNCTUATION = '.,!?;:"\'()[] '
+
+def normalize(text: str) -> str:
+    """Cache and model form of a reply: lower case, single spaces, no edge punctuation."""
+    return _SPACES.sub(' ', str(text).lower()).strip(_EDGE_PUNCTUATION)
+
+# CRC-32 states after the word and character n-gram namespace prefixes;
+# continuing from them hashes prefix + gram without building the string
+_WORD_SEED = zlib.crc32(b'w ')
+_CHAR_SEED = zlib.crc32(b'c ')
+
+def _hashes(text: str) -> List[int]:
+    """Hashed n-grams of a normalized reply, repeats included.
+
+    Word unigrams and bigrams plus character 2-4 grams of each space
+    padded word, hashed with CRC-32 so indexes are stable across runs.
+    """
+    crc32, mask = zlib.crc32, N_FEATURES - 1
+    words = text.encode('utf-8').split()
+    hashes = [crc32(word, _WORD_SEED) & mask for word in words]
+    hashes += [crc32(first + b' ' + second, _WORD_SEED) & mask
+               for first, second in zip(words, words[1:])]
+    for word in words:
+        padded = b' ' + word + b' '
+        length = len(padded)
+        hashes += [crc32(padded[start:start + size], _CHAR_SEED) & mask
+                   for size in (2, 3, 4) for start in range(length - size + 1)]
+    return hashes
+
+def features(text: str) -> Dict[int, float]:
+    """L2-normalized hashed n-gram counts of a normalized reply."""
+    counts = Counter(_hashes(text))
+    norm = math.sqrt(sum(count * count for count in counts.values()))
+    return {index: count / norm for index, count in counts.items()}
+
+def load_examples(data_path: str = DATA_PATH) -> Tuple[List[str], List[str]]:
+    """Read ``(texts, intents)`` from a CSV with ``text`` and ``intent`` columns."""
+    texts, intents = [], []
+    with open(data_path, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            if row['intent'] not in INTENTS + (UNKNOWN,):
+                raise ValueError(f"Unknown intent {row['intent']!r} in {data_path}")
+            texts.append(normalize(row['text']))
+            intents.append(row['intent'])
+    return texts, intents
+
+class IntentModel:
+    """Weights of a trained one-vs-rest logistic model over ``features``.
+
+    Only features seen in training have weights, so unseen n-grams cost a
+    failed lookup and the model stays small.
+    """
+
+    def __init__(self, classes: List[str], intercept: List[float],
+                 weights: Dict[int, List[float]]):
+        self.classes = list(classes)
+        self.intercept = list(intercept)
+        self.weights = weights
+
+    def probabilities(self, text: str) -> List[float]:
+        """Probability of each of ``classes`` for a normalized reply.
+
+        Equals scoring ``features(text)``: the weight rows of every n-gram
+        occurrence are summed column-wise and scaled by the norm of the
+        counts once, which keeps the per-gram work in C.
+        """
+        hashes = _hashes(text)
+        rows = [row for row in map(self.weights.get, hashes) if row is not None]
+        if not rows:
+            scores = self.intercept
+        else:
+            counts = Counter(hashes).values()
+            scale = 1 / math.sqrt(sum(map(mul, counts, counts)))
+            scores = [bias + sum(column) * scale
+                      for bias, column in zip(self.intercept, zip(*rows))]
+        # Per-class sigmoids rescaled to sum to one, as scikit-learn does
+        # for one-vs-rest linear models
+        sigmoids = [1 / (1 + math.exp(-min(max(score, -50.0), 50.0))) for score in scores]
+        total = sum(sigmoids)
+        return [sigmoid / total for sigmoid in sigmoids]
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Most likely class of a normalized reply and its probability."""
+        probabilities = self.probabilities(text)
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        return self.classes[best], probabilities[best]
+
+def train(data_path: str = DATA_PATH) -> IntentModel:
+    """Fit a model on the examples in ``data_path``; needs scikit-learn."""
+    from scipy.sparse import csr_matrix
+    from sklearn.linear_model import SGDClassifier
+
+    texts, intents = load_examples(data_path)
+    rows = [features(text) for text in texts]
+    values, indexes, offsets = [], [], [0]
+    for row in rows:
+        indexes.extend(row)
+        values.extend(row.values())
+        offsets.append(len(indexes))
+    matrix = csr_matrix((values, indexes, offsets), shape=(len(rows), N_FEATURES))
+
+    estimator = SGDClassifier(loss='log_loss', alpha=1e-4, max_iter=200, tol=1e-4,
+                              random_state=0).fit(matrix, intents)
+    seen = sorted({index for row in rows for index in row})
+    return IntentModel([str(label) for label in estimator.classes_],
+                       [float(value) for value in estimator.intercept_],
+                       {index: [float(value) for value in estimator.coef_[:, index]]
+                        for index in seen})
+
+def save_model(model: IntentModel, model_path: str = MODEL_PATH):
+    """Write a trained model as JSON."""
+    payload = {
+        'version': MODEL_VERSION,
+        'n_features': N_FEATURES,
+        'classes': model.classes,
+        'intercept': [round(value, 6) for value in model.intercept],
+        'weights': {str(index): [round(value, 6) for value in row]
+                    for index, row in sorted(model.weights.items())},
+    }
+    tmp_path = f"{model_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(payload, file, separators=(',', ':'))
+        file.write('\n')
+    os.replace(tmp_path, model_path)
+
+_models: Dict[str, IntentModel] = {}
+_models_lock = threading.Lock()
+
+def load_model(model_path: str = MODEL_PATH) -> Optional[IntentModel]:
+    """Read a model written by ``save_model``, or None if unusable here.
+
+    Models are read once per path and shared, since they never change.
+    """
+    with _models_lock:
+        model = _models.get(model_path)
+        if model is not None:
+            return model
+        try:
+            with open(model_path, encoding='utf-8') as file:
+                payload = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if (payload.get('version') != MODEL_VERSION or
+                payload.get('n_features') != N_FEATURES):
+            return None
+        model = IntentModel(payload['classes'], payload['intercept'],
+                            {int(index): row for index, row in payload['weights'].items()})
+        _models[model_path] = model
+        return model
+
+class IntentClassifier:
+    """Batch intent classification with an LRU cache of normalized replies.
+
+    Most replies are a handful of common strings ("yes", "ok", "later"),
+    so they are answered from the cache; the rest are scored directly from
+    the model's weights. The model is loaded when the classifier is
+    created, and only trained there if no saved model can be read.
+    """
+
+    def __init__(self, model: Optional[IntentModel] = None, model_path: str = MODEL_PATH,
+                 cache_size: int = 4096, min_confidence: float = 0.5):
+        self.model_path = model_path
+        self.cache_size = cache_size
+        self.min_confidence = min_confidence
+        self.model = model or load_model(model_path) or train()
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[str, str]' = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def classify(self, texts: Iterable[str]) -> List[str]:
+        """Intent of each text, in order; ``UNKNOWN`` when unsure."""
+        keys = [normalize(text) for text in texts]
+        intents: Dict[str, str] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    intents[key] = self._cache[key]
+                    self._stats['hits'] += 1
+                else:
+                    self._stats['misses'] += 1
+
+        missing = [key for key in dict.fromkeys(keys) if key not in intents]
+        if missing:
+            predicted = {key: self._predict(key) for key in missing}
+            intents.update(predicted)
+            with self._lock:
+                for key, intent in predicted.items():
+                    self._cache[key] = intent
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [intents[key] for key in keys]
+
+    def classify_one(self, text: str) -> str:
+        """Intent of a single text."""
+        return self.classify([text])[0]
+
+    def metrics(self) -> Dict[str, float]:
+        """Cache hits, misses, hit rate and size."""
+        with self._lock:
+            metrics = dict(self._stats)
+            metrics['cached'] = len(self._cache)
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0.0
+        return metrics
+
+    def _predict(self, key: str) -> str:
+        """Score one normalized text."""
+        if not key:
+            return UNKNOWN
+        intent, probability = self.model.predict(key)
+        return intent if probability >= self.min_confidence else UNKNOWN
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Train or try the reply intent model.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    train_parser = commands.add_parser('train', help="fit the model and save it")
+    train_parser.add_argument('--data', default=DATA_PATH)
+    train_parser.add_argument('--output', default=MODEL_PATH)
+    classify_parser = commands.add_parser('classify', help="classify replies")
+    classify_parser.add_argument('texts', nargs='+')
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        texts, intents = load_examples(args.data)
+        model = train(args.data)
+        correct = sum(model.predict(text)[0] == intent for text, intent in zip(texts, intents))
+        save_model(model, args.output)
+        print(f"Trained on {len(texts)} examples (training accuracy "
+              f"{correct / len(texts):.1%}); saved to {args.output}")
+    else:
+        classifier = IntentClassifier()
+        for text, intent in zip(args.texts, classifier.classify(args.texts)):
+            print(f"{intent:>9}  {text}")
+
+if __name__ == '__main__':
+    main()
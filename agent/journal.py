@@ -0,0 +1,62 @@
+import json
+import os
+from typing import Any, Callable, Dict, Iterator
+
+def compacting_path(journal_path: str) -> str:
+    """Where a journal is rotated to while its snapshot is written."""
+    return f"{journal_path}.compacting"
+
+def read_journal(path: str, decode: Callable[[bytes], Any] = json.loads) -> Iterator[Dict]:
+    """Yield every complete record of a JSON-lines journal file.
+
+    Reading stops at the first torn or unreadable record and the file is
+    truncated there, so a crash mid-append loses only that record.
+    """
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'rb') as file:
+        content = file.read()
+
+    offset = 0
+    while offset < len(content):
+        end = content.find(b'\n', offset)
+        if end == -1:
+            break
+        try:
+            record = decode(content[offset:end])
+        except ValueError:
+            break
+        yield record
+        offset = end + 1
+
+    if offset < len(content):
+        with open(path, 'r+b') as file:
+            file.truncate(offset)
+
+def recover_journal(journal_path: str, apply: Callable[[Dict], None],
+                    open_journal: Callable[[], int],
+                    write_snapshot: Callable[[], None],
+                    decode: Callable[[bytes], Any] = json.loads) -> int:
+    """Replay a journal over its snapshot and reopen it for appending.
+
+    Records of a journal rotated by an unfinished compaction are applied
+    first, then the live journal's. ``open_journal`` returns the appending
+    file descriptor; when a compaction was interrupted ``write_snapshot``
+    is called to save the recovered state and the journal is emptied.
+    Returns the file descriptor.
+    """
+    rotated_path = compacting_path(journal_path)
+    interrupted = os.path.exists(rotated_path)
+    for path in (rotated_path, journal_path):
+        for record in read_journal(path, decode):
+            apply(record)
+    fd = open_journal()
+
+    if interrupted:
+        # A compaction died before its snapshot landed; finish it now
+        write_snapshot()
+        os.ftruncate(fd, 0)
+        if os.path.exists(rotated_path):
+            os.remove(rotated_path)
+    return fd
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+from .channels import Message
+
+class TokenBucket:
+    """``rate`` tokens per second, accumulating up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        """Add the tokens earned since the last refill."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available, as of the last refill."""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+class RateLimiter:
+    """Global plus per-destination token buckets.
+
+    A send needs a token from the global bucket and, when
+    ``destination_rate`` is set, one from its destination's bucket; tokens
+    are only taken when both have one. Destination buckets are created on
+    first use; once many exist, those that have refilled are dropped, so
+    idle destinations cost nothing.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None,
+                 destination_rate: Optional[float] = None,
+                 destination_burst: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._global = TokenBucket(rate, burst or max(rate, 1), clock())
+        self.destination_rate = destination_rate
+        self.destination_burst = destination_burst or max(destination_rate or 1, 1)
+        self._destinations: Dict[Hashable, TokenBucket] = {}
+
+    def try_acquire(self, destination: Hashable) -> bool:
+        """Take a token for ``destination`` if the limits allow it now."""
+        with self._lock:
+            now = self.clock()
+            self._global.refill(now)
+            bucket = self._bucket(destination, now)
+            if self._global.tokens < 1 or (bucket is not None and bucket.tokens < 1):
+                return False
+            self._global.tokens -= 1
+            if bucket is not None:
+                bucket.tokens -= 1
+            return True
+
+    def global_available(self) -> bool:
+        """Whether the global bucket has a token right now."""
+        with self._lock:
+            self._global.refill(self.clock())
+            return self._global.tokens >= 1
+
+    def wait_time(self, destinations: Iterable[Hashable] = ()) -> float:
+        """Seconds until a send is allowed to any of ``destinations``.
+
+        Without destinations only the global bucket is considered.
+        """
+        with self._lock:
+            now = self.clock()
+            self._global.refill(now)
+            wait = self._global.wait_time()
+            if self.destination_rate is None:
+                return wait
+            waits = []
+            for destination in destinations:
+                bucket = self._destinations.get(destination)
+                if bucket is None:
+                    return wait
+                bucket.refill(now)
+                waits.append(bucket.wait_time())
+            return max(wait, min(waits)) if waits else wait
+
+    def _bucket(self, destination: Hashable, now: float) -> Optional[TokenBucket]:
+        """Refilled bucket of ``destination``; the caller holds the lock."""
+        if self.destination_rate is None:
+            return None
+        bucket = self._destinations.get(destination)
+        if bucket is None:
+            if len(self._destinations) >= 1024:
+                self._prune(now)
+            bucket = TokenBucket(self.destination_rate, self.destination_burst, now)
+            self._destinations[destination] = bucket
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def _prune(self, now: float):
+        """Forget destination buckets that are full again."""
+        for destination, bucket in list(self._destinations.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._destinations[destination]
+
+class DeferredQueue:
+    """Follow-ups held back by a RateLimiter and drained over later ticks.
+
+    Messages wait in arrival order, at most one per lead. ``drain`` sends
+    what the limiter allows now; a destination that is out of tokens does
+    not hold up the messages behind it. ``metrics()`` reports the backlog
+    and the drain rate over the last ``window`` seconds.
+    """
+
+    def __init__(self, limiter: RateLimiter, window: float = 60.0):
+        self.limiter = limiter
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending: 'OrderedDict[str, Message]' = OrderedDict()
+        self._drained: deque = deque()  # (clock time, count) of recent drains
+        self._sent = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, messages: Iterable[Message]):
+        """Queue messages; a newer message replaces a lead's pending one."""
+        with self._lock:
+            for message in messages:
+                self._pending.pop(message.lead_id, None)
+                self._pending[message.lead_id] = message
+
+    def discard(self, lead_id: str) -> bool:
+        """Drop a lead's pending message, e.g. because the lead replied."""
+        with self._lock:
+            return self._pending.pop(lead_id, None) is not None
+
+    def drain(self) -> List[Message]:
+        """Remove and return the messages the limiter lets through now."""
+        ready = []
+        with self._lock:
+            for lead_id in list(self._pending):
+                if not self.limiter.global_available():
+                    break
+                if self.limiter.try_acquire(lead_id):
+                    ready.append(self._pending.pop(lead_id))
+            self._sent += len(ready)
+            if ready:
+                self._drained.append((self.limiter.clock(), len(ready)))
+        return ready
+
+    def retry_after(self) -> Optional[float]:
+        """Seconds until the next drain can send, or None with no backlog."""
+        with self._lock:
+            if not self._pending:
+                return None
+            return self.limiter.wait_time(self._pending)
+
+    def metrics(self) -> Dict[str, float]:
+        """Backlog size, messages sent and drain rate per second."""
+        with self._lock:
+            now = self.limiter.clock()
+            while self._drained and self._drained[0][0] < now - self.window:
+                self._drained.popleft()
+            recent = sum(count for _, count in self._drained)
+            return {
+                'backlog': len(self._pending),
+                'sent': self._sent,
+                'drain_rate': recent / self.window,
+            }
@@ -1,112 +1,737 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from heapq import heapify, heappop, heappush
+from itertools import count
+from types import MappingProxyType
+from typing import Callable, Dict, Any, Iterable, Mapping, Optional, List, Set, Tuple, Union
+import os
+import shutil
+import tempfile
 import threading
-from copy import deepcopy
+import weakref
+from .flow import END, Flow, StepSpec, compile_flow
+from .session_store import SessionLog, SessionSpillStore
 
-class SessionManager:
-    def __init__(self):
-        self.sessions = {}
+class Session:
+    """Immutable snapshot of one lead's conversation.
+
+    Fields read as attributes or by key, like the dicts sessions used to
+    be. ``replace`` returns a new record, so a snapshot handed out by
+    SessionManager never changes under its reader. ``data`` is a read-only
+    view; ``step`` is the session's position in the manager's Flow (None
+    until the first question is asked). Keys other than the standard
+    fields given to ``replace`` are kept in ``extra``.
+    """
+
+    __slots__ = ('data', 'state', 'last_activity', 'current_question',
+                 'step', 'completed', 'extra')
+
+    FIELDS = ('data', 'state', 'last_activity', 'current_question',
+              'step', 'completed')
+
+    def __init__(self, data: Optional[Mapping[str, Any]] = None, state: str = 'initial',
+                 last_activity: Optional[datetime] = None,
+                 current_question: Optional[str] = None,
+                 step: Optional[int] = None,
+                 completed: bool = False,
+                 extra: Optional[Mapping[str, Any]] = None):
+        self._assign(
+            data=MappingProxyType(dict(data or {})),
+            state=state,
+            last_activity=last_activity or datetime.now(),
+            current_question=current_question,
+            step=step,
+            completed=completed,
+            extra=MappingProxyType(dict(extra or {})),
+        )
+
+    def _assign(self, **fields):
+        """Set every slot; only used while building a record."""
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Session is immutable; use replace()")
+
+    def replace(self, **changes) -> 'Session':
+        """Copy of this session with ``changes`` applied.
+
+        Unchanged fields, including ``data``, are shared with the original
+        rather than copied.
+        """
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        extra = None
+        for key, value in changes.items():
+            if key == 'data':
+                value = MappingProxyType(dict(value))
+            elif key not in self.FIELDS:
+                if extra is None:
+                    extra = dict(self.extra)
+                extra[key] = value
+                continue
+            fields[key] = value
+        if extra is not None:
+            fields['extra'] = MappingProxyType(extra)
+
+        session = object.__new__(Session)
+        session._assign(**fields)
+        return session
+
+    def with_answer(self, key: str, value: Any, now: datetime) -> 'Session':
+        """Copy of this session with one more answer recorded."""
+        data = dict(self.data)
+        data[key] = value
+        return self.replace(data=data, last_activity=now)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS or key in self.extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Dict-style lookup of a field."""
+        return self[key] if key in self else default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Mutable deep copy in the old session dict layout."""
+        session = {name: getattr(self, name) for name in self.FIELDS}
+        session['data'] = dict(self.data)
+        session.update(self.extra)
+        return session
+
+    def to_record(self) -> Dict[str, Any]:
+        """JSON-friendly form of the session."""
+        return {
+            'data': dict(self.data),
+            'state': self.state,
+            'last_activity': self.last_activity.isoformat(),
+            'current_question': self.current_question,
+            'step': self.step,
+            'completed': self.completed,
+            'extra': dict(self.extra),
+        }
+
+    @classmethod
+    def from_record(cls, record: Mapping[str, Any]) -> 'Session':
+        """Inverse of ``to_record``."""
+        return cls(record['data'], state=record['state'],
+                   last_activity=datetime.fromisoformat(record['last_activity']),
+                   current_question=record['current_question'],
+                   step=record.get('step'), completed=record['completed'],
+                   extra=record['extra'])
+
+    def __copy__(self) -> 'Session':
+        return self
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'Session':
+        # Immutable, so every copy may share it
+        return self
+
+    def __reduce__(self):
+        return Session.from_record, (self.to_record(),)
+
+    def __repr__(self) -> str:
+        return (f"Session(state={self.state!r}, data={dict(self.data)!r}, "
+                f"current_question={self.current_question!r}, "
+                f"completed={self.completed!r})")
+
+class _Shard:
+    """One independently locked partition of the sessions.
+
+    Sessions that can go inactive (answering questions, not completed) are
+    kept in a min-heap of ``(last_activity, seq, lead_id)`` entries, and
+    sessions still waiting for consent in a second heap when they have a
+    TTL. Any change re-pushes the session with a new ``seq`` and
+    ``scheduled`` remembers the current one, so older entries are skipped
+    when they surface (lazy invalidation).
+
+    ``resident`` holds sessions in least recently used order. With a
+    ``budget`` the oldest ones beyond it move to the spill store and are
+    read back on their next access; their heap entries stay in memory.
+    """
+
+    def __init__(self, budget: Optional[int] = None,
+                 spill: Optional[SessionSpillStore] = None,
+                 expire_initial: bool = False,
+                 on_earlier: Optional[Callable[[], None]] = None):
         self.lock = threading.Lock()
-        self.questions = [
-            {'key': 'age', 'text': 'What is your age?'},
-            {'key': 'country', 'text': 'Which country are you from?'},
-            {'key': 'interest', 'text': 'What product or service are you interested in?'}
-        ]
+        self.budget = budget
+        self.spill = spill
+        self.expire_initial = expire_initial
+        self.on_earlier = on_earlier
+        self.resident: 'OrderedDict[str, Session]' = OrderedDict()
+        self.spilled: Set[str] = set()
+        self.deadlines: List[Tuple[datetime, int, str]] = []
+        self.expiries: List[Tuple[datetime, int, str]] = []
+        self.scheduled: Dict[str, int] = {}
+        self.seq = count()
+        self.stats = {'evictions': 0, 'faults': 0, 'expired': 0}
+
+    def __contains__(self, lead_id: str) -> bool:
+        return lead_id in self.resident or lead_id in self.spilled
+
+    def __len__(self) -> int:
+        return len(self.resident) + len(self.spilled)
+
+    def get(self, lead_id: str) -> Optional[Session]:
+        """Return a session, faulting it back in if it was spilled.
+
+        The caller holds the lock.
+        """
+        session = self.resident.get(lead_id)
+        if session is not None:
+            self.resident.move_to_end(lead_id)
+            return session
+        if lead_id not in self.spilled:
+            return None
+
+        record = self.spill.take(lead_id)
+        self.spilled.discard(lead_id)
+        self.stats['faults'] += 1
+        session = Session.from_record(record)
+        self.resident[lead_id] = session
+        self._evict()
+        return session
+
+    def peek(self, lead_id: str) -> Optional[Session]:
+        """Return a session without changing its residency."""
+        session = self.resident.get(lead_id)
+        if session is None and lead_id in self.spilled:
+            session = Session.from_record(self.spill.get(lead_id))
+        return session
+
+    def store(self, lead_id: str, session: Session):
+        """Save a session and keep its deadline current.
+
+        The caller holds the lock and has loaded the session with ``get``.
+        """
+        previous = self.resident.get(lead_id)
+        self.resident[lead_id] = session
+        self.resident.move_to_end(lead_id)
+        heap = self._heap_for(session)
+        if heap is None:
+            self.scheduled.pop(lead_id, None)
+        elif (lead_id not in self.scheduled or previous is None or
+              previous.last_activity != session.last_activity or
+              self._heap_for(previous) is not heap):
+            earliest = self.earliest(heap)
+            seq = next(self.seq)
+            self.scheduled[lead_id] = seq
+            heappush(heap, (session.last_activity, seq, lead_id))
+            if self.on_earlier is not None and (
+                    earliest is None or session.last_activity < earliest):
+                # This shard's earliest deadline just moved earlier
+                self.on_earlier()
+            self._compact()
+        self._evict()
+
+    def remove(self, lead_id: str) -> bool:
+        """Drop a session; the caller holds the lock."""
+        if lead_id in self.spilled:
+            self.spilled.discard(lead_id)
+            self.spill.delete(lead_id)
+        elif self.resident.pop(lead_id, None) is None:
+            return False
+        self.scheduled.pop(lead_id, None)
+        return True
+
+    def due(self, threshold: datetime) -> Dict[str, Session]:
+        """Sessions last active before ``threshold``; the caller holds the lock.
+
+        Only entries older than the threshold are popped, and the live ones
+        are pushed back since reporting a session does not change it.
+        """
+        due = []
+        while self.deadlines and self.deadlines[0][0] < threshold:
+            entry = heappop(self.deadlines)
+            if self.scheduled.get(entry[2]) == entry[1]:
+                due.append(entry)
+        for entry in due:
+            heappush(self.deadlines, entry)
+        return {lead_id: self.peek(lead_id) for _, _, lead_id in due}
+
+    def expire(self, threshold: datetime) -> List[str]:
+        """Remove sessions waiting for consent since before ``threshold``."""
+        expired = []
+        while self.expiries and self.expiries[0][0] < threshold:
+            _, seq, lead_id = heappop(self.expiries)
+            if self.scheduled.get(lead_id) == seq:
+                self.remove(lead_id)
+                expired.append(lead_id)
+        self.stats['expired'] += len(expired)
+        return expired
+
+    def earliest(self, heap: list) -> Optional[datetime]:
+        """Oldest live timestamp in ``heap``; the caller holds the lock.
+
+        Superseded entries on top are discarded on the way.
+        """
+        while heap and self.scheduled.get(heap[0][2]) != heap[0][1]:
+            heappop(heap)
+        return heap[0][0] if heap else None
+
+    def _heap_for(self, session: Session) -> Optional[list]:
+        """Heap that tracks ``session``, or None when it has no deadline."""
+        if session.completed:
+            return None
+        if session.state == 'initial':
+            return self.expiries if self.expire_initial else None
+        return self.deadlines
+
+    def _compact(self):
+        """Drop superseded heap entries once they outnumber the live ones."""
+        if len(self.deadlines) + len(self.expiries) > 2 * len(self.scheduled) + 64:
+            for heap in (self.deadlines, self.expiries):
+                heap[:] = [entry for entry in heap
+                           if self.scheduled.get(entry[2]) == entry[1]]
+                heapify(heap)
+
+    def _evict(self):
+        """Spill least recently used sessions beyond the budget.
+
+        A session leaves ``resident`` only once the spill store has it.
+        """
+        if self.budget is None:
+            return
+        while len(self.resident) > self.budget:
+            lead_id, session = next(iter(self.resident.items()))
+            self.spill.put(lead_id, session.to_record())
+            del self.resident[lead_id]
+            self.spilled.add(lead_id)
+            self.stats['evictions'] += 1
+
+class SessionManager:
+    """Conversation state of every active lead.
+
+    Sessions are partitioned by a hash of ``lead_id`` across ``shards``
+    independently locked shards, so responses from unrelated leads do not
+    serialize on one lock. Operations that span leads visit the shards one
+    at a time. Each shard orders its sessions by inactivity deadline, so
+    finding inactive sessions costs O(due · log n).
+
+    With ``max_resident`` at most that many sessions are kept in memory
+    (split evenly across shards); the least recently used ones are spilled
+    to an SQLite file at ``spill_path`` (a temporary file by default) and
+    faulted back in on their next access. With ``initial_ttl_hours``,
+    sessions that never got past the consent prompt are dropped by
+    ``expire_sessions`` once they are that old.
+
+    With ``state_dir`` every change is appended to a journal there and
+    the sessions are restored from it on construction, so conversations
+    survive a restart. Once the journal passes ``compact_threshold`` bytes
+    it is folded into a snapshot in the background, which keeps restore
+    time proportional to the live sessions plus a short journal.
+
+    Questions follow ``flow``: a Flow or a list of step mappings (see
+    ``agent.flow``), by default the age/country/interest questionnaire.
+    """
+
+    def __init__(self, shards: int = 16, max_resident: Optional[int] = None,
+                 spill_path: Optional[str] = None,
+                 initial_ttl_hours: Optional[float] = None,
+                 state_dir: Optional[str] = None,
+                 compact_threshold: int = 4 * 1024 * 1024,
+                 flow: Union[Flow, Iterable[StepSpec], None] = None):
+        if shards < 1:
+            raise ValueError("shards must be positive")
+        if max_resident is not None and max_resident < shards:
+            raise ValueError("max_resident must allow one session per shard")
+
+        # Compiled once; sessions only hold their step index
+        self.flow = compile_flow(flow)
+        self.questions = self.flow.questions
+        self.initial_ttl_hours = initial_ttl_hours
+        self._spill = None
+        budget = None
+        if max_resident is not None:
+            if spill_path is None:
+                spill_dir = tempfile.mkdtemp(prefix='sessions-')
+                spill_path = os.path.join(spill_dir, 'spill.db')
+                weakref.finalize(self, shutil.rmtree, spill_dir, True)
+            self._spill = SessionSpillStore(spill_path)
+            budget = -(-max_resident // shards)
+        # Called, under a shard lock, when a deadline moves earlier than
+        # anything that shard had scheduled; must not block
+        self.on_deadline: Optional[Callable[[], None]] = None
+        self._shards = [_Shard(budget, self._spill, initial_ttl_hours is not None,
+                               self._deadline_moved)
+                        for _ in range(shards)]
+
+        self.compact_threshold = compact_threshold
+        self._log = None
+        self._compact_lock = threading.Lock()
+        self._compact_thread = None
+        if state_dir is not None:
+            self._log = SessionLog(state_dir)
+            self._restore()
+
+    @property
+    def sessions(self) -> Dict[str, Session]:
+        """Point-in-time copy of all sessions, gathered shard by shard.
+
+        Spilled sessions are read from disk but stay spilled.
+        """
+        sessions = {}
+        for shard in self._shards:
+            with shard.lock:
+                sessions.update(shard.resident)
+                sessions.update((lead_id, shard.peek(lead_id))
+                                for lead_id in shard.spilled)
+        return sessions
+
+    def _shard(self, lead_id: str) -> _Shard:
+        """Shard that owns ``lead_id``."""
+        return self._shards[hash(lead_id) % len(self._shards)]
 
     def create_session(self, lead_id: str, initial_data: Dict[str, Any] = None) -> bool:
         """Create a new session for a lead."""
         if not lead_id:
             return False
-        
-        with self.lock:
-            if lead_id in self.sessions:
+
+        session = Session(initial_data)
+        data = self._encode([{'op': 'create', 'lead_id': lead_id,
+                              'session': session.to_record()}])
+        shard = self._shard(lead_id)
+        with shard.lock:
+            if lead_id in shard:
                 return False
-            
-            self.sessions[lead_id] = {
-                'data': initial_data or {},
-                'state': 'initial',
-                'last_activity': datetime.now(),
-                'current_question': None,
-                'questions': deepcopy(self.questions),
-                'completed': False
-            }
+
+            shard.store(lead_id, session)
+            self._journal(data)
             return True
 
-    def get_session(self, lead_id: str) -> Optional[Dict[str, Any]]:
-        """Get a lead's session data."""
+    def create_sessions(self, leads: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Create sessions for many leads, locking each shard once.
+
+        Returns the lead ids whose sessions were created.
+        """
+        by_shard: Dict[int, List[str]] = {}
+        for lead_id in leads:
+            if lead_id:
+                by_shard.setdefault(hash(lead_id) % len(self._shards), []).append(lead_id)
+
+        created = set()
+        now = datetime.now()
+        for index, lead_ids in by_shard.items():
+            shard = self._shards[index]
+            with shard.lock:
+                sessions = {lead_id: Session(leads[lead_id], last_activity=now)
+                            for lead_id in lead_ids if lead_id not in shard}
+                data = self._encode([{'op': 'create', 'lead_id': lead_id,
+                                      'session': session.to_record()}
+                                     for lead_id, session in sessions.items()])
+                for lead_id, session in sessions.items():
+                    shard.store(lead_id, session)
+                self._journal(data)
+                created.update(sessions)
+        return [lead_id for lead_id in leads if lead_id in created]
+
+    def get_session(self, lead_id: str) -> Optional[Session]:
+        """Get a lead's session data.
+
+        The returned snapshot is immutable, so it is handed out as is.
+        """
         if not lead_id:
             return None
-        
-        with self.lock:
-            return deepcopy(self.sessions.get(lead_id))
+
+        shard = self._shard(lead_id)
+        with shard.lock:
+            return shard.get(lead_id)
 
     def update_session(self, lead_id: str, updates: Dict[str, Any]) -> bool:
         """Update a lead's session data."""
         if not lead_id:
             return False
-        
-        with self.lock:
-            if lead_id not in self.sessions:
+
+        shard = self._shard(lead_id)
+        with shard.lock:
+            session = shard.get(lead_id)
+            if session is None:
                 return False
-            
-            self.sessions[lead_id].update(updates)
-            self.sessions[lead_id]['last_activity'] = datetime.now()
+
+            now = datetime.now()
+            data = self._encode([{'op': 'update', 'lead_id': lead_id, 'values': updates,
+                                  'at': now.isoformat()}])
+            shard.store(lead_id, session.replace(**{**updates, 'last_activity': now}))
+            self._journal(data)
             return True
 
-    def get_next_question(self, lead_id: str) -> Optional[Dict[str, str]]:
+    def touch_sessions(self, lead_ids: Iterable[str]) -> List[str]:
+        """Mark many sessions active now, locking each shard once.
+
+        Each shard's changes go to the journal in one append. Returns the
+        lead ids that had a session.
+        """
+        by_shard: Dict[int, List[str]] = {}
+        for lead_id in lead_ids:
+            if lead_id:
+                by_shard.setdefault(hash(lead_id) % len(self._shards), []).append(lead_id)
+
+        touched = []
+        now = datetime.now()
+        at = now.isoformat()
+        for index, shard_ids in by_shard.items():
+            shard = self._shards[index]
+            with shard.lock:
+                events = []
+                for lead_id in shard_ids:
+                    session = shard.get(lead_id)
+                    if session is None:
+                        continue
+                    shard.store(lead_id, session.replace(last_activity=now))
+                    events.append({'op': 'update', 'lead_id': lead_id, 'values': {},
+                                   'at': at})
+                    touched.append(lead_id)
+                self._journal(self._encode(events))
+        return touched
+
+    def get_next_question(self, lead_id: str) -> Optional[Mapping[str, str]]:
         """Get the next question for a lead."""
         if not lead_id:
             return None
-        
-        with self.lock:
-            session = self.sessions.get(lead_id)
-            if not session or session['completed']:
+
+        shard = self._shard(lead_id)
+        with shard.lock:
+            session = shard.get(lead_id)
+            if not session or session.completed:
                 return None
-            
-            # Find the first unanswered question
-            for question in session['questions']:
-                if question['key'] not in session['data']:
-                    session['current_question'] = question['key']
-                    return deepcopy(question)
-            
-            # All questions answered
-            session['completed'] = True
-            session['current_question'] = None
+
+            advanced = self.advance(session)
+            if advanced is not session:
+                values = {name: getattr(advanced, name)
+                          for name in ('completed', 'current_question', 'step')}
+                data = self._encode([{'op': 'update', 'lead_id': lead_id,
+                                      'values': values}])
+                shard.store(lead_id, advanced)
+                self._journal(data)
+            return self.question(advanced)
+
+    def advance(self, session: Session) -> Session:
+        """``session`` moved to its next unanswered step, without storing it.
+
+        Answered steps are skipped following branches on the answers; past
+        the last one the session is marked completed. Returns ``session``
+        itself when it is already at that step.
+        """
+        if session.completed:
+            return session
+        step = self.flow.advance(session.step, session.data)
+        if step == END:
+            return session.replace(completed=True, current_question=None, step=step)
+        if step != session.step:
+            return session.replace(current_question=self.flow.keys[step], step=step)
+        return session
+
+    def question(self, session: Session) -> Optional[Mapping[str, str]]:
+        """Question ``session`` is waiting on, or None once completed."""
+        if session.completed or session.step is None or session.step == END:
             return None
+        return self.flow.question(session.step)
+
+    def commit_session(self, lead_id: str, session: Optional[Session]) -> bool:
+        """Replace a lead's session in one step, or end it for None.
+
+        Lets a caller derive the new session from ``get_session`` and
+        ``advance`` in memory and store the whole change with a single lock
+        and journal write. Returns False if the lead has no session.
+        """
+        if not lead_id:
+            return False
+        if session is None:
+            return self.end_session(lead_id)
+
+        data = self._encode([{'op': 'set', 'lead_id': lead_id,
+                              'session': session.to_record()}])
+        shard = self._shard(lead_id)
+        with shard.lock:
+            if shard.get(lead_id) is None:
+                return False
+            shard.store(lead_id, session)
+            self._journal(data)
+            return True
 
     def record_answer(self, lead_id: str, key: str, value: str) -> bool:
         """Record an answer to a question."""
         if not lead_id or not key:
             return False
-        
-        with self.lock:
-            if lead_id not in self.sessions:
+
+        shard = self._shard(lead_id)
+        with shard.lock:
+            session = shard.get(lead_id)
+            if session is None:
                 return False
-            
-            self.sessions[lead_id]['data'][key] = value
-            self.sessions[lead_id]['last_activity'] = datetime.now()
+
+            now = datetime.now()
+            data = self._encode([{'op': 'answer', 'lead_id': lead_id, 'key': key,
+                                  'value': value, 'at': now.isoformat()}])
+            shard.store(lead_id, session.with_answer(key, value, now))
+            self._journal(data)
             return True
 
-    def check_inactive_sessions(self, hours: int = 24) -> Dict[str, Dict[str, Any]]:
-        """Get sessions inactive for more than specified hours."""
-        with self.lock:
-            threshold = datetime.now() - timedelta(hours=hours)
-            inactive = {
-                lead_id: deepcopy(session) 
-                for lead_id, session in self.sessions.items() 
-                if (session['last_activity'] < threshold and 
-                    not session['completed'] and
-                    session['state'] != 'initial')
-            }
-            return inactive
+    def check_inactive_sessions(self, hours: int = 24) -> Dict[str, Session]:
+        """Get sessions inactive for more than specified hours.
+
+        Shards are visited one at a time; no lock is held across shards.
+        """
+        threshold = datetime.now() - timedelta(hours=hours)
+        inactive = {}
+        for shard in self._shards:
+            with shard.lock:
+                inactive.update(shard.due(threshold))
+        return inactive
+
+    def next_deadline(self, hours: float = 24) -> Optional[datetime]:
+        """When the next session goes inactive or its consent TTL runs out.
+
+        ``hours`` is the inactivity period used with
+        ``check_inactive_sessions``. Returns None when nothing is scheduled.
+        """
+        deadlines = []
+        for shard in self._shards:
+            with shard.lock:
+                earliest = shard.earliest(shard.deadlines)
+                if earliest is not None:
+                    deadlines.append(earliest + timedelta(hours=hours))
+                earliest = shard.earliest(shard.expiries)
+                if earliest is not None:
+                    deadlines.append(earliest + timedelta(hours=self.initial_ttl_hours))
+        return min(deadlines, default=None)
+
+    def _deadline_moved(self):
+        """Forward a shard's earlier deadline to ``on_deadline``."""
+        if self.on_deadline is not None:
+            self.on_deadline()
+
+    def expire_sessions(self) -> List[str]:
+        """Drop sessions stuck at the consent prompt past their TTL.
+
+        Returns the expired lead ids; does nothing without a TTL.
+        """
+        if self.initial_ttl_hours is None:
+            return []
+
+        threshold = datetime.now() - timedelta(hours=self.initial_ttl_hours)
+        expired = []
+        for shard in self._shards:
+            with shard.lock:
+                shard_expired = shard.expire(threshold)
+                self._journal(self._encode([{'op': 'end', 'lead_id': lead_id}
+                                            for lead_id in shard_expired]))
+                expired.extend(shard_expired)
+        return expired
 
     def end_session(self, lead_id: str) -> bool:
         """End a lead's session."""
         if not lead_id:
             return False
-        
-        with self.lock:
-            if lead_id in self.sessions:
-                del self.sessions[lead_id]
-                return True
-            return False
\ No newline at end of file
+
+        shard = self._shard(lead_id)
+        with shard.lock:
+            if not shard.remove(lead_id):
+                return False
+            self._journal(self._encode([{'op': 'end', 'lead_id': lead_id}]))
+            return True
+
+    def metrics(self) -> Dict[str, int]:
+        """Resident and spilled session counts and eviction counters."""
+        totals = {'resident': 0, 'spilled': 0, 'evictions': 0, 'faults': 0,
+                  'expired': 0}
+        for shard in self._shards:
+            with shard.lock:
+                totals['resident'] += len(shard.resident)
+                totals['spilled'] += len(shard.spilled)
+                for name, value in shard.stats.items():
+                    totals[name] += value
+        return totals
+
+    def snapshot(self):
+        """Fold the journal into a fresh snapshot of every session.
+
+        The journal is rotated first and the shards are then copied one at
+        a time, so writers are only held up by their own shard's copy.
+        """
+        if self._log is None:
+            return
+
+        with self._compact_lock:
+            self._log.rotate()
+            records = []
+            for shard in self._shards:
+                with shard.lock:
+                    records.extend((lead_id, shard.peek(lead_id).to_record())
+                                   for lead_id in list(shard.resident) + list(shard.spilled))
+            self._log.write_snapshot(records)
+
+    def flush(self):
+        """Force journaled changes to disk."""
+        if self._log is not None:
+            self._log.flush()
+
+    def close(self):
+        """Snapshot the state and release the journal and spill store."""
+        if self._compact_thread and self._compact_thread.is_alive():
+            self._compact_thread.join()
+        if self._log is not None:
+            self.snapshot()
+            self._log.close()
+        if self._spill is not None:
+            self._spill.close()
+
+    def _encode(self, events: List[Dict[str, Any]]) -> Optional[bytes]:
+        """Journal form of ``events``, worked out before anything is stored.
+
+        Raises TypeError for values the journal or the spill store could
+        not hold, so a refused change leaves memory and disk alike. Every
+        event either carries a whole session record or only adds values
+        to one that was already checked. Returns None when there is no
+        journal.
+        """
+        if not events or (self._log is None and self._spill is None):
+            return None
+        data = SessionLog.encode(events)
+        return data if self._log is not None else None
+
+    def _journal(self, data: Optional[bytes]):
+        """Append encoded events to the journal; the caller holds the shard lock.
+
+        Compaction starts in the background once the journal is large.
+        """
+        if self._log is None or not data:
+            return
+        self._log.append(data)
+        if (self._log.size >= self.compact_threshold and
+                not (self._compact_thread and self._compact_thread.is_alive())):
+            self._compact_thread = threading.Thread(target=self.snapshot)
+            self._compact_thread.daemon = True
+            self._compact_thread.start()
+
+    def _restore(self):
+        """Rebuild the sessions from the snapshot and journal."""
+        self._log.recover(self._apply, lambda: (
+            (lead_id, session.to_record()) for lead_id, session in self.sessions.items()))
+
+    def _apply(self, event: Dict[str, Any]):
+        """Apply one journal event while restoring."""
+        lead_id = event['lead_id']
+        shard = self._shard(lead_id)
+        if event['op'] == 'create':
+            shard.remove(lead_id)
+            shard.store(lead_id, Session.from_record(event['session']))
+        elif event['op'] == 'set':
+            if shard.get(lead_id) is not None:
+                shard.store(lead_id, Session.from_record(event['session']))
+        elif event['op'] == 'end':
+            shard.remove(lead_id)
+        else:
+            session = shard.get(lead_id)
+            if session is None:
+                return
+            changes = dict(event['values']) if event['op'] == 'update' else {}
+            if event['op'] == 'answer':
+                changes['data'] = {**session.data, event['key']: event['value']}
+            if 'at' in event:
+                changes['last_activity'] = datetime.fromisoformat(event['at'])
+            shard.store(lead_id, session.replace(**changes))
@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .journal import compacting_path, recover_journal
+
+def _encode_value(value: Any) -> Dict[str, str]:
+    """Tagged JSON form of the dates sessions may hold."""
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'$date': value.isoformat()}
+    raise TypeError(f"Session values must be JSON-serializable or dates, "
+                    f"not {type(value).__name__}")
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    """Inverse of ``_encode_value`` for one decoded JSON object."""
+    if len(obj) == 1:
+        if '$datetime' in obj:
+            return datetime.fromisoformat(obj['$datetime'])
+        if '$date' in obj:
+            return date.fromisoformat(obj['$date'])
+    return obj
+
+def dumps(value: Any) -> str:
+    """Compact JSON of a session record or event; dates round-trip.
+
+    Raises TypeError for values JSON cannot hold.
+    """
+    return json.dumps(value, separators=(',', ':'), default=_encode_value)
+
+def loads(text: str) -> Any:
+    """Inverse of ``dumps``."""
+    return json.loads(text, object_hook=_decode_object)
+
+
+class SessionSpillStore:
+    """On-disk overflow for sessions evicted from memory.
+
+    Sessions are stored as JSON records in an SQLite table keyed by
+    ``lead_id``. The file only extends the memory of the running process
+    and is cleared on open, so it trades durability for speed
+    (``synchronous=OFF``).
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(file_path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "lead_id TEXT PRIMARY KEY, record TEXT NOT NULL)"
+        )
+        # Whatever an earlier process spilled is not known to this one
+        self._conn.execute("DELETE FROM sessions")
+
+    def put(self, lead_id: str, record: Dict):
+        """Store or replace the record of one session."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (lead_id, record) VALUES (?, ?)",
+                (lead_id, dumps(record))
+            )
+
+    def get(self, lead_id: str) -> Optional[Dict]:
+        """Return a stored record without removing it."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record FROM sessions WHERE lead_id = ?", (lead_id,)
+            ).fetchone()
+        return loads(row[0]) if row is not None else None
+
+    def take(self, lead_id: str) -> Optional[Dict]:
+        """Remove a record and return it."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record FROM sessions WHERE lead_id = ?", (lead_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM sessions WHERE lead_id = ?", (lead_id,))
+        return loads(row[0])
+
+    def delete(self, lead_id: str):
+        """Forget a session."""
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE lead_id = ?", (lead_id,))
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+# Layout version of the session snapshot file
+SNAPSHOT_VERSION = 1
+
+
+class SessionLog:
+    """Snapshot plus append-only journal of session changes.
+
+    ``sessions.snapshot`` holds one JSON line per session under a version
+    header; ``sessions.journal`` one JSON event per line appended since.
+    Events only ever set absolute values (a whole session, one answer,
+    some fields, a removal), so replaying the journal over a snapshot
+    taken after the journal started still ends in the latest state. That
+    lets compaction rotate the journal first and collect the snapshot
+    afterwards without stopping writers.
+    """
+
+    def __init__(self, state_dir: str):
+        os.makedirs(state_dir, exist_ok=True)
+        self.snapshot_path = os.path.join(state_dir, 'sessions.snapshot')
+        self.journal_path = os.path.join(state_dir, 'sessions.journal')
+        self.compacting_path = compacting_path(self.journal_path)
+        self.size = 0
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def recover(self, apply: Callable[[Dict], None],
+                sessions: Callable[[], Iterable[Tuple[str, Dict]]]):
+        """Replay the snapshot and journals into ``apply`` and open the journal.
+
+        The snapshot is replayed as ``create`` events. When a compaction
+        was interrupted the recovered ``sessions()`` are snapshotted again.
+        """
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as file:
+                header = json.loads(file.readline() or '{}')
+                if header.get('version') != SNAPSHOT_VERSION:
+                    raise ValueError(f"Unsupported session snapshot: {self.snapshot_path}")
+                for line in file:
+                    record = loads(line)
+                    apply({'op': 'create', 'lead_id': record.pop('lead_id'),
+                           'session': record})
+        self._fd = recover_journal(self.journal_path, apply, self._open,
+                                   lambda: self.write_snapshot(sessions()), decode=loads)
+        self.size = os.fstat(self._fd).st_size
+
+    def _open(self) -> int:
+        """Open the journal for appending."""
+        return os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    @staticmethod
+    def encode(events: List[Dict]) -> bytes:
+        """Journal lines of ``events``; raises TypeError like ``dumps``."""
+        return ''.join(dumps(event) + '\n' for event in events).encode('utf-8')
+
+    def append(self, data: bytes):
+        """Append events encoded by ``encode`` with a single write."""
+        with self._lock:
+            os.write(self._fd, data)
+            self.size += len(data)
+
+    def rotate(self):
+        """Start a fresh journal; the old one is kept until ``write_snapshot``."""
+        with self._lock:
+            os.close(self._fd)
+            os.replace(self.journal_path, self.compacting_path)
+            self._fd = self._open()
+            self.size = 0
+
+    def write_snapshot(self, sessions: Iterable[Tuple[str, Dict]]):
+        """Atomically replace the snapshot and drop the rotated journal."""
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'version': SNAPSHOT_VERSION}) + '\n')
+            for lead_id, record in sessions:
+                file.write(dumps({'lead_id': lead_id, **record}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+
+    def flush(self):
+        """Force journal appends to disk."""
+        with self._lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+
+    def close(self):
+        """Close the journal."""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
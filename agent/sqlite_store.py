@@ -0,0 +1,276 @@
+import csv
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+from .storage import INDEXED_COLUMNS, LEAD_COLUMNS, LeadConflictError, lead_etag
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_SELECT = f"SELECT {', '.join(LEAD_COLUMNS)} FROM leads"
+# Stay well below SQLite's bound-parameter limit in IN (...) lookups
+_MAX_PARAMS = 500
+_INSERT = (
+    f"INSERT OR IGNORE INTO leads ({', '.join(LEAD_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in LEAD_COLUMNS)})"
+)
+
+class SQLiteLeadStore:
+    """Lead storage in an SQLite database.
+
+    The database runs in WAL mode so readers in other processes are not
+    blocked by a writer. Every statement uses ``?`` parameters; sqlite3
+    keeps the compiled statements in its per-connection cache, so repeated
+    lookups and updates are not re-parsed.
+
+    Writes run in ``BEGIN IMMEDIATE`` transactions, so concurrent writers in
+    other processes queue on SQLite's own lock for up to ``timeout``
+    seconds; the time spent waiting is reported by ``metrics()``.
+    """
+
+    def __init__(self, file_path: str, timeout: float = 30.0):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._stats = {
+            'lock_acquisitions': 0,
+            'lock_wait_seconds': 0.0,
+            'lock_wait_max_seconds': 0.0,
+            'conflicts': 0,
+            'reads': 0,
+            'writes': 0,
+        }
+        self._conn = sqlite3.connect(file_path, timeout=timeout,
+                                     check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leads ("
+            "lead_id TEXT PRIMARY KEY, name TEXT, age TEXT, country TEXT, "
+            "interest TEXT, status TEXT, last_updated TEXT)"
+        )
+        for column in INDEXED_COLUMNS + ('last_updated',):
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS leads_{column} ON leads ({column})"
+            )
+
+    def add(self, row: Dict) -> bool:
+        """Insert a row unless its ``lead_id`` already exists."""
+        with self._write():
+            cursor = self._conn.execute(_INSERT, self._to_params(row))
+            return cursor.rowcount == 1
+
+    def update(self, lead_id: str, values: Dict,
+               expected_etag: Optional[str] = None) -> bool:
+        """Set the given columns on an existing row.
+
+        With ``expected_etag`` the row must still have that ``lead_etag``,
+        otherwise ``LeadConflictError`` is raised and nothing is written.
+        """
+        with self._write():
+            if expected_etag is not None:
+                self._stats['reads'] += 1
+                row = self._conn.execute(
+                    f"{_SELECT} WHERE lead_id = ?", (lead_id,)
+                ).fetchone()
+                if row is None:
+                    return False
+                if lead_etag(self._to_row(row)) != expected_etag:
+                    self._stats['conflicts'] += 1
+                    raise LeadConflictError(f"Lead {lead_id} was modified concurrently")
+            return self._update(lead_id, values)
+
+    def iter_rows(self, chunksize: int) -> Iterator[Dict]:
+        """Yield rows in insertion order, fetching ``chunksize`` at a time."""
+        # A separate cursor on a short-lived connection keeps the shared
+        # connection free while the caller consumes the rows.
+        with self._lock:
+            self._stats['reads'] += 1
+        conn = sqlite3.connect(self.file_path)
+        try:
+            cursor = conn.execute(f"{_SELECT} ORDER BY rowid")
+            while True:
+                chunk = cursor.fetchmany(chunksize)
+                if not chunk:
+                    break
+                for row in chunk:
+                    yield self._to_row(row)
+        finally:
+            conn.close()
+
+    def frame(self, columns: List[str]) -> 'pd.DataFrame':
+        """Return the given columns as text, one row per lead."""
+        import pandas as pd
+
+        with self._lock:
+            self._stats['reads'] += 1
+            return pd.read_sql_query(
+                f"SELECT {', '.join(columns)} FROM leads ORDER BY rowid",
+                self._conn
+            )
+
+    def add_many(self, rows: Iterable[Dict]) -> List[str]:
+        """Insert rows whose ``lead_id`` is new in one transaction."""
+        with self._write():
+            return [row['lead_id'] for row in rows
+                    if self._conn.execute(_INSERT, self._to_params(row)).rowcount == 1]
+
+    def update_many(self, values: Dict[str, Dict]) -> List[str]:
+        """Apply per-lead column values in one transaction."""
+        with self._write():
+            return [lead_id for lead_id, row_values in values.items()
+                    if self._update(lead_id, row_values)]
+
+    def get_many(self, lead_ids: Iterable[str], **criteria) -> Dict[str, Dict]:
+        """Return the rows among ``lead_ids`` matching ``criteria``."""
+        lead_ids = list(lead_ids)
+        filters = ''.join(f" AND {column} = ?" for column in criteria)
+        params = [self._to_sql(value) for value in criteria.values()]
+        rows = []
+        with self._lock:
+            self._stats['reads'] += 1
+            for start in range(0, len(lead_ids), _MAX_PARAMS):
+                chunk = lead_ids[start:start + _MAX_PARAMS]
+                placeholders = ', '.join('?' for _ in chunk)
+                rows.extend(self._conn.execute(
+                    f"{_SELECT} WHERE lead_id IN ({placeholders}){filters}",
+                    chunk + params
+                ).fetchall())
+        return {row[0]: self._to_row(row) for row in rows}
+
+    def get(self, lead_id: str) -> Optional[Dict]:
+        """Return one row."""
+        with self._lock:
+            self._stats['reads'] += 1
+            row = self._conn.execute(
+                f"{_SELECT} WHERE lead_id = ?", (lead_id,)
+            ).fetchone()
+        return self._to_row(row) if row is not None else None
+
+    def get_all(self) -> Dict[str, Dict]:
+        """Return all rows keyed by ``lead_id`` in insertion order."""
+        with self._lock:
+            self._stats['reads'] += 1
+            rows = self._conn.execute(f"{_SELECT} ORDER BY rowid").fetchall()
+        return {row[0]: self._to_row(row) for row in rows}
+
+    def query(self, updated_before: Optional[str] = None,
+              updated_after: Optional[str] = None,
+              **criteria) -> Dict[str, Dict]:
+        """Return rows matching every criterion using the column indexes."""
+        clauses = [f"{column} = ?" for column in criteria]
+        params = [self._to_sql(value) for value in criteria.values()]
+        if updated_before is not None:
+            clauses.append("last_updated < ?")
+            params.append(updated_before)
+        if updated_after is not None:
+            clauses.append("last_updated > ?")
+            params.append(updated_after)
+
+        where = ' AND '.join(clauses) or '1'
+        with self._lock:
+            self._stats['reads'] += 1
+            rows = self._conn.execute(
+                f"{_SELECT} WHERE {where} ORDER BY rowid", params
+            ).fetchall()
+        return {row[0]: self._to_row(row) for row in rows}
+
+    def flush(self):
+        """Writes are committed immediately; nothing is buffered."""
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def metrics(self) -> Dict[str, float]:
+        """Write-lock contention, conflict and I/O counters.
+
+        ``reads`` counts queries and ``writes`` write transactions.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _update(self, lead_id: str, values: Dict) -> bool:
+        """Run the UPDATE for one lead; the caller holds the lock."""
+        columns = [column for column in values
+                   if column in LEAD_COLUMNS and column != 'lead_id']
+        if not columns:
+            return self._conn.execute(
+                "SELECT 1 FROM leads WHERE lead_id = ?", (lead_id,)
+            ).fetchone() is not None
+
+        assignments = ', '.join(f"{column} = ?" for column in columns)
+        params = [self._to_sql(values[column]) for column in columns]
+        cursor = self._conn.execute(
+            f"UPDATE leads SET {assignments} WHERE lead_id = ?",
+            params + [lead_id]
+        )
+        return cursor.rowcount == 1
+
+    @contextmanager
+    def _write(self):
+        """Run the enclosed statements in one write transaction.
+
+        Waiting for the connection and for SQLite's write lock counts as
+        lock wait in ``metrics()``.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            waited = time.perf_counter() - start
+            self._stats['lock_acquisitions'] += 1
+            self._stats['lock_wait_seconds'] += waited
+            self._stats['lock_wait_max_seconds'] = max(
+                self._stats['lock_wait_max_seconds'], waited)
+            self._stats['writes'] += 1
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @classmethod
+    def _to_params(cls, row: Dict):
+        """Positional insert parameters for a row."""
+        return [cls._to_sql(row.get(column)) for column in LEAD_COLUMNS]
+
+    @staticmethod
+    def _to_sql(value):
+        """Store cells as text, with NaN and None as NULL."""
+        if value is None or value != value:
+            return None
+        return str(value)
+
+    @staticmethod
+    def _to_row(values) -> Dict:
+        """Turn a result tuple into a row dict with NaN for NULL."""
+        return {
+            column: float('nan') if value is None else value
+            for column, value in zip(LEAD_COLUMNS, values)
+        }
+
+
+def migrate_csv_to_sqlite(csv_path: str, db_path: str) -> int:
+    """Import an existing leads CSV into an SQLite database.
+
+    Leads already present in the database are left untouched.
+
+    Args:
+        csv_path: Path of the CSV written by the CSV backend
+        db_path: Path of the SQLite database to create or extend
+
+    Returns:
+        int: Number of leads imported
+    """
+    store = SQLiteLeadStore(db_path)
+    try:
+        with open(csv_path, newline='', encoding='utf-8') as file:
+            rows = ({column: row.get(column) or None for column in LEAD_COLUMNS}
+                    for row in csv.DictReader(file))
+            return len(store.add_many(rows))
+    finally:
+        store.close()
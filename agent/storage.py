@@ -0,0 +1,923 @@
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import pickle
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Protocol, Set, Tuple, Union
+)
+
+from .journal import compacting_path, recover_journal
+
+if TYPE_CHECKING:
+    # pandas is imported on first use so `import agent` stays cheap
+    import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no advisory file locks
+    fcntl = None
+
+LEAD_COLUMNS = [
+    'lead_id', 'name', 'age', 'country',
+    'interest', 'status', 'last_updated'
+]
+
+# Columns with an equality index in the in-memory store and SQLite
+INDEXED_COLUMNS = ('status', 'country', 'interest')
+
+# Layout version of the binary snapshot kept next to CSV files
+SNAPSHOT_VERSION = 1
+
+# Low-cardinality text columns are loaded as categoricals for analytics
+CATEGORY_COLUMNS = ('country', 'interest', 'status')
+
+TimestampLike = Union[str, datetime]
+
+# Only empty fields count as missing, in pandas and csv-module reads alike
+READ_CSV_OPTIONS = {'dtype': str, 'keep_default_na': False, 'na_values': ['']}
+
+def format_timestamp(value: TimestampLike) -> str:
+    """Render a timestamp the way ``last_updated`` is stored.
+
+    Stored timestamps share one fixed-width layout, so range filters can
+    compare them as strings. Strings are parsed as ISO 8601.
+    """
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    return value.isoformat(sep=' ')
+
+def lead_etag(row: Dict) -> str:
+    """Version tag of a lead row for optimistic concurrency.
+
+    Every update also moves ``last_updated``, so the digest of the row's
+    cells changes whenever anyone writes the lead.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for column in LEAD_COLUMNS:
+        value = row.get(column)
+        missing = value is None or value != value
+        digest.update(b'\x00' if missing else str(value).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+class LeadConflictError(Exception):
+    """Raised when a lead changed since the version the caller read."""
+
+def typed_frame(df: 'pd.DataFrame') -> 'pd.DataFrame':
+    """Convert a text-only lead frame to analytics-friendly dtypes.
+
+    ``age`` becomes nullable ``Int64`` (non-integer answers become NA),
+    ``last_updated`` a datetime column and the low-cardinality text
+    columns categoricals. Columns not present in ``df`` are skipped.
+    """
+    import pandas as pd
+
+    df = df.copy()
+    if 'age' in df:
+        age = pd.to_numeric(df['age'], errors='coerce')
+        df['age'] = age.where(age % 1 == 0).astype('Int64')
+    if 'last_updated' in df:
+        df['last_updated'] = pd.to_datetime(df['last_updated'], errors='coerce')
+    for column in CATEGORY_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('category')
+    return df
+
+class LeadStore(Protocol):
+    """Storage backend used by DataHandler.
+
+    Rows are plain dicts keyed by the names in ``LEAD_COLUMNS``; missing
+    cells are NaN, matching what pandas returns for an empty CSV field.
+    """
+
+    def add(self, row: Dict) -> bool:
+        """Insert a row unless its ``lead_id`` already exists."""
+
+    def update(self, lead_id: str, values: Dict,
+               expected_etag: Optional[str] = None) -> bool:
+        """Set the given columns on an existing row.
+
+        With ``expected_etag`` the row must still have that ``lead_etag``,
+        otherwise ``LeadConflictError`` is raised and nothing is written.
+        """
+
+    def get(self, lead_id: str) -> Optional[Dict]:
+        """Return a copy of one row."""
+
+    def get_all(self) -> Dict[str, Dict]:
+        """Return copies of all rows keyed by ``lead_id``."""
+
+    def iter_rows(self, chunksize: int) -> Iterator[Dict]:
+        """Yield row copies, holding at most ``chunksize`` at a time."""
+
+    def frame(self, columns: List[str]) -> 'pd.DataFrame':
+        """Return the given columns as text, one row per lead."""
+
+    def add_many(self, rows: List[Dict]) -> List[str]:
+        """Insert rows whose ``lead_id`` is new; returns the inserted ids."""
+
+    def update_many(self, values: Dict[str, Dict]) -> List[str]:
+        """Apply per-lead column values; returns the ids that existed."""
+
+    def get_many(self, lead_ids: Iterable[str], **criteria) -> Dict[str, Dict]:
+        """Return copies of the rows among ``lead_ids`` matching ``criteria``."""
+
+    def query(self, updated_before: Optional[str] = None,
+              updated_after: Optional[str] = None,
+              **criteria) -> Dict[str, Dict]:
+        """Return rows whose columns equal every given value.
+
+        ``updated_before``/``updated_after`` bound ``last_updated``
+        (exclusive) and are already rendered by ``format_timestamp``.
+        """
+
+    def flush(self):
+        """Persist anything still buffered."""
+
+    def close(self):
+        """Flush and release resources."""
+
+    def metrics(self) -> Dict[str, float]:
+        """Write-lock contention and conflict counters."""
+
+
+class LeadIndex:
+    """Secondary indexes over the rows of an in-memory store.
+
+    Equality lookups on ``INDEXED_COLUMNS`` map each value to the set of
+    lead ids holding it; ``last_updated`` is kept as a sorted list of
+    ``(timestamp, lead_id)`` pairs for range scans. Missing cells are not
+    indexed since they never compare equal.
+    """
+
+    def __init__(self):
+        self.values: Dict[str, Dict[str, Set[str]]] = {
+            column: {} for column in INDEXED_COLUMNS
+        }
+        self.updated: List[tuple] = []
+
+    def add(self, row: Dict):
+        """Index a new row."""
+        lead_id = row['lead_id']
+        for column in INDEXED_COLUMNS:
+            value = row.get(column)
+            if isinstance(value, str):
+                self.values[column].setdefault(value, set()).add(lead_id)
+        if isinstance(row.get('last_updated'), str):
+            insort(self.updated, (row['last_updated'], lead_id))
+
+    def change(self, row: Dict, values: Dict):
+        """Re-index the columns of ``row`` that ``values`` is about to change."""
+        lead_id = row['lead_id']
+        for column in INDEXED_COLUMNS:
+            if column not in values or values[column] == row.get(column):
+                continue
+            old, new = row.get(column), values[column]
+            if isinstance(old, str):
+                ids = self.values[column][old]
+                ids.discard(lead_id)
+                if not ids:
+                    del self.values[column][old]
+            if isinstance(new, str):
+                self.values[column].setdefault(new, set()).add(lead_id)
+
+        old, new = row.get('last_updated'), values.get('last_updated', row.get('last_updated'))
+        if old != new:
+            if isinstance(old, str):
+                position = bisect_left(self.updated, (old, lead_id))
+                if position < len(self.updated) and self.updated[position] == (old, lead_id):
+                    del self.updated[position]
+            if isinstance(new, str):
+                insort(self.updated, (new, lead_id))
+
+    def candidates(self, criteria: Dict, updated_before: Optional[str],
+                   updated_after: Optional[str]) -> Optional[Set[str]]:
+        """Lead ids that may match, or None when no index applies.
+
+        Equality criteria on indexed columns are intersected smallest first;
+        otherwise a ``last_updated`` range is read off the sorted list.
+        """
+        sets = [self.values[column].get(value, set())
+                for column, value in criteria.items() if column in self.values]
+        if sets:
+            sets.sort(key=len)
+            result = set(sets[0])
+            for ids in sets[1:]:
+                result &= ids
+            return result
+
+        if updated_before is None and updated_after is None:
+            return None
+
+        start = 0
+        end = len(self.updated)
+        if updated_after is not None:
+            # Skip every entry whose timestamp equals the bound
+            start = bisect_right(self.updated, (updated_after, '\U0010ffff'))
+        if updated_before is not None:
+            end = bisect_left(self.updated, (updated_before, ''))
+        return {lead_id for _, lead_id in self.updated[start:end]}
+
+
+class CSVLeadStore:
+    """Lead storage in a single CSV file.
+
+    By default every call reads (and every write rewrites) the whole file.
+    With ``in_memory=True`` the table is loaded once and kept in a dict
+    keyed by ``lead_id``. Writes only touch that dict and are persisted
+    by a background writer every ``flush_interval`` seconds, or sooner
+    once ``flush_threshold`` writes are pending.
+
+    With ``journal=True`` every add or update is appended as one line to
+    ``<file_path>.journal`` instead of rewriting the CSV. The CSV acts as
+    the last snapshot; once the journal grows past ``compact_threshold``
+    bytes it is folded back into a fresh snapshot in the background.
+
+    Unless ``binary_snapshot=False``, a pickled columnar copy of the table
+    is kept in ``<file_path>.cache``, keyed on the CSV's mtime and size.
+    While the CSV is unchanged, reads load that file instead of parsing
+    text; any change to the CSV makes the copy stale and it is rebuilt on
+    the next read.
+
+    Writes to the file are serialized across processes with an ``fcntl``
+    advisory lock on ``<file_path>.lock`` and replace the CSV atomically, so
+    several workers can share one file in the default mode. The in-memory
+    and journal modes assume a single writing process.
+
+    In the default mode the single-lead calls (``add``, ``update`` and
+    ``get``) stream the file with the ``csv`` module instead of loading it
+    into pandas: lookups stop at the matching line and a new lead is
+    appended rather than rewriting the table.
+    """
+
+    def __init__(self, file_path: str, in_memory: bool = False,
+                 flush_interval: float = 5.0, flush_threshold: int = 100,
+                 journal: bool = False, compact_threshold: int = 1024 * 1024,
+                 binary_snapshot: bool = True):
+        self.file_path = file_path
+        self.binary_snapshot = binary_snapshot
+        self.snapshot_path = f"{file_path}.cache"
+        self.journal = journal
+        self.in_memory = in_memory or journal
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.compact_threshold = compact_threshold
+        self.journal_path = f"{file_path}.journal"
+        self.lock_path = f"{file_path}.lock"
+        self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._file_mutex = threading.RLock()
+        self._file_lock_depth = 0
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'lock_acquisitions': 0,
+            'lock_wait_seconds': 0.0,
+            'lock_wait_max_seconds': 0.0,
+            'conflicts': 0,
+            'reads': 0,
+            'writes': 0,
+        }
+        with self._exclusive():
+            self._ensure_file_exists()
+
+        self._rows: Dict[str, Dict] = {}
+        self._positions: Dict[str, int] = {}
+        self._index = LeadIndex()
+        self._dirty = 0
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._closed = False
+        self._flush_thread = None
+        self._journal_fd = None
+        self._compact_thread = None
+        if self.journal:
+            self._load_index()
+            self._recover_journal()
+        elif self.in_memory:
+            self._load_index()
+            self._start_flusher()
+
+    def _ensure_file_exists(self):
+        """Ensure the CSV file exists with the correct headers."""
+        if not os.path.exists(self.file_path):
+            with open(self.file_path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(LEAD_COLUMNS)
+
+    def add(self, row: Dict) -> bool:
+        """Insert a row unless its ``lead_id`` already exists."""
+        lead_id = row['lead_id']
+        if self.in_memory:
+            with self._lock:
+                if lead_id in self._rows:
+                    return False
+                row = self._insert_row(dict(row))
+                self._record_change({'op': 'add', 'row': row})
+            return True
+
+        with self._exclusive():
+            header, existing = self._scan_row(lead_id)
+            if existing is not None:
+                return False
+
+            line = io.StringIO()
+            if not self._ends_with_newline():
+                line.write('\n')
+            csv.writer(line, lineterminator='\n').writerow(
+                [self._cell(row.get(column)) for column in header])
+            # The row goes out in a single write, so readers see the table
+            # either without it or with it
+            with open(self.file_path, 'a', newline='', encoding='utf-8') as file:
+                file.write(line.getvalue())
+            self._count_io(writes=1)
+            return True
+
+    def update(self, lead_id: str, values: Dict,
+               expected_etag: Optional[str] = None) -> bool:
+        """Set the given columns on an existing row.
+
+        With ``expected_etag`` the row must still have that ``lead_etag``,
+        otherwise ``LeadConflictError`` is raised and nothing is written.
+        """
+        values = {column: value for column, value in values.items()
+                  if column in LEAD_COLUMNS and column != 'lead_id'}
+        if self.in_memory:
+            with self._lock:
+                row = self._rows.get(lead_id)
+                if row is None:
+                    return False
+                self._check_etag(row, expected_etag)
+                self._update_row(row, values)
+                self._record_change({'op': 'update', 'lead_id': lead_id,
+                                     'values': values})
+            return True
+
+        with self._exclusive():
+            # Copy the file line by line, rewriting only the lead's line
+            tmp_path = f"{self.file_path}.tmp"
+            found = False
+            try:
+                with open(self.file_path, newline='', encoding='utf-8') as source, \
+                        open(tmp_path, 'w', newline='', encoding='utf-8') as target:
+                    reader = csv.reader(source)
+                    writer = csv.writer(target, lineterminator='\n')
+                    header = next(reader, LEAD_COLUMNS)
+                    writer.writerow(header)
+                    key = header.index('lead_id')
+                    for record in reader:
+                        if not found and len(record) > key and record[key] == lead_id:
+                            found = True
+                            row = self._record_to_row(header, record)
+                            self._check_etag(row, expected_etag)
+                            row.update(values)
+                            record = [self._cell(row[column]) for column in header]
+                        writer.writerow(record)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+            self._count_io(reads=1)
+            if not found:
+                os.remove(tmp_path)
+                return False
+            os.replace(tmp_path, self.file_path)
+            self._count_io(writes=1)
+            return True
+
+    def get(self, lead_id: str) -> Optional[Dict]:
+        """Return a copy of one row."""
+        if self.in_memory:
+            with self._lock:
+                row = self._rows.get(lead_id)
+                return dict(row) if row is not None else None
+
+        return self._scan_row(lead_id)[1]
+
+    def _scan_row(self, lead_id: str) -> Tuple[List[str], Optional[Dict]]:
+        """Stream the CSV up to the row of ``lead_id``.
+
+        Returns the header and the row, or None when the lead is absent.
+        """
+        self._count_io(reads=1)
+        with open(self.file_path, newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            header = next(reader, LEAD_COLUMNS)
+            key = header.index('lead_id')
+            for record in reader:
+                if len(record) > key and record[key] == lead_id:
+                    return header, self._record_to_row(header, record)
+        return header, None
+
+    @staticmethod
+    def _record_to_row(header: List[str], record: List[str]) -> Dict:
+        """Turn a csv-module record into a row, with NaN for empty cells."""
+        record = record + [''] * (len(header) - len(record))
+        return {column: value if value != '' else float('nan')
+                for column, value in zip(header, record)}
+
+    @staticmethod
+    def _cell(value) -> str:
+        """CSV text of a cell; missing values are written as empty fields."""
+        return '' if value is None or value != value else str(value)
+
+    def _ends_with_newline(self) -> bool:
+        """Whether the CSV is empty or its last line is terminated."""
+        with open(self.file_path, 'rb') as file:
+            if file.seek(0, os.SEEK_END) == 0:
+                return True
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b'\n'
+
+    def get_all(self) -> Dict[str, Dict]:
+        """Return copies of all rows keyed by ``lead_id``."""
+        if self.in_memory:
+            with self._lock:
+                return {lead_id: dict(row) for lead_id, row in self._rows.items()}
+
+        df = self._read_data()
+        return {row['lead_id']: row.to_dict() for _, row in df.iterrows()}
+
+    def iter_rows(self, chunksize: int) -> Iterator[Dict]:
+        """Yield row copies, holding at most ``chunksize`` at a time."""
+        if self.in_memory:
+            with self._lock:
+                lead_ids = list(self._rows)
+            for start in range(0, len(lead_ids), chunksize):
+                with self._lock:
+                    chunk = [dict(self._rows[lead_id])
+                             for lead_id in lead_ids[start:start + chunksize]
+                             if lead_id in self._rows]
+                yield from chunk
+            return
+
+        import pandas as pd
+
+        self._count_io(reads=1)
+        with pd.read_csv(self.file_path, chunksize=chunksize,
+                         **READ_CSV_OPTIONS) as reader:
+            for chunk in reader:
+                yield from chunk.to_dict('records')
+
+    def frame(self, columns: List[str]) -> 'pd.DataFrame':
+        """Return the given columns as text, one row per lead."""
+        import pandas as pd
+
+        if self.in_memory:
+            with self._lock:
+                return pd.DataFrame(
+                    [[row[column] for column in columns] for row in self._rows.values()],
+                    columns=columns
+                )
+
+        if self.binary_snapshot:
+            return self._read_data()[columns]
+        self._count_io(reads=1)
+        return pd.read_csv(self.file_path, usecols=columns,
+                           **READ_CSV_OPTIONS)[columns]
+
+    def add_many(self, rows: List[Dict]) -> List[str]:
+        """Insert rows whose ``lead_id`` is new; returns the inserted ids."""
+        if self.in_memory:
+            with self._lock:
+                added = []
+                for row in rows:
+                    if row['lead_id'] not in self._rows:
+                        added.append(self._insert_row(dict(row)))
+                self._record_changes([{'op': 'add', 'row': row} for row in added])
+            return [row['lead_id'] for row in added]
+
+        import pandas as pd
+
+        with self._exclusive():
+            df = self._read_data()
+            new_df = pd.DataFrame(rows, columns=LEAD_COLUMNS)
+            # One vectorized pass drops ids already stored or repeated in the batch
+            new_df = new_df[~new_df['lead_id'].isin(df['lead_id'])]
+            new_df = new_df.drop_duplicates(subset='lead_id')
+            if new_df.empty:
+                return []
+
+            self._write_data(pd.concat([df, new_df], ignore_index=True))
+            return new_df['lead_id'].tolist()
+
+    def update_many(self, values: Dict[str, Dict]) -> List[str]:
+        """Apply per-lead column values; returns the ids that existed."""
+        values = {
+            lead_id: {column: value for column, value in row_values.items()
+                      if column in LEAD_COLUMNS and column != 'lead_id'}
+            for lead_id, row_values in values.items()
+        }
+        if self.in_memory:
+            with self._lock:
+                updated = [lead_id for lead_id in values if lead_id in self._rows]
+                for lead_id in updated:
+                    self._update_row(self._rows[lead_id], values[lead_id])
+                self._record_changes([
+                    {'op': 'update', 'lead_id': lead_id, 'values': values[lead_id]}
+                    for lead_id in updated
+                ])
+            return updated
+
+        import pandas as pd
+
+        with self._exclusive():
+            df = self._read_data().set_index('lead_id')
+            updates_df = pd.DataFrame.from_dict(values, orient='index')
+            updates_df = updates_df[updates_df.index.isin(df.index)]
+            if updates_df.empty:
+                return []
+
+            # Cells a lead did not mention are NaN and left alone by update()
+            df.update(updates_df)
+            self._write_data(df.reset_index())
+            return updates_df.index.tolist()
+
+    def get_many(self, lead_ids: Iterable[str], **criteria) -> Dict[str, Dict]:
+        """Return copies of the rows among ``lead_ids`` matching ``criteria``.
+
+        Without the in-memory table the file is read once and filtered
+        with vectorized masks.
+        """
+        if self.in_memory:
+            with self._lock:
+                return {lead_id: dict(self._rows[lead_id]) for lead_id in lead_ids
+                        if lead_id in self._rows and
+                        self._row_matches(self._rows[lead_id], criteria, None, None)}
+
+        df = self._read_data()
+        mask = df['lead_id'].isin(list(lead_ids))
+        for column, value in criteria.items():
+            mask &= df[column] == value
+        return {row['lead_id']: row for row in df[mask].to_dict('records')}
+
+    def query(self, updated_before: Optional[str] = None,
+              updated_after: Optional[str] = None,
+              **criteria) -> Dict[str, Dict]:
+        """Return rows matching every criterion.
+
+        In memory the secondary indexes narrow the candidates first, so only
+        rows that can match are inspected. Without them the file is read
+        once and filtered with vectorized masks.
+        """
+        if self.in_memory:
+            with self._lock:
+                candidates = self._index.candidates(criteria, updated_before,
+                                                    updated_after)
+                rows = (self._rows.values() if candidates is None else
+                        (self._rows[lead_id] for lead_id in candidates))
+                matches = [row for row in rows
+                           if self._row_matches(row, criteria, updated_before,
+                                                updated_after)]
+                # Report matches in insertion order like the other modes
+                if candidates is not None:
+                    matches.sort(key=lambda row: self._positions[row['lead_id']])
+                return {row['lead_id']: dict(row) for row in matches}
+
+        import pandas as pd
+
+        df = self._read_data()
+        mask = pd.Series(True, index=df.index)
+        for column, value in criteria.items():
+            mask &= df[column] == value
+        if updated_before is not None:
+            mask &= df['last_updated'] < updated_before
+        if updated_after is not None:
+            mask &= df['last_updated'] > updated_after
+        return {row['lead_id']: row for row in df[mask].to_dict('records')}
+
+    @staticmethod
+    def _row_matches(row: Dict, criteria: Dict, updated_before: Optional[str],
+                     updated_after: Optional[str]) -> bool:
+        """Check one in-memory row against query criteria."""
+        if any(row.get(column) != value for column, value in criteria.items()):
+            return False
+        last_updated = row.get('last_updated')
+        if updated_before is not None or updated_after is not None:
+            if not isinstance(last_updated, str):
+                return False
+            if updated_before is not None and not last_updated < updated_before:
+                return False
+            if updated_after is not None and not last_updated > updated_after:
+                return False
+        return True
+
+    def flush(self):
+        """Write pending in-memory changes to the CSV file."""
+        if self.journal:
+            with self._lock:
+                if self._journal_fd is not None:
+                    os.fsync(self._journal_fd)
+            return
+        if not self.in_memory:
+            return
+
+        with self._write_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                records = [dict(row) for row in self._rows.values()]
+                self._dirty = 0
+            with self._exclusive():
+                self._write_records(records)
+
+    def close(self):
+        """Stop the background writer and flush any pending changes.
+
+        Closing again, or flushing after closing, does nothing.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._flush_event.set()
+        if self._flush_thread and self._flush_thread.is_alive():
+            self._flush_thread.join()
+        if self._compact_thread and self._compact_thread.is_alive():
+            self._compact_thread.join()
+        self.flush()
+        if self._journal_fd is not None:
+            os.close(self._journal_fd)
+            self._journal_fd = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def metrics(self) -> Dict[str, float]:
+        """Write-lock contention, conflict and I/O counters.
+
+        ``lock_wait_seconds`` is the total time spent waiting for the write
+        lock (other threads and other processes), ``lock_wait_max_seconds``
+        the longest single wait. ``reads`` and ``writes`` count passes over
+        the CSV (or its binary snapshot) and writes to the CSV or journal.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the cross-process write lock on the CSV.
+
+        Re-entrant within a thread; only the outermost holder takes and
+        releases the ``flock``.
+        """
+        start = time.perf_counter()
+        with self._file_mutex:
+            if self._file_lock_depth == 0 and fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            if self._file_lock_depth == 0:
+                self._record_lock_wait(time.perf_counter() - start)
+            self._file_lock_depth += 1
+            try:
+                yield
+            finally:
+                self._file_lock_depth -= 1
+                if self._file_lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _record_lock_wait(self, waited: float):
+        """Account one acquisition of the write lock."""
+        with self._stats_lock:
+            self._stats['lock_acquisitions'] += 1
+            self._stats['lock_wait_seconds'] += waited
+            self._stats['lock_wait_max_seconds'] = max(
+                self._stats['lock_wait_max_seconds'], waited)
+
+    def _count_io(self, reads: int = 0, writes: int = 0):
+        """Account file reads and writes for ``metrics()``."""
+        with self._stats_lock:
+            self._stats['reads'] += reads
+            self._stats['writes'] += writes
+
+    def _check_etag(self, row: Dict, expected_etag: Optional[str]):
+        """Raise ``LeadConflictError`` if ``row`` moved past ``expected_etag``."""
+        if expected_etag is not None and lead_etag(row) != expected_etag:
+            with self._stats_lock:
+                self._stats['conflicts'] += 1
+            raise LeadConflictError(f"Lead {row['lead_id']} was modified concurrently")
+
+    def compact(self):
+        """Fold the journal into a fresh CSV snapshot."""
+        if not self.journal:
+            return
+
+        rotated_path = compacting_path(self.journal_path)
+        with self._write_lock:
+            with self._lock:
+                records = [dict(row) for row in self._rows.values()]
+                # New appends go to a fresh journal while the snapshot is
+                # written. Until the snapshot is in place, recovery replays
+                # the rotated journal as well.
+                os.close(self._journal_fd)
+                os.replace(self.journal_path, rotated_path)
+                self._journal_fd = self._open_journal()
+            with self._exclusive():
+                self._write_records(records)
+            os.remove(rotated_path)
+
+    def _load_index(self):
+        """Load the whole table into the in-memory index."""
+        df = self._read_data()
+        self._rows = {}
+        self._positions = {}
+        self._index = LeadIndex()
+        for row in df.to_dict('records'):
+            self._insert_row(row)
+
+    def _insert_row(self, row: Dict) -> Dict:
+        """Store a new row in memory and index it."""
+        self._positions[row['lead_id']] = len(self._positions)
+        self._rows[row['lead_id']] = row
+        self._index.add(row)
+        return row
+
+    def _update_row(self, row: Dict, values: Dict):
+        """Change an in-memory row and keep the indexes in step."""
+        self._index.change(row, values)
+        row.update(values)
+
+    def _recover_journal(self):
+        """Replay journal records over the snapshot and reopen the journal."""
+        self._journal_fd = recover_journal(
+            self.journal_path, self._apply_record, self._open_journal,
+            lambda: self._write_records(list(self._rows.values())))
+
+    def _apply_record(self, record: Dict):
+        """Apply one decoded journal record to the in-memory index."""
+        if record['op'] == 'add':
+            row = {column: self._decode(record['row'].get(column))
+                   for column in LEAD_COLUMNS}
+            if row['lead_id'] not in self._rows:
+                self._insert_row(row)
+        elif record['op'] == 'update':
+            row = self._rows.get(record['lead_id'])
+            if row is not None:
+                self._update_row(row, {column: self._decode(value)
+                                       for column, value in record['values'].items()})
+
+    def _open_journal(self) -> int:
+        """Open the journal for appending."""
+        return os.open(self.journal_path,
+                       os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _append_journal(self, records: List[Dict]):
+        """Append records to the journal with a single write."""
+        lines = []
+        for record in records:
+            encoded = dict(record)
+            for key in ('row', 'values'):
+                if key in encoded:
+                    encoded[key] = {column: self._encode(value)
+                                    for column, value in encoded[key].items()}
+            lines.append(json.dumps(encoded, separators=(',', ':')) + '\n')
+        os.write(self._journal_fd, ''.join(lines).encode('utf-8'))
+        self._count_io(writes=1)
+
+        if (os.fstat(self._journal_fd).st_size >= self.compact_threshold and
+                not (self._compact_thread and self._compact_thread.is_alive())):
+            self._compact_thread = threading.Thread(target=self.compact)
+            self._compact_thread.daemon = True
+            self._compact_thread.start()
+
+    def _record_change(self, record: Dict):
+        """Persist one change according to the storage mode."""
+        self._record_changes([record])
+
+    def _record_changes(self, records: List[Dict]):
+        """Persist a batch of changes according to the storage mode."""
+        if not records:
+            return
+        if self.journal:
+            self._append_journal(records)
+        else:
+            self._mark_dirty(len(records))
+
+    @staticmethod
+    def _encode(value):
+        """Journal encoding of a cell; missing values become null."""
+        return None if value is None or value != value else str(value)
+
+    @staticmethod
+    def _decode(value):
+        """Inverse of ``_encode``."""
+        return float('nan') if value is None else value
+
+    def _start_flusher(self):
+        """Start a background thread that persists dirty rows."""
+        def flusher():
+            while not self._closed:
+                self._flush_event.wait(self.flush_interval)
+                self._flush_event.clear()
+                self.flush()
+
+        self._flush_thread = threading.Thread(target=flusher)
+        self._flush_thread.daemon = True
+        self._flush_thread.start()
+
+    def _mark_dirty(self, count: int = 1):
+        """Count pending writes and wake the writer past the threshold."""
+        self._dirty += count
+        if self._dirty >= self.flush_threshold:
+            self._flush_event.set()
+
+    def _read_data(self) -> 'pd.DataFrame':
+        """Read the CSV data."""
+        import pandas as pd
+
+        self._count_io(reads=1)
+        if self.binary_snapshot:
+            df = self._load_snapshot()
+            if df is not None:
+                return df
+
+        # Stat before parsing: if the file changes in between, the snapshot
+        # is saved under the old key and simply never matches.
+        stat = os.stat(self.file_path)
+        # Every column is read as text so answers like '30' survive a round trip
+        df = pd.read_csv(self.file_path, **READ_CSV_OPTIONS)
+        if self.binary_snapshot:
+            self._save_snapshot(df, stat)
+        return df
+
+    def _write_records(self, records: List[Dict]):
+        """Write row dicts to CSV."""
+        import pandas as pd
+
+        self._write_data(pd.DataFrame(records, columns=LEAD_COLUMNS))
+
+    def _write_data(self, df: 'pd.DataFrame'):
+        """Write data to CSV."""
+        # Write next to the target and rename so readers never see a torn file
+        tmp_path = f"{self.file_path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        self._count_io(writes=1)
+        stat = os.stat(tmp_path)
+        os.replace(tmp_path, self.file_path)
+        if self.binary_snapshot:
+            self._save_snapshot(df, stat)
+
+    @staticmethod
+    def _snapshot_key(stat: os.stat_result) -> tuple:
+        """Identity of a CSV version for snapshot validation."""
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load_snapshot(self) -> Optional['pd.DataFrame']:
+        """Load the binary snapshot if it matches the CSV on disk."""
+        import pandas as pd
+
+        try:
+            key = self._snapshot_key(os.stat(self.file_path))
+            with open(self.snapshot_path, 'rb') as file, \
+                    mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                payload = pickle.loads(mapped)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+
+        if (payload.get('version') != SNAPSHOT_VERSION or
+                payload.get('columns') != LEAD_COLUMNS or
+                payload.get('key') != key):
+            return None
+        return pd.DataFrame(payload['data'], columns=LEAD_COLUMNS)
+
+    def _save_snapshot(self, df: 'pd.DataFrame', stat: os.stat_result):
+        """Store ``df`` as the binary snapshot of the CSV version ``stat``."""
+        payload = {
+            'version': SNAPSHOT_VERSION,
+            'columns': LEAD_COLUMNS,
+            'key': self._snapshot_key(stat),
+            'data': {column: df[column].to_numpy(dtype=object)
+                     for column in LEAD_COLUMNS},
+        }
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as file:
+                pickle.dump(payload, file, protocol=5)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError:
+            # The snapshot is only an accelerator; the CSV stays authoritative
+            pass
+
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+def create_store(file_path: str, backend: Optional[str] = None, **options) -> LeadStore:
+    """Build the storage backend for ``file_path``.
+
+    ``backend`` is ``'csv'`` or ``'sqlite'``; when omitted it is picked from
+    the file extension.
+    """
+    if backend is None:
+        backend = 'sqlite' if file_path.lower().endswith(SQLITE_EXTENSIONS) else 'csv'
+
+    if backend == 'csv':
+        return CSVLeadStore(file_path, **options)
+    if backend == 'sqlite':
+        from .sqlite_store import SQLiteLeadStore
+        return SQLiteLeadStore(file_path, **options)
+    raise ValueError(f"Unknown storage backend: {backend}")
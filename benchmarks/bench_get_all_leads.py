@@ -0,0 +1,79 @@
+"""Compare get_all_leads with the streaming and columnar read paths.
+
+Usage:
+    python benchmarks/bench_get_all_leads.py [--sizes 10000 100000 1000000]
+
+For each table size a CSV is generated in a temporary directory and every
+method is timed once, with its peak Python allocation measured by
+tracemalloc in a second run.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.data_handler import DataHandler
+
+
+def build_csv(path: str, rows: int):
+    """Write a leads CSV with ``rows`` synthetic leads."""
+    statuses = ['pending', 'in_progress', 'secured', 'no_response']
+    countries = ['USA', 'UK', 'Pakistan', 'Canada', 'Germany']
+    pd.DataFrame({
+        'lead_id': [f"lead_{i}" for i in range(rows)],
+        'name': [f"User {i}" for i in range(rows)],
+        'age': [str(18 + i % 60) for i in range(rows)],
+        'country': [countries[i % len(countries)] for i in range(rows)],
+        'interest': ['Cloud' if i % 3 else 'Analytics' for i in range(rows)],
+        'status': [statuses[i % len(statuses)] for i in range(rows)],
+        'last_updated': ['2023-01-01 12:00:00'] * rows,
+    }).to_csv(path, index=False)
+
+
+def measure(func):
+    """Return (seconds, peak MiB) for one call of ``func``."""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--chunksize', type=int, default=10000)
+    args = parser.parse_args()
+
+    methods = {
+        'get_all_leads': lambda handler: handler.get_all_leads(),
+        'iter_leads': lambda handler: sum(
+            1 for _ in handler.iter_leads(chunksize=args.chunksize)),
+        'leads_frame': lambda handler: handler.leads_frame(
+            columns=['lead_id', 'age', 'status']),
+    }
+
+    print(f"{'rows':>10} {'method':<15} {'seconds':>10} {'peak MiB':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.sizes:
+            path = os.path.join(tmp_dir, f"leads_{rows}.csv")
+            build_csv(path, rows)
+            handler = DataHandler(path)
+            for name, method in methods.items():
+                seconds, peak = measure(lambda: method(handler))
+                print(f"{rows:>10} {name:<15} {seconds:>10.3f} {peak:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
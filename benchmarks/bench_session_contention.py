@@ -0,0 +1,71 @@
+"""Measure SalesAgent.handle_response throughput under thread contention.
+
+Usage:
+    python benchmarks/bench_session_contention.py [--threads 1 4 16 64]
+        [--leads 4000] [--shards 1 16]
+
+For every shard count and thread count a fresh agent with an in-memory
+store is created, ``--leads`` leads are triggered, and the threads split
+the leads between them, each driving its leads through consent and all
+three questions. Storage stays in memory so the session layer is what
+the threads contend on.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.agent import SalesAgent
+from agent.channels import MemoryChannel
+
+ANSWERS = ['yes', '30', 'USA', 'Cloud']
+
+
+def run(tmp_dir: str, threads: int, leads: int, shards: int) -> float:
+    """Return responses handled per second for one configuration."""
+    # Messages go to memory so no output lands inside the timed region
+    agent = SalesAgent(data_file=os.path.join(tmp_dir, f"leads_{shards}_{threads}.csv"),
+                       channel=MemoryChannel(), session_options={'shards': shards},
+                       in_memory=True, flush_interval=3600)
+    lead_ids = [f"lead_{i}" for i in range(leads)]
+    agent.trigger_agents([(lead_id, f"User {lead_id}") for lead_id in lead_ids])
+
+    def worker(assigned):
+        for answer in ANSWERS:
+            for lead_id in assigned:
+                agent.handle_response(lead_id, answer)
+
+    workers = [threading.Thread(target=worker, args=(lead_ids[index::threads],))
+               for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    agent.close()
+    return leads * len(ANSWERS) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--leads', type=int, default=4000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 16])
+    args = parser.parse_args()
+
+    print(f"{'shards':>7} {'threads':>8} {'responses/s':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for shards in args.shards:
+            for threads in args.threads:
+                rate = run(tmp_dir, threads, args.leads, shards)
+                print(f"{shards:>7} {threads:>8} {rate:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
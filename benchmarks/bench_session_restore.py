@@ -0,0 +1,82 @@
+"""Measure how long SessionManager takes to restore persisted sessions.
+
+Usage:
+    python benchmarks/bench_session_restore.py [--sessions 100000] [--rounds 3]
+
+A state directory is filled with ``--sessions`` sessions that each go
+through consent and ``--rounds`` rounds of answers. Restore is then timed
+twice: once from the raw journal holding the whole history, and once
+from a snapshot followed by a short journal of recent changes, which is
+what a restart after background compaction sees.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.session_manager import SessionManager
+
+# Effectively disables background compaction while building history
+NO_COMPACTION = 1 << 62
+
+
+def build_history(state_dir: str, sessions: int, rounds: int) -> SessionManager:
+    """Write a journal with the full history of ``sessions`` sessions."""
+    manager = SessionManager(state_dir=state_dir, compact_threshold=NO_COMPACTION)
+    lead_ids = [f"lead_{i}" for i in range(sessions)]
+    manager.create_sessions({lead_id: {'name': lead_id} for lead_id in lead_ids})
+    for lead_id in lead_ids:
+        manager.update_session(lead_id, {'state': 'questioning'})
+    for round_number in range(rounds):
+        for lead_id in lead_ids:
+            manager.get_next_question(lead_id)
+            manager.record_answer(lead_id, 'age', str(round_number))
+    manager.flush()
+    return manager
+
+
+def timed_restore(state_dir: str) -> float:
+    """Seconds to construct a manager from ``state_dir``."""
+    start = time.perf_counter()
+    SessionManager(state_dir=state_dir, compact_threshold=NO_COMPACTION)
+    return time.perf_counter() - start
+
+
+def file_mib(path: str) -> float:
+    """Size of a file in MiB, or 0 if it does not exist."""
+    return os.path.getsize(path) / (1024 * 1024) if os.path.exists(path) else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--recent', type=int, default=1000,
+                        help="changes made after the snapshot")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        snapshot_path = os.path.join(state_dir, 'sessions.snapshot')
+        journal_path = os.path.join(state_dir, 'sessions.journal')
+
+        manager = build_history(state_dir, args.sessions, args.rounds)
+        journal_size = file_mib(journal_path)
+        seconds = timed_restore(state_dir)
+        print(f"journal only:        {seconds:7.2f}s  "
+              f"(journal {journal_size:.1f} MiB)")
+
+        manager.snapshot()
+        for i in range(args.recent):
+            manager.record_answer(f"lead_{i % args.sessions}", 'country', 'USA')
+        manager.flush()
+        seconds = timed_restore(state_dir)
+        print(f"snapshot + journal:  {seconds:7.2f}s  "
+              f"(snapshot {file_mib(snapshot_path):.1f} MiB, "
+              f"journal {file_mib(journal_path):.2f} MiB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Measure the import cost of the agent package, simulations and main.py.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5] [--top 5]
+
+Each module is imported in a fresh interpreter started with
+``python -X importtime``. The cumulative import time of the module itself
+is reported as the median over ``--repeat`` runs, together with the
+slowest modules it pulled in and whether pandas was loaded.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['agent', 'simulations', 'main']
+
+
+def import_times(module: str) -> dict:
+    """Cumulative import time in microseconds per module for one run."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'module':<12} {'median ms':>10} {'pandas':>7}  slowest imports")
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        median = statistics.median(run[module] for run in runs) / 1000
+        last = runs[-1]
+        # Only top-level packages, so nested imports are not double counted
+        slowest = sorted(
+            ((name, cumulative) for name, cumulative in last.items()
+             if '.' not in name and name != module),
+            key=lambda item: item[1], reverse=True
+        )[:args.top]
+        pandas = 'yes' if 'pandas' in last else 'no'
+        details = ', '.join(f"{name} {cumulative / 1000:.1f}"
+                            for name, cumulative in slowest)
+        print(f"{module:<12} {median:>10.1f} {pandas:>7}  {details}")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,17 +6,24 @@ from datetime import datetime
 import sys
 from typing import Dict, List, Tuple
 import re
-from colorama import init, Fore, Style, Back
 import os
 import random
-import csv
-import pandas as pd
 
-# Initialize colorama for Windows
-init()
+# colorama, csv and pandas are imported on first use so that importing this
+# module (tests, tooling) stays cheap; load_colors() fills these in
+Fore = Style = Back = None
+
+def load_colors():
+    """Import colorama once and initialize it for Windows."""
+    global Fore, Style, Back
+    if Fore is None:
+        import colorama
+        colorama.init()
+        Fore, Style, Back = colorama.Fore, colorama.Style, colorama.Back
 
 class EnhancedSalesConsole:
     def __init__(self):
+        load_colors()
         self.agent = SalesAgent(data_file='leads_interactive.csv')
         self.conversation_history: Dict[str, List[str]] = {}
         self.agent_name = "SalesMind A"
@@ -139,6 +146,8 @@ class EnhancedSalesConsole:
             print(f"{self.error_color}{Fore.WHITE} Error saving conversation: {str(e)} {Style.RESET_ALL}")
 
     def save_to_csv(self, lead_data: dict):
+        import csv
+
         try:
             # Define CSV headers
             headers = [
@@ -167,6 +176,8 @@ class EnhancedSalesConsole:
             print(f"{self.error_color}{Fore.WHITE} Error saving to CSV: {str(e)} {Style.RESET_ALL}")
 
     def show_csv_preview(self):
+        import pandas as pd
+
         try:
             # Read the CSV file
             df = pd.read_csv(self.leads_file)
@@ -379,9 +390,10 @@ class EnhancedSalesConsole:
         self.print_section_header("Thank You!")
         print(self.format_message("Agent", f"Thank you for choosing {self.company_name}, {lead_name}!"))
         print(self.format_message("Agent", "You'll receive your personalized package shortly!"))
-        self.agent.stop()
+        self.agent.close()
 
 def main():
+    load_colors()
     try:
         console = EnhancedSalesConsole()
         console.start_conversation()
@@ -1,5 +1,23 @@
 # Initialize simulations package
-from .lead_simulator import LeadSimulator
-from .time_utils import TimeSimulator
+from importlib import import_module
 
-__all__ = ['LeadSimulator', 'TimeSimulator']
\ No newline at end of file
+# Exports are resolved on first access (PEP 562), see agent/__init__.py
+_EXPORTS = {
+    'LeadSimulator': '.lead_simulator',
+    'LoadGenerator': '.load_generator',
+    'TimeSimulator': '.time_utils',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -52,6 +52,19 @@ class LeadSimulator:
         
         # Get the agent's response
         agent_reply = self.agent.handle_response(lead_id, response)
+        self.record_response(lead_id, response, agent_reply)
+        return agent_reply
+    
+    def record_response(self, lead_id: str, response: str, agent_reply: Optional[str]):
+        """Store an interaction handled outside ``simulate_response``.
+        
+        Args:
+            lead_id: ID of the lead
+            response: Response text
+            agent_reply: Agent's reply to it
+        """
+        if lead_id not in self.leads:
+            return
         
         # Store the interaction
         interaction = {
@@ -68,8 +81,6 @@ class LeadSimulator:
         elif agent_reply and "no problem" in agent_reply:
             self.leads[lead_id]['completed'] = True
             self.leads[lead_id]['status'] = 'no_response'
-        
-        return agent_reply
     
     def simulate_conversation(self, lead_id: str, answers: List[str], 
                             delay: float = 0.5) -> List[str]:
@@ -0,0 +1,263 @@
+"""Drive many concurrent virtual leads against a SalesAgent.
+
+Usage:
+    python -m simulations.load_generator [--leads 2000] [--arrival-rate 500]
+        [--mix complete=0.7,drop_off=0.2,decline=0.1] [--workers 8]
+        [--think-time 0] [--seed 1] [--output results.json]
+
+Leads arrive as a Poisson process and each follows a script picked from
+the response mix. Turns are handled by a ResponseDispatcher, so thousands
+of leads are in flight at once without a thread per lead. Results are
+printed and, with ``--output``, written as JSON for comparison between
+runs.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from agent.agent import SalesAgent
+from agent.channels import MemoryChannel
+from agent.dispatcher import ResponseDispatcher
+from .lead_simulator import LeadSimulator
+
+OUTCOMES = ('complete', 'drop_off', 'decline')
+DEFAULT_MIX = {'complete': 0.7, 'drop_off': 0.2, 'decline': 0.1}
+DEFAULT_ANSWERS = ('30', 'USA', 'Cloud Services')
+CONSENTS = ('yes', 'sure', 'ok', 'yeah sure go ahead')
+REFUSALS = ('no', 'no thanks', 'not interested')
+
+def percentile(values: Sequence[float], percent: int) -> float:
+    """Nearest-rank percentile of sorted ``values``, or 0.0 when empty."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+class LoadGenerator:
+    """Run virtual leads through a SalesAgent concurrently.
+
+    Each lead is created through a LeadSimulator when it arrives, then
+    sends its script one reply at a time, waiting for the agent's answer
+    plus ``think_time`` seconds before the next one. Turn latency is
+    measured from submitting a reply to receiving the answer, so it
+    includes time spent queued behind other leads.
+    """
+
+    def __init__(self, agent: SalesAgent, arrival_rate: float = 500.0,
+                 mix: Optional[Dict[str, float]] = None, workers: int = 8,
+                 think_time: float = 0.0, answers: Sequence[str] = DEFAULT_ANSWERS,
+                 seed: Optional[int] = None):
+        """Initialize the generator.
+
+        Args:
+            agent: SalesAgent instance to load
+            arrival_rate: Mean new leads per second
+            mix: Relative weights of 'complete', 'drop_off' and 'decline'
+            workers: Dispatcher worker threads
+            think_time: Seconds a lead waits between receiving an answer
+                and replying
+            answers: Replies to the questionnaire, in order
+            seed: Random seed for reproducible runs
+        """
+        mix = dict(DEFAULT_MIX if mix is None else mix)
+        unknown = set(mix) - set(OUTCOMES)
+        if unknown:
+            raise ValueError(f"Unknown outcomes in mix: {sorted(unknown)}")
+        if arrival_rate <= 0 or sum(mix.values()) <= 0 or min(mix.values()) < 0:
+            raise ValueError("arrival_rate and mix weights must be positive")
+        self.agent = agent
+        self.simulator = LeadSimulator(agent)
+        self.arrival_rate = arrival_rate
+        self.mix = mix
+        self.workers = workers
+        self.think_time = think_time
+        self.answers = list(answers)
+        self.seed = seed
+        self._state = threading.Condition()
+
+    def run(self, leads: int) -> Dict[str, Any]:
+        """Drive ``leads`` virtual leads to the end of their scripts.
+
+        Args:
+            leads: Number of leads to create
+
+        Returns:
+            Dict[str, Any]: Run settings, outcome counts, throughput in
+            turns per second and turn latency percentiles in milliseconds
+        """
+        rng = random.Random(self.seed)
+        scripts = [self._script(rng) for _ in range(leads)]
+        arrivals, elapsed = [], 0.0
+        for _ in range(leads):
+            elapsed += rng.expovariate(self.arrival_rate)
+            arrivals.append(elapsed)
+
+        self._due: List[Tuple[float, int, str, int]] = []  # (time, seq, lead, step)
+        self._scripts: Dict[str, Tuple[str, List[str]]] = {}
+        self._latencies: List[float] = []
+        self._errors = 0
+        self._active = 0
+        self._sequence = itertools.count()  # breaks ties between due times
+        arrived = 0
+
+        dispatcher = ResponseDispatcher(self.agent, workers=self.workers)
+        dispatcher.start()
+        start = time.perf_counter()
+        try:
+            while True:
+                now = time.perf_counter() - start
+                while arrived < leads and arrivals[arrived] <= now:
+                    lead_id = f"load_{arrived}"
+                    self.simulator.create_lead(f"Lead {arrived}", lead_id)
+                    with self._state:
+                        self._scripts[lead_id] = scripts[arrived]
+                        self._active += 1
+                        heapq.heappush(self._due, (now + self.think_time,
+                                                   next(self._sequence), lead_id, 0))
+                    arrived += 1
+
+                ready = []
+                with self._state:
+                    while self._due and self._due[0][0] <= now:
+                        ready.append(heapq.heappop(self._due))
+                    if not ready:
+                        if arrived == leads and not self._active:
+                            break
+                        wakeups = [self._due[0][0]] if self._due else []
+                        if arrived < leads:
+                            wakeups.append(arrivals[arrived])
+                        timeout = max(min(wakeups) - now, 0) if wakeups else None
+                        self._state.wait(timeout)
+                        continue
+
+                for _, _, lead_id, step in ready:
+                    text = self._scripts[lead_id][1][step]
+                    dispatcher.submit(lead_id, text, callback=partial(
+                        self._turn_done, lead_id, step, text, start, time.perf_counter()))
+            duration = time.perf_counter() - start
+        finally:
+            dispatcher.stop()
+
+        return self._results(leads, duration)
+
+    def _script(self, rng: random.Random) -> Tuple[str, List[str]]:
+        """Pick an outcome from the mix and the replies that lead to it."""
+        outcome = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if outcome == 'decline':
+            return outcome, [rng.choice(REFUSALS)]
+        answers = self.answers
+        if outcome == 'drop_off':
+            answers = answers[:rng.randrange(len(answers))]
+        return outcome, [rng.choice(CONSENTS)] + answers
+
+    def _turn_done(self, lead_id: str, step: int, text: str, start: float,
+                   submitted: float, future: Future):
+        """Record a handled turn and schedule the lead's next reply."""
+        finished = time.perf_counter()
+        error = future.exception()
+        if error is None:
+            self.simulator.record_response(lead_id, text, future.result())
+        with self._state:
+            self._latencies.append(finished - submitted)
+            script = self._scripts[lead_id][1]
+            if error is None and future.result() and step + 1 < len(script):
+                heapq.heappush(self._due, (finished - start + self.think_time,
+                                           next(self._sequence), lead_id, step + 1))
+            else:
+                if error is not None:
+                    self._errors += 1
+                self._active -= 1
+            self._state.notify()
+
+    def _results(self, leads: int, duration: float) -> Dict[str, Any]:
+        """Summarize a finished run."""
+        latencies = sorted(self._latencies)
+        outcomes = {outcome: 0 for outcome in OUTCOMES}
+        for outcome, _ in self._scripts.values():
+            outcomes[outcome] += 1
+        statuses: Dict[str, int] = {}
+        for lead in self.simulator.leads.values():
+            statuses[lead['status']] = statuses.get(lead['status'], 0) + 1
+        return {
+            'leads': leads,
+            'arrival_rate': self.arrival_rate,
+            'mix': self.mix,
+            'workers': self.workers,
+            'think_time': self.think_time,
+            'seed': self.seed,
+            'outcomes': outcomes,
+            'statuses': statuses,
+            'turns': len(latencies),
+            'errors': self._errors,
+            'duration_seconds': duration,
+            'throughput': len(latencies) / duration if duration else 0.0,
+            'latency_ms': {
+                'mean': 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                'p50': 1000 * percentile(latencies, 50),
+                'p95': 1000 * percentile(latencies, 95),
+                'p99': 1000 * percentile(latencies, 99),
+                'max': 1000 * latencies[-1] if latencies else 0.0,
+            },
+        }
+
+def write_results(results: Dict[str, Any], output_path: str):
+    """Write run results as JSON.
+
+    Args:
+        results: Dict returned by ``LoadGenerator.run``
+        output_path: File to write
+    """
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+        file.write('\n')
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse ``complete=0.7,drop_off=0.2,decline=0.1`` into weights."""
+    mix = {}
+    for part in value.split(','):
+        outcome, _, weight = part.partition('=')
+        mix[outcome.strip()] = float(weight)
+    return mix
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load-test a SalesAgent with virtual leads.")
+    parser.add_argument('--leads', type=int, default=2000)
+    parser.add_argument('--arrival-rate', type=float, default=500.0,
+                        help="mean new leads per second")
+    parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="outcome weights, e.g. complete=0.7,drop_off=0.2,decline=0.1")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help="seconds between an answer and the lead's next reply")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--data-file', help="lead storage (default: in memory, "
+                                            "in a temporary directory)")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.data_file:
+            agent = SalesAgent(data_file=args.data_file, channel=MemoryChannel())
+        else:
+            agent = SalesAgent(data_file=os.path.join(tmp_dir, 'leads.csv'),
+                               channel=MemoryChannel(), in_memory=True,
+                               flush_interval=3600)
+        with agent:
+            generator = LoadGenerator(agent, arrival_rate=args.arrival_rate,
+                                      mix=args.mix, workers=args.workers,
+                                      think_time=args.think_time, seed=args.seed)
+            results = generator.run(args.leads)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,20 @@
+import os
 import pytest
+import threading
+import time
 from freezegun import freeze_time
 from datetime import datetime, timedelta
 from agent.agent import SalesAgent
+from agent.channels import MemoryChannel
 from agent.data_handler import DataHandler
+from agent.rate_limit import RateLimiter
 
 @pytest.fixture
 def sales_agent(tmp_path):
     data_file = tmp_path / "test_leads.csv"
     agent = SalesAgent(data_file=str(data_file))
     yield agent
-    agent.stop()
+    agent.close()
 
 def test_agent_initialization(sales_agent):
     assert sales_agent is not None
@@ -69,4 +74,263 @@ def test_follow_up_system(sales_agent):
         lead_data = sales_agent.data_handler.get_lead(lead_id)
         assert lead_data['status'] == 'in_progress'
     
-    sales_agent.stop()
\ No newline at end of file
+    sales_agent.stop()
+
+def test_close_releases_threads_and_files(tmp_path):
+    def open_fds():
+        return len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else 0
+
+    threads, fds = threading.active_count(), open_fds()
+    for i in range(5):
+        with SalesAgent(data_file=str(tmp_path / f"leads_{i}.csv"), in_memory=True,
+                        channel=MemoryChannel()) as agent:
+            agent.trigger_agent("lead", "Lead")
+    agent.close()  # a second close does nothing
+    assert threading.active_count() == threads
+    assert open_fds() == fds
+
+def test_stop_flushes_in_memory_store(tmp_path):
+    data_file = tmp_path / "test_leads.csv"
+    agent = SalesAgent(data_file=str(data_file), in_memory=True,
+                       flush_interval=3600)
+    agent.trigger_agent("flush_me", "Flush Test")
+    agent.stop()
+
+    assert DataHandler(str(data_file)).get_lead("flush_me")['name'] == "Flush Test"
+    agent.close()
+
+@freeze_time("2023-01-01 12:00:00")
+def test_lead_lifecycle_with_sqlite_backend(tmp_path):
+    agent = SalesAgent(data_file=str(tmp_path / "test_leads.db"))
+    agent.trigger_agent("sqlite_lead", "Jane Doe")
+    agent.handle_response("sqlite_lead", "yes")
+    for answer in ("41", "Canada", "Analytics"):
+        agent.handle_response("sqlite_lead", answer)
+
+    lead_data = agent.data_handler.get_lead("sqlite_lead")
+    assert lead_data['age'] == '41'
+    assert lead_data['status'] == 'secured'
+    agent.close()
+
+def test_trigger_agents_in_bulk(sales_agent, capsys):
+    sales_agent.trigger_agent("bulk_1", "Existing Lead")
+    sales_agent.outbox.flush()
+    capsys.readouterr()
+
+    triggered = sales_agent.trigger_agents([
+        ("bulk_1", "Existing Lead"),
+        ("bulk_2", "Second Lead"),
+        ("bulk_3", "Third Lead"),
+    ])
+
+    assert triggered == ["bulk_2", "bulk_3"]
+    sales_agent.outbox.flush()
+    output = capsys.readouterr().out
+    assert "1 leads already exist" in output
+    assert "Message sent to Second Lead (ID: bulk_2)" in output
+    assert "Message sent to Third Lead (ID: bulk_3)" in output
+    assert sales_agent.session_manager.get_session("bulk_3")['state'] == 'initial'
+    assert "What is your age?" in sales_agent.handle_response("bulk_2", "yes")
+
+def test_unanswered_consent_expires(tmp_path):
+    agent = SalesAgent(data_file=str(tmp_path / "test_leads.csv"),
+                       session_options={'initial_ttl_hours': 48})
+    with freeze_time("2023-01-01 12:00:00"):
+        agent.trigger_agent("silent", "Silent Lead")
+    with freeze_time("2023-01-03 13:00:00"):
+        agent.check_for_follow_ups()
+
+    assert agent.session_manager.get_session("silent") is None
+    assert agent.data_handler.get_lead("silent")['status'] == 'no_response'
+    agent.close()
+
+def test_consent_prompt_expires_by_default(tmp_path):
+    agent = SalesAgent(data_file=str(tmp_path / "test_leads.csv"))
+    with freeze_time("2023-01-01 12:00:00"):
+        agent.trigger_agent("silent", "Silent Lead")
+    with freeze_time("2023-01-04 13:00:00"):
+        agent.check_for_follow_ups()
+    assert agent.session_manager.get_session("silent") is None
+    agent.close()
+
+def test_questionnaire_continues_after_restart(tmp_path):
+    data_file = str(tmp_path / "test_leads.csv")
+    options = {'state_dir': str(tmp_path / "sessions")}
+    agent = SalesAgent(data_file=data_file, session_options=options)
+    agent.trigger_agent("restart", "Restart Test")
+    agent.handle_response("restart", "yes")
+    agent.handle_response("restart", "30")
+    agent.stop()
+
+    restarted = SalesAgent(data_file=data_file, session_options=options)
+    assert restarted.handle_response("restart", "USA") == \
+        "What product or service are you interested in?"
+    assert restarted.data_handler.get_lead("restart")['country'] == "USA"
+    restarted.close()
+    agent.close()
+
+def test_custom_flow_secures_lead_at_its_end(tmp_path):
+    flow = [{'key': 'interest', 'text': 'What are you interested in?',
+             'branches': {'nothing': 'end'}},
+            {'key': 'country', 'text': 'Which country are you from?'}]
+    agent = SalesAgent(data_file=str(tmp_path / "test_leads.csv"),
+                       session_options={'flow': flow})
+    agent.trigger_agent("flow_1", "Flow One")
+    assert agent.handle_response("flow_1", "yes") == 'What are you interested in?'
+    assert agent.handle_response("flow_1", "Cloud") == 'Which country are you from?'
+    assert agent.data_handler.get_lead("flow_1")['status'] == 'in_progress'
+    agent.handle_response("flow_1", "UK")
+    assert agent.data_handler.get_lead("flow_1")['status'] == 'secured'
+
+    agent.trigger_agent("flow_2", "Flow Two")
+    agent.handle_response("flow_2", "yes")
+    agent.handle_response("flow_2", "Nothing")
+    lead = agent.data_handler.get_lead("flow_2")
+    assert lead['status'] == 'secured'
+    assert lead['interest'] == 'Nothing'
+    agent.close()
+
+
+def test_follow_up_sent_as_soon_as_due(sales_agent, capsys):
+    sales_agent.follow_up_hours = 0.2 / 3600  # 200 ms
+    sales_agent.start()
+    sales_agent.trigger_agent("due_soon", "Due Soon")
+    sales_agent.handle_response("due_soon", "yes")
+    asked = time.perf_counter()
+
+    while "Follow-up sent to Due Soon" not in capsys.readouterr().out:
+        assert time.perf_counter() - asked < 2
+        time.sleep(0.01)
+    assert time.perf_counter() - asked >= 0.2
+
+def test_idle_monitor_sleeps_until_stopped(sales_agent, monkeypatch):
+    checks = []
+    check = sales_agent.check_for_follow_ups
+    monkeypatch.setattr(sales_agent, 'check_for_follow_ups',
+                        lambda: checks.append(1) or check())
+    sales_agent.start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    sales_agent.stop()
+
+    assert time.perf_counter() - start < 0.5
+    assert len(checks) == 1
+
+@pytest.mark.parametrize("file_name,reads", [("leads.csv", 1), ("leads.db", 0)])
+def test_each_turn_is_one_read_and_one_write(tmp_path, file_name, reads):
+    agent = SalesAgent(data_file=str(tmp_path / file_name),
+                       session_options={'state_dir': str(tmp_path / "sessions")})
+    agent.trigger_agent("turns", "Turn Test")
+    journal = tmp_path / "sessions" / "sessions.journal"
+
+    for answer in ['yes', '30', 'USA', 'Cloud']:
+        before = agent.data_handler.metrics()
+        events = len(journal.read_text().splitlines())
+        assert agent.handle_response("turns", answer)
+        after = agent.data_handler.metrics()
+        assert after['reads'] - before['reads'] == reads
+        assert after['writes'] - before['writes'] == 1
+        assert len(journal.read_text().splitlines()) - events == 1
+
+    assert agent.data_handler.get_lead("turns")['status'] == 'secured'
+    assert agent.session_manager.get_session("turns") is None
+    agent.close()
+
+def test_follow_up_sweep_reads_storage_once(tmp_path, capsys, caplog):
+    agent = SalesAgent(data_file=str(tmp_path / "test_leads.csv"))
+    with freeze_time("2023-01-01 12:00:00"):
+        agent.trigger_agents([(f"lead_{i}", f"User {i}") for i in range(20)])
+        for i in range(10):
+            agent.handle_response(f"lead_{i}", "yes")
+        # Consented but no longer in progress: rescheduled without a message
+        agent.data_handler.update_lead("lead_0", {'status': 'secured'})
+    agent.outbox.flush()
+    capsys.readouterr()
+
+    reads = agent.data_handler.metrics()['reads']
+    with freeze_time("2023-01-02 13:00:00"), caplog.at_level('INFO', logger='agent.agent'):
+        agent.check_for_follow_ups()
+    assert agent.data_handler.metrics()['reads'] - reads == 1
+    agent.outbox.flush()
+    assert capsys.readouterr().out.count("Follow-up sent to") == 9
+    assert "Follow-up sweep: 10 candidates, 9 follow-ups" in caplog.text
+
+    with freeze_time("2023-01-02 14:00:00"):
+        assert agent.session_manager.check_inactive_sessions(hours=24) == {}
+    agent.close()
+
+def test_messages_are_queued_and_delivered_in_batches(tmp_path):
+    channel = MemoryChannel()
+    agent = SalesAgent(data_file=str(tmp_path / "test_leads.csv"), channel=channel,
+                       outbox_options={'batch_size': 50, 'batch_window': 0.5})
+    agent.trigger_agents([(f"lead_{i}", f"User {i}") for i in range(120)])
+    agent.trigger_agent("single", "Single Lead")
+    agent.stop()
+
+    assert [message.lead_id for message in channel.sent] == \
+        [f"lead_{i}" for i in range(120)] + ["single"]
+    assert channel.sent[-1].text.startswith("Hey Single Lead")
+    assert channel.batches == 3
+    metrics = agent.outbox.metrics()
+    assert metrics['sent'] == 121 and metrics['queued'] == 0
+    assert 0 < metrics['latency_p50'] <= metrics['latency_p99']
+    agent.close()
+
+def test_follow_up_burst_is_rate_limited(tmp_path):
+    clock = [0.0]
+    channel = MemoryChannel()
+    agent = SalesAgent(data_file=str(tmp_path / "test_leads.csv"), channel=channel,
+                       rate_limiter=RateLimiter(rate=2, burst=2, clock=lambda: clock[0]))
+    with freeze_time("2023-01-01 12:00:00"):
+        agent.trigger_agents([(f"lead_{i}", f"User {i}") for i in range(5)])
+        for i in range(5):
+            agent.handle_response(f"lead_{i}", "yes")
+
+    with freeze_time("2023-01-02 13:00:00"):
+        agent.check_for_follow_ups()
+        assert agent.follow_ups.metrics()['backlog'] == 3
+        assert agent._seconds_until(None) == pytest.approx(0.5)
+
+        agent.handle_response("lead_2", "30")  # answered before its follow-up
+        clock[0] = 1.0
+        agent.check_for_follow_ups()
+    agent.outbox.flush()
+
+    follow_ups = [message.lead_id for message in channel.sent if message.kind == 'follow_up']
+    assert follow_ups == ["lead_0", "lead_1", "lead_3", "lead_4"]
+    assert len(agent.follow_ups) == 0
+    agent.close()
+
+def test_redelivered_message_gets_the_same_reply(tmp_path):
+    agent = SalesAgent(data_file=str(tmp_path / "test_leads.csv"))
+    agent.trigger_agent("dup", "Duplicate Test")
+    assert agent.handle_response("dup", "yes", message_id="m1") == "What is your age?"
+    assert agent.handle_response("dup", "30", message_id="m2") == \
+        "Which country are you from?"
+
+    reads = agent.data_handler.metrics()['reads']
+    # The webhook redelivers "30"; it must not become the country
+    assert agent.handle_response("dup", "30", message_id="m2") == \
+        "Which country are you from?"
+    assert agent.data_handler.metrics()['reads'] == reads
+    assert agent.session_manager.get_session("dup")['current_question'] == 'country'
+    assert agent.data_handler.get_lead("dup")['country'] != '30'
+
+    metrics = agent.reply_cache.metrics()
+    assert metrics['hits'] == 1 and metrics['misses'] == 2
+    assert metrics['hit_rate'] == pytest.approx(1 / 3)
+    assert metrics['entries'] == 2 and metrics['memory_bytes'] > 0
+    agent.close()
+
+def test_consent_is_read_from_free_text(tmp_path):
+    agent = SalesAgent(data_file=str(tmp_path / "leads.csv"), channel=MemoryChannel())
+    agent.trigger_agents([("lead_1", "John"), ("lead_2", "Jane")])
+
+    assert "What is your age?" in agent.handle_response("lead_1", "yeah sure go ahead")
+    assert agent.data_handler.get_lead("lead_1")['status'] == 'in_progress'
+
+    assert "whenever you're ready" in agent.handle_response("lead_2", "maybe later")
+    assert agent.session_manager.get_session("lead_2")['state'] == 'initial'
+    assert agent.data_handler.get_lead("lead_2")['status'] == 'pending'
+    assert "What is your age?" in agent.handle_response("lead_2", "ok")
+    agent.close()
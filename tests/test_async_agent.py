@@ -0,0 +1,107 @@
+import asyncio
+import os
+import pytest
+import threading
+import time
+from agent.async_agent import AsyncSalesAgent
+
+@pytest.fixture
+def async_agent(tmp_path):
+    agent = AsyncSalesAgent(data_file=str(tmp_path / "test_leads.csv"))
+    yield agent
+    asyncio.run(agent.close())
+
+def test_async_conversation(async_agent):
+    async def conversation():
+        async with async_agent:
+            assert async_agent.running
+            assert await async_agent.trigger_agent("async_1", "Async User")
+            assert not await async_agent.trigger_agent("async_1", "Async User")
+            assert await async_agent.handle_response("async_1", "yes") == "What is your age?"
+            await async_agent.handle_response("async_1", "30")
+            await async_agent.handle_response("async_1", "USA")
+            return await async_agent.handle_response("async_1", "Cloud")
+
+    final = asyncio.run(conversation())
+    assert final.startswith("Thank you for providing all the information!")
+    assert not async_agent.running
+    lead_data = async_agent.data_handler.get_lead("async_1")
+    assert lead_data['status'] == 'secured'
+    assert lead_data['interest'] == 'Cloud'
+
+def test_many_conversations_share_one_loop(async_agent):
+    lead_ids = [f"lead_{i}" for i in range(50)]
+
+    async def converse(lead_id):
+        replies = []
+        for answer in ('yes', '30', 'UK', 'Analytics'):
+            replies.append(await async_agent.handle_response(lead_id, answer))
+        return replies
+
+    async def run_all():
+        await async_agent.trigger_agents([(lead_id, lead_id) for lead_id in lead_ids])
+        results = await asyncio.gather(*(converse(lead_id) for lead_id in lead_ids))
+        await async_agent.stop()
+        return results
+
+    for replies in asyncio.run(run_all()):
+        assert replies[:3] == ["What is your age?", "Which country are you from?",
+                               "What product or service are you interested in?"]
+    assert all(lead['status'] == 'secured'
+               for lead in async_agent.data_handler.get_leads(lead_ids).values())
+
+def test_storage_calls_do_not_block_the_loop(async_agent):
+    loop_thread = []
+
+    def slow_update_lead(lead_id, updates):
+        loop_thread.append(threading.current_thread())
+        time.sleep(0.2)
+        return False
+
+    async_agent.agent.trigger_agent("slow", "Slow Storage")
+    async_agent.data_handler.update_lead = slow_update_lead
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await async_agent.handle_response("slow", "yes")
+        task.cancel()
+        await async_agent.stop()
+        return ticks
+
+    assert asyncio.run(run()) >= 5
+    assert loop_thread[0] is not threading.main_thread()
+
+def test_stop_cancels_follow_up_task_immediately(async_agent):
+    async def run():
+        await async_agent.start()
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        await async_agent.stop()
+        return time.perf_counter() - start
+
+    assert asyncio.run(run()) < 1
+    assert async_agent.follow_up_task is None
+
+def test_async_with_releases_threads_and_files(tmp_path):
+    def open_fds():
+        return len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else 0
+
+    async def run(i):
+        async with AsyncSalesAgent(data_file=str(tmp_path / f"leads_{i}.csv")) as agent:
+            await agent.trigger_agent("lead", "Lead")
+        return agent
+
+    threads, fds = threading.active_count(), open_fds()
+    for i in range(5):
+        agent = asyncio.run(run(i))
+    asyncio.run(agent.close())  # a second close does nothing
+    assert threading.active_count() == threads
+    assert open_fds() == fds
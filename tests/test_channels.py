@@ -0,0 +1,64 @@
+import json
+import pytest
+import queue
+import threading
+from agent.channels import FileChannel, MemoryChannel, Message, OutboundQueue
+
+class FlakyChannel(MemoryChannel):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def send_batch(self, messages):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("gateway unavailable")
+        super().send_batch(messages)
+
+def test_failed_batches_are_retried_with_backoff():
+    channel = FlakyChannel(failures=2)
+    outbox = OutboundQueue(channel, retries=3, backoff=0.001)
+    outbox.send(Message("lead_1", "User One", "Hello"))
+    outbox.flush()
+
+    assert [message.text for message in channel.sent] == ["Hello"]
+    metrics = outbox.metrics()
+    assert metrics['retries'] == 2 and metrics['sent'] == 1 and metrics['failed'] == 0
+    outbox.close()
+
+def test_batch_is_dropped_after_last_retry():
+    outbox = OutboundQueue(FlakyChannel(failures=10), retries=1, backoff=0.001)
+    outbox.send_many([Message("lead_1", "One", "a"), Message("lead_2", "Two", "b")])
+    outbox.close()
+
+    assert outbox.metrics()['failed'] == 2
+    with pytest.raises(RuntimeError):
+        outbox.send(Message("lead_3", "Three", "c"))
+
+def test_full_queue_blocks_the_producer():
+    release = threading.Event()
+
+    class BlockedChannel(MemoryChannel):
+        def send_batch(self, messages):
+            release.wait(5)
+            super().send_batch(messages)
+
+    outbox = OutboundQueue(BlockedChannel(), max_queue=2, batch_size=1)
+    for text in "abc":
+        outbox.send(Message("lead_1", "One", text))
+    with pytest.raises(queue.Full):
+        outbox.send(Message("lead_1", "One", "d"), timeout=0.05)
+    release.set()
+    outbox.close()
+    assert [message.text for message in outbox.channel.sent] == list("abc")
+
+def test_file_channel_appends_json_lines(tmp_path):
+    path = tmp_path / "outbox.jsonl"
+    outbox = OutboundQueue(FileChannel(str(path)))
+    outbox.send(Message("lead_1", "One", "Hello"))
+    outbox.send(Message("lead_2", "Two", "Checking in", 'follow_up'))
+    outbox.close()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['lead_id'] for line in lines] == ["lead_1", "lead_2"]
+    assert lines[1]['kind'] == 'follow_up'
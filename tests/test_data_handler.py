@@ -1,6 +1,7 @@
 import pytest
 import pandas as pd
 import os
+import time
 from datetime import datetime
 from agent.data_handler import DataHandler
 
@@ -65,4 +66,146 @@ def test_get_all_leads(data_handler):
     all_leads = data_handler.get_all_leads()
     assert len(all_leads) == 2
     assert all_leads["lead_1"]['name'] == "User One"
-    assert all_leads["lead_2"]['name'] == "User Two"
\ No newline at end of file
+    assert all_leads["lead_2"]['name'] == "User Two"
+
+def test_in_memory_mode_defers_writes_until_flush(tmp_path):
+    data_file = tmp_path / "memory_data.csv"
+    handler = DataHandler(file_path=str(data_file), in_memory=True,
+                          flush_interval=3600, flush_threshold=1000)
+
+    assert handler.add_lead("lead_1", "User One")
+    assert handler.update_lead("lead_1", {'age': '30', 'status': 'in_progress'})
+    assert handler.get_lead("lead_1")['age'] == '30'
+
+    # Nothing has reached the file yet
+    assert pd.read_csv(data_file).empty
+
+    handler.flush()
+    reloaded = DataHandler(file_path=str(data_file)).get_lead("lead_1")
+    assert reloaded['age'] == '30'
+    assert reloaded['status'] == 'in_progress'
+    handler.close()
+
+def test_in_memory_mode_flushes_past_threshold(tmp_path):
+    data_file = tmp_path / "memory_data.csv"
+    handler = DataHandler(file_path=str(data_file), in_memory=True,
+                          flush_interval=3600, flush_threshold=2)
+
+    handler.add_lead("lead_1", "User One")
+    handler.add_lead("lead_2", "User Two")
+
+    for _ in range(50):
+        if len(pd.read_csv(data_file)) == 2:
+            break
+        time.sleep(0.05)
+    assert len(pd.read_csv(data_file)) == 2
+    handler.close()
+
+def test_in_memory_mode_loads_existing_file(tmp_path):
+    data_file = tmp_path / "memory_data.csv"
+    DataHandler(file_path=str(data_file)).add_lead("lead_1", "User One")
+
+    handler = DataHandler(file_path=str(data_file), in_memory=True)
+    assert handler.get_lead("lead_1")['name'] == "User One"
+    assert not handler.add_lead("lead_1", "User One")
+    handler.close()
+
+def test_journal_mode_appends_instead_of_rewriting(tmp_path):
+    data_file = tmp_path / "journal_data.csv"
+    handler = DataHandler(file_path=str(data_file), journal=True)
+    snapshot_mtime = os.stat(data_file).st_mtime_ns
+
+    handler.add_lead("lead_1", "User One")
+    handler.update_lead("lead_1", {'age': '30'})
+
+    assert os.stat(data_file).st_mtime_ns == snapshot_mtime
+    with open(handler.store.journal_path) as journal:
+        assert len(journal.readlines()) == 2
+    handler.close()
+
+    reopened = DataHandler(file_path=str(data_file), journal=True)
+    assert reopened.get_lead("lead_1")['age'] == '30'
+    assert pd.isna(reopened.get_lead("lead_1")['country'])
+    reopened.close()
+
+def test_journal_recovery_stops_at_torn_record(tmp_path):
+    data_file = tmp_path / "journal_data.csv"
+    handler = DataHandler(file_path=str(data_file), journal=True)
+    handler.add_lead("lead_1", "User One")
+    handler.update_lead("lead_1", {'age': '30'})
+    handler.close()
+
+    # Simulate a crash halfway through appending the next record
+    with open(handler.store.journal_path, 'a') as journal:
+        journal.write('{"op":"update","lead_id":"lead_1","val')
+
+    recovered = DataHandler(file_path=str(data_file), journal=True)
+    assert recovered.get_lead("lead_1")['age'] == '30'
+    recovered.update_lead("lead_1", {'country': 'USA'})
+    recovered.close()
+
+    reopened = DataHandler(file_path=str(data_file), journal=True)
+    assert reopened.get_lead("lead_1")['country'] == 'USA'
+    reopened.close()
+
+def test_journal_compaction_folds_into_snapshot(tmp_path):
+    data_file = tmp_path / "journal_data.csv"
+    handler = DataHandler(file_path=str(data_file), journal=True,
+                          compact_threshold=1)
+
+    handler.add_lead("lead_1", "User One")
+    handler.update_lead("lead_1", {'age': '30'})
+    handler.close()
+
+    assert os.path.getsize(handler.store.journal_path) < 200
+    assert DataHandler(file_path=str(data_file)).get_lead("lead_1")['age'] == '30'
+    reopened = DataHandler(file_path=str(data_file), journal=True)
+    assert reopened.get_lead("lead_1")['age'] == '30'
+    reopened.close()
+
+@pytest.mark.parametrize("options", [{}, {'in_memory': True}, {'journal': True}])
+def test_batch_add_update_get(tmp_path, options):
+    handler = DataHandler(file_path=str(tmp_path / "batch_data.csv"), **options)
+    handler.add_lead("lead_1", "User One")
+
+    added = handler.add_leads([
+        ("lead_1", "User One"),
+        ("lead_2", "User Two"),
+        ("lead_3", "User Three"),
+        ("lead_3", "User Three"),
+        ("", "Nameless"),
+    ])
+    assert added == ["lead_2", "lead_3"]
+
+    updated = handler.update_leads({
+        "lead_1": {'age': '30'},
+        "lead_2": {'country': 'USA', 'status': 'in_progress'},
+        "missing": {'age': '99'},
+    })
+    assert sorted(updated) == ["lead_1", "lead_2"]
+
+    leads = handler.get_leads(["lead_1", "lead_2", "missing"])
+    assert set(leads) == {"lead_1", "lead_2"}
+    assert leads["lead_1"]['age'] == '30'
+    assert pd.isna(leads["lead_1"]['country'])
+    assert leads["lead_2"]['country'] == 'USA'
+    assert leads["lead_2"]['status'] == 'in_progress'
+    assert handler.get_lead("lead_3")['status'] == 'pending'
+    handler.close()
+
+@pytest.mark.parametrize("file_name,options", [
+    ("leads.csv", {}),
+    ("leads.csv", {'in_memory': True}),
+    ("leads.csv", {'journal': True}),
+    ("leads.db", {}),
+])
+def test_close_and_flush_after_close_are_harmless(tmp_path, file_name, options):
+    handler = DataHandler(file_path=str(tmp_path / file_name), **options)
+    handler.add_lead("lead_1", "User One")
+    handler.close()
+
+    handler.flush()
+    handler.close()
+    reopened = DataHandler(file_path=str(tmp_path / file_name), **options)
+    assert reopened.get_lead("lead_1")['name'] == "User One"
+    reopened.close()
@@ -0,0 +1,71 @@
+import pytest
+import queue
+import threading
+from agent.agent import SalesAgent
+from agent.dispatcher import ResponseDispatcher
+
+ANSWERS = ['yes', '30', 'USA', 'Cloud']
+
+@pytest.fixture
+def sales_agent(tmp_path):
+    agent = SalesAgent(data_file=str(tmp_path / "test_leads.csv"), in_memory=True,
+                       flush_interval=3600)
+    yield agent
+    agent.close()
+
+def test_replies_of_a_lead_stay_in_order(sales_agent):
+    lead_ids = [f"lead_{i}" for i in range(40)]
+    sales_agent.trigger_agents([(lead_id, f"User {lead_id}") for lead_id in lead_ids])
+
+    with ResponseDispatcher(sales_agent, workers=4) as dispatcher:
+        futures = {lead_id: [dispatcher.submit(lead_id, answer) for answer in ANSWERS]
+                   for lead_id in lead_ids}
+        replies = {lead_id: [future.result(timeout=10) for future in lead_futures]
+                   for lead_id, lead_futures in futures.items()}
+
+    for lead_id in lead_ids:
+        assert replies[lead_id][0] == "What is your age?"
+        assert replies[lead_id][-1].startswith("Thank you for providing")
+        assert sales_agent.data_handler.get_lead(lead_id)['status'] == 'secured'
+    stats = dispatcher.stats()
+    assert sum(worker['handled'] for worker in stats) == len(lead_ids) * len(ANSWERS)
+    assert sum(worker['handled'] > 0 for worker in stats) > 1
+    assert all(worker['queue_depth'] == 0 for worker in stats)
+
+def test_callback_and_errors_go_through_the_future(sales_agent, monkeypatch):
+    sales_agent.trigger_agent("lead_1", "User")
+    done = []
+    with ResponseDispatcher(sales_agent, workers=2) as dispatcher:
+        assert dispatcher.submit("lead_1", "yes", callback=done.append).result(timeout=5) \
+            == "What is your age?"
+
+        def broken(lead_id, response, message_id=None):
+            raise RuntimeError("storage down")
+        monkeypatch.setattr(sales_agent, 'handle_response', broken)
+        with pytest.raises(RuntimeError, match="storage down"):
+            dispatcher.submit("lead_1", "30").result(timeout=5)
+
+    assert len(done) == 1
+    assert sum(worker['errors'] for worker in dispatcher.stats()) == 1
+    with pytest.raises(RuntimeError):
+        dispatcher.submit("lead_1", "30")
+
+def test_full_worker_queue_pushes_back(sales_agent, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(sales_agent, 'handle_response',
+                        lambda lead_id, response, message_id=None: release.wait(5) and response)
+    dispatcher = ResponseDispatcher(sales_agent, workers=1, queue_size=2)
+    dispatcher.start()
+    first = dispatcher.submit("lead_1", "a")
+    while not first.running():
+        pass
+    dispatcher.submit("lead_1", "b")
+    dispatcher.submit("lead_1", "c")
+    assert dispatcher.stats()[0]['queue_depth'] == 2
+
+    with pytest.raises(queue.Full):
+        dispatcher.submit("lead_1", "d", timeout=0.05)
+    release.set()
+    dispatcher.stop()
+    assert dispatcher.stats()[0]['handled'] == 3
+    assert dispatcher.stats()[0]['max_queue_depth'] == 2
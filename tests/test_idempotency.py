@@ -0,0 +1,40 @@
+from agent.idempotency import MISSING, IdempotencyCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = IdempotencyCache(ttl=10, clock=clock)
+    cache.put(("lead_1", "m1"), "What is your age?")
+    cache.put(("lead_1", "m2"), None)
+    assert cache.get(("lead_1", "m2")) is None
+
+    clock.now = 10
+    assert cache.get(("lead_1", "m1")) is MISSING
+    cache.put(("lead_2", "m1"), "Hi")
+    assert len(cache) == 1
+    metrics = cache.metrics()
+    assert metrics['expired'] == 2
+    assert metrics['hits'] == 1 and metrics['misses'] == 1
+
+def test_least_recently_used_entries_are_evicted():
+    cache = IdempotencyCache(max_entries=2)
+    cache.put("m1", "one")
+    cache.put("m2", "two")
+    cache.get("m1")
+    cache.put("m3", "three")
+
+    assert cache.get("m2") is MISSING
+    assert cache.get("m1") == "one" and cache.get("m3") == "three"
+    assert cache.metrics()['evictions'] == 1
+
+    size = cache.metrics()['memory_bytes']
+    cache.put("m1", "one again")
+    assert cache.metrics()['memory_bytes'] > size
+    cache.clear()
+    assert cache.metrics()['memory_bytes'] == 0
@@ -0,0 +1,40 @@
+import pytest
+from agent.intent import UNKNOWN, IntentClassifier, load_model, normalize, save_model, train
+
+@pytest.fixture(scope='module')
+def model():
+    return train()
+
+def test_batch_classifies_consent_refusal_and_deferral(model):
+    classifier = IntentClassifier(model=model)
+    replies = ["yes", "Yeah sure, go ahead!", "okay", "No thanks", "not interested",
+               "maybe later", "busy right now", "30", ""]
+    assert classifier.classify(replies) == [
+        'consent', 'consent', 'consent', 'refusal', 'refusal',
+        'deferral', 'deferral', UNKNOWN, UNKNOWN,
+    ]
+
+def test_repeated_replies_are_served_from_the_cache(model):
+    classifier = IntentClassifier(model=model, cache_size=2)
+    assert normalize("  Sure!! ") == normalize("sure") == "sure"
+    classifier.classify(["sure", "Sure!", " SURE "])
+    metrics = classifier.metrics()
+    assert metrics['misses'] == 3 and metrics['cached'] == 1
+
+    assert classifier.classify_one("sure.") == 'consent'
+    classifier.classify(["no", "later"])
+    assert classifier.metrics()['hits'] == 1
+    assert classifier.metrics()['cached'] == 2
+
+def test_saved_model_is_loaded(model, tmp_path):
+    path = tmp_path / "intent_model.json"
+    assert load_model(str(path)) is None
+    save_model(model, str(path))
+    classifier = IntentClassifier(model_path=str(path))
+    assert classifier.classify_one("no way") == 'refusal'
+    assert classifier.model.probabilities("no way") == \
+        pytest.approx(model.probabilities("no way"), abs=1e-4)
+
+def test_bundled_model_is_used_without_training():
+    assert load_model() is not None
+    assert IntentClassifier().model is load_model()
@@ -0,0 +1,32 @@
+import json
+import pytest
+from agent.agent import SalesAgent
+from agent.channels import MemoryChannel
+from simulations.load_generator import LoadGenerator, parse_mix, write_results
+
+def test_virtual_leads_follow_the_response_mix(tmp_path):
+    agent = SalesAgent(data_file=str(tmp_path / "leads.csv"), channel=MemoryChannel(),
+                       in_memory=True)
+    generator = LoadGenerator(agent, arrival_rate=5000, workers=4, seed=7,
+                              mix=parse_mix("complete=2,drop_off=1,decline=1"))
+    results = generator.run(200)
+    agent.close()
+
+    outcomes = results['outcomes']
+    assert sum(outcomes.values()) == 200 and results['errors'] == 0
+    assert results['statuses'].get('secured') == outcomes['complete']
+    assert results['statuses'].get('no_response') == outcomes['decline']
+    assert results['statuses'].get('pending') == outcomes['drop_off']
+    assert results['turns'] >= 4 * outcomes['complete'] + outcomes['decline']
+    latency = results['latency_ms']
+    assert 0 < latency['p50'] <= latency['p95'] <= latency['p99'] <= latency['max']
+
+    output = tmp_path / "results.json"
+    write_results(results, str(output))
+    assert json.loads(output.read_text())['turns'] == results['turns']
+
+def test_unknown_outcome_is_rejected(tmp_path):
+    agent = SalesAgent(data_file=str(tmp_path / "leads.csv"), channel=MemoryChannel())
+    with pytest.raises(ValueError):
+        LoadGenerator(agent, mix={'ghost': 1.0})
+    agent.close()
@@ -0,0 +1,51 @@
+import pytest
+from agent.channels import Message
+from agent.rate_limit import DeferredQueue, RateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_global_bucket_allows_burst_then_rate():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=2, burst=3, clock=clock)
+    assert [limiter.try_acquire(f"lead_{i}") for i in range(4)] == [True] * 3 + [False]
+    assert limiter.wait_time() == pytest.approx(0.5)
+
+    clock.now = 0.5
+    assert limiter.try_acquire("lead_4")
+    assert not limiter.try_acquire("lead_5")
+
+def test_destination_bucket_limits_one_destination_only():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=100, destination_rate=0.1, clock=clock)
+    assert limiter.try_acquire("lead_1")
+    assert not limiter.try_acquire("lead_1")
+    assert limiter.try_acquire("lead_2")
+    assert limiter.wait_time(["lead_1"]) == pytest.approx(10)
+    assert limiter.wait_time(["lead_1", "lead_3"]) == 0
+
+    clock.now = 10
+    assert limiter.try_acquire("lead_1")
+
+def test_deferred_queue_spreads_a_burst_over_ticks():
+    clock = FakeClock()
+    backlog = DeferredQueue(RateLimiter(rate=10, burst=10, clock=clock), window=5)
+    backlog.add(Message(f"lead_{i}", f"User {i}", "Checking in", 'follow_up')
+                for i in range(25))
+
+    assert [message.lead_id for message in backlog.drain()] == \
+        [f"lead_{i}" for i in range(10)]
+    assert backlog.metrics()['backlog'] == 15
+    assert backlog.retry_after() == pytest.approx(0.1)
+
+    clock.now = 1.0
+    assert len(backlog.drain()) == 10
+    assert backlog.discard("lead_24")
+    clock.now = 2.0
+    assert len(backlog.drain()) == 4
+    assert backlog.retry_after() is None
+    assert backlog.metrics() == {'backlog': 0, 'sent': 24, 'drain_rate': 24 / 5}
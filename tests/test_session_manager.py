@@ -1,8 +1,14 @@
+import copy
+import pickle
 import pytest
 import pandas as pd
 import os
+import threading
 from datetime import datetime
+from freezegun import freeze_time
 from agent.data_handler import DataHandler
+from agent.flow import END, Flow
+from agent.session_manager import SessionManager
 
 @pytest.fixture
 def data_handler(tmp_path):
@@ -65,4 +71,376 @@ def test_get_all_leads(data_handler):
     all_leads = data_handler.get_all_leads()
     assert len(all_leads) == 2
     assert all_leads["lead_1"]['name'] == "User One"
-    assert all_leads["lead_2"]['name'] == "User Two"
\ No newline at end of file
+    assert all_leads["lead_2"]['name'] == "User Two"
+
+def test_session_snapshots_are_immutable():
+    manager = SessionManager()
+    assert manager.create_session("lead_1", {'name': "User One"})
+    snapshot = manager.get_session("lead_1")
+
+    with pytest.raises(AttributeError):
+        snapshot.state = 'questioning'
+    with pytest.raises(TypeError):
+        snapshot['data']['age'] = '30'
+
+    # Later changes produce new records and leave the snapshot alone
+    manager.update_session("lead_1", {'state': 'questioning'})
+    assert manager.get_next_question("lead_1")['key'] == 'age'
+    manager.record_answer("lead_1", 'age', '30')
+    assert snapshot['state'] == 'initial'
+    assert 'age' not in snapshot['data']
+
+    session = manager.get_session("lead_1")
+    assert session['state'] == 'questioning'
+    assert session['current_question'] == 'age'
+    assert session['data'] == {'name': "User One", 'age': '30'}
+    assert session.last_activity >= snapshot.last_activity
+
+def test_sessions_copy_and_pickle_like_dicts():
+    manager = SessionManager()
+    manager.create_session("lead_1", {'name': "John"})
+    manager.update_session("lead_1", {'state': 'questioning', 'source': 'web'})
+    session = manager.get_session("lead_1")
+
+    assert copy.copy(session) is session
+    assert copy.deepcopy({'session': session})['session'] is session
+    restored = pickle.loads(pickle.dumps(session))
+    assert restored.to_record() == session.to_record()
+    assert restored['source'] == 'web' and restored.data['name'] == "John"
+
+def test_sessions_hold_only_a_flow_step():
+    manager = SessionManager()
+    manager.create_session("lead_1")
+    manager.create_sessions({"lead_2": {}, "lead_3": {}})
+
+    for lead_id in ("lead_1", "lead_2", "lead_3"):
+        assert manager.get_session(lead_id).step is None
+        # Every session is handed the same compiled question
+        assert manager.get_next_question(lead_id) is manager.questions[0]
+        assert manager.get_session(lead_id).step == 0
+    assert [question['key'] for question in manager.questions] == ['age', 'country', 'interest']
+
+def test_update_session_keeps_unknown_keys():
+    manager = SessionManager()
+    manager.create_session("lead_1")
+    manager.update_session("lead_1", {'channel': 'sms'})
+
+    session = manager.get_session("lead_1")
+    assert session['channel'] == 'sms'
+    assert session.get('missing') is None
+    assert session.to_dict()['channel'] == 'sms'
+
+def test_inactive_sessions_follow_last_activity():
+    manager = SessionManager()
+    with freeze_time("2023-01-01 12:00:00"):
+        for lead_id in ("lead_1", "lead_2", "lead_3", "lead_4"):
+            manager.create_session(lead_id)
+        # Sessions still waiting for consent never go inactive
+        for lead_id in ("lead_1", "lead_2", "lead_3"):
+            manager.update_session(lead_id, {'state': 'questioning'})
+    with freeze_time("2023-01-01 20:00:00"):
+        manager.record_answer("lead_2", 'age', '30')
+
+    with freeze_time("2023-01-02 13:00:00"):
+        assert set(manager.check_inactive_sessions(hours=24)) == {"lead_1", "lead_3"}
+        # Reporting a session does not consume its deadline
+        assert set(manager.check_inactive_sessions(hours=24)) == {"lead_1", "lead_3"}
+        manager.update_session("lead_1", {})
+        manager.end_session("lead_3")
+        assert manager.check_inactive_sessions(hours=24) == {}
+        assert set(manager.check_inactive_sessions(hours=12)) == {"lead_2"}
+
+def test_completed_sessions_leave_the_deadline_heap():
+    manager = SessionManager()
+    with freeze_time("2023-01-01 12:00:00"):
+        manager.create_session("lead_1")
+        manager.update_session("lead_1", {'state': 'questioning'})
+        for question in manager.questions:
+            manager.get_next_question("lead_1")
+            manager.record_answer("lead_1", question['key'], 'answer')
+        assert manager.get_next_question("lead_1") is None
+        assert manager.get_session("lead_1").completed
+
+    with freeze_time("2023-01-03 12:00:00"):
+        assert manager.check_inactive_sessions(hours=24) == {}
+
+def test_superseded_deadlines_are_compacted():
+    manager = SessionManager()
+    manager.create_session("lead_1")
+    manager.update_session("lead_1", {'state': 'questioning'})
+    for minute in range(200):
+        with freeze_time(f"2023-01-01 12:{minute // 60:02d}:{minute % 60:02d}"):
+            manager.update_session("lead_1", {})
+    shard = manager._shard("lead_1")
+    assert len(shard.deadlines) <= 2 * len(shard.scheduled) + 64
+
+@pytest.mark.parametrize("shards", [1, 4, 64])
+def test_sessions_are_spread_across_shards(shards):
+    manager = SessionManager(shards=shards)
+    lead_ids = [f"lead_{i}" for i in range(200)]
+    assert manager.create_sessions({lead_id: {} for lead_id in lead_ids}) == lead_ids
+    assert manager.create_sessions({"lead_0": {}}) == []
+    assert sorted(manager.sessions) == sorted(lead_ids)
+    assert sum(len(shard.resident) for shard in manager._shards) == 200
+    if shards > 1:
+        assert sum(1 for shard in manager._shards if shard.resident) > 1
+
+    with pytest.raises(ValueError):
+        SessionManager(shards=0)
+
+def test_parallel_updates_on_separate_shards():
+    manager = SessionManager(shards=8)
+    lead_ids = [f"lead_{i}" for i in range(64)]
+    manager.create_sessions({lead_id: {} for lead_id in lead_ids})
+
+    def answer(lead_id):
+        manager.update_session(lead_id, {'state': 'questioning'})
+        for question in manager.questions:
+            manager.get_next_question(lead_id)
+            manager.record_answer(lead_id, question['key'], lead_id)
+
+    threads = [threading.Thread(target=answer, args=(lead_id,)) for lead_id in lead_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for lead_id in lead_ids:
+        assert dict(manager.get_session(lead_id)['data']) == {
+            'age': lead_id, 'country': lead_id, 'interest': lead_id}
+
+def test_sessions_spill_beyond_the_memory_budget(tmp_path):
+    manager = SessionManager(shards=2, max_resident=4,
+                             spill_path=str(tmp_path / "spill.db"))
+    lead_ids = [f"lead_{i}" for i in range(20)]
+    manager.create_sessions({lead_id: {'name': lead_id} for lead_id in lead_ids})
+    manager.update_session("lead_0", {'state': 'questioning'})
+    manager.record_answer("lead_0", 'age', '30')
+
+    metrics = manager.metrics()
+    assert metrics['resident'] <= 4
+    assert metrics['resident'] + metrics['spilled'] == 20
+    assert metrics['evictions'] >= 16
+
+    # Spilled sessions come back on access with their data intact
+    for lead_id in lead_ids:
+        session = manager.get_session(lead_id)
+        assert session['data']['name'] == lead_id
+    assert manager.get_session("lead_0")['data']['age'] == '30'
+    assert manager.get_session("lead_0")['state'] == 'questioning'
+    assert manager.metrics()['faults'] > 0
+    assert not manager.create_session("lead_19")
+
+    assert manager.end_session("lead_5")
+    assert manager.get_session("lead_5") is None
+    assert manager.metrics()['resident'] + manager.metrics()['spilled'] == 19
+    manager.close()
+
+def test_spilled_sessions_still_go_inactive(tmp_path):
+    manager = SessionManager(shards=1, max_resident=1)
+    with freeze_time("2023-01-01 12:00:00"):
+        manager.create_session("lead_1")
+        manager.update_session("lead_1", {'state': 'questioning'})
+        manager.create_session("lead_2")
+    assert manager.metrics()['spilled'] == 1
+
+    with freeze_time("2023-01-02 13:00:00"):
+        inactive = manager.check_inactive_sessions(hours=24)
+    assert list(inactive) == ["lead_1"]
+    assert inactive["lead_1"]['state'] == 'questioning'
+    # Reporting does not fault the session back in
+    assert manager.metrics()['faults'] == 0
+
+def test_spilling_never_loses_a_session():
+    manager = SessionManager(shards=1, max_resident=1)
+    signed_up = datetime(2023, 1, 1, 12, 0)
+    manager.create_session("a", {'signed_up': signed_up})
+    manager.create_session("b")
+    assert manager.get_session("a")['data']['signed_up'] == signed_up
+
+    # Values the spill store cannot hold are refused before anything changes
+    with pytest.raises(TypeError):
+        manager.create_session("c", {'tags': {'vip'}})
+    with pytest.raises(TypeError):
+        manager.update_session("a", {'callback': object()})
+    assert manager.get_session("c") is None
+    assert manager.get_session("b") is not None
+    assert 'callback' not in manager.get_session("a")
+    manager.close()
+
+def test_next_deadline_tracks_earliest_session():
+    manager = SessionManager(shards=1, initial_ttl_hours=2)
+    moved = []
+    manager.on_deadline = lambda: moved.append(1)
+    assert manager.next_deadline(hours=24) is None
+
+    with freeze_time("2023-01-01 12:00:00"):
+        manager.create_session("silent")
+    assert manager.next_deadline(hours=24) == datetime(2023, 1, 1, 14, 0)
+    with freeze_time("2023-01-01 13:00:00"):
+        manager.create_session("talking")
+        manager.update_session("talking", {'state': 'questioning'})
+        manager.end_session("silent")
+    assert manager.next_deadline(hours=24) == datetime(2023, 1, 2, 13, 0)
+    assert moved
+
+    # Later activity does not move the deadline earlier, so nothing is signalled
+    moved.clear()
+    with freeze_time("2023-01-01 14:00:00"):
+        manager.update_session("talking", {})
+    assert manager.next_deadline(hours=24) == datetime(2023, 1, 2, 14, 0)
+    assert not moved
+
+def test_initial_sessions_expire_after_ttl():
+    manager = SessionManager(initial_ttl_hours=48)
+    with freeze_time("2023-01-01 12:00:00"):
+        manager.create_session("silent")
+        manager.create_session("answered")
+        manager.update_session("answered", {'state': 'questioning'})
+
+    with freeze_time("2023-01-02 12:00:00"):
+        assert manager.expire_sessions() == []
+    with freeze_time("2023-01-03 13:00:00"):
+        assert manager.expire_sessions() == ["silent"]
+    assert manager.get_session("silent") is None
+    assert manager.get_session("answered") is not None
+    assert manager.metrics()['expired'] == 1
+    assert SessionManager().expire_sessions() == []
+
+def test_sessions_survive_a_restart(tmp_path):
+    state_dir = str(tmp_path / "state")
+    manager = SessionManager(state_dir=state_dir)
+    manager.create_sessions({"lead_1": {'name': "User One"}, "lead_2": {}})
+    manager.create_session("lead_3")
+    manager.update_session("lead_1", {'state': 'questioning'})
+    manager.get_next_question("lead_1")
+    manager.record_answer("lead_1", 'age', '30')
+    manager.get_next_question("lead_1")
+    manager.end_session("lead_2")
+    before = manager.get_session("lead_1")
+    manager.flush()
+
+    # No close(): the new manager has only the journal to go on
+    restored = SessionManager(state_dir=state_dir)
+    assert sorted(restored.sessions) == ["lead_1", "lead_3"]
+    session = restored.get_session("lead_1")
+    assert dict(session.data) == {'name': "User One", 'age': '30'}
+    assert session.state == 'questioning'
+    assert session.current_question == 'country'
+    assert session.last_activity == before.last_activity
+    assert session.step == 1
+    assert restored.get_next_question("lead_1")['key'] == 'country'
+
+def test_journal_refuses_values_it_cannot_restore(tmp_path):
+    state_dir = str(tmp_path / "state")
+    manager = SessionManager(state_dir=state_dir)
+    manager.create_session("lead_1")
+    followed_up_at = datetime(2023, 1, 2, 9, 30)
+    manager.update_session("lead_1", {'followed_up_at': followed_up_at})
+    with pytest.raises(TypeError):
+        manager.update_session("lead_1", {'callback': object()})
+    assert 'callback' not in manager.get_session("lead_1")
+    manager.flush()
+
+    restored = SessionManager(state_dir=state_dir)
+    assert restored.get_session("lead_1")['followed_up_at'] == followed_up_at
+    assert restored.get_session("lead_1").to_record() == \
+        manager.get_session("lead_1").to_record()
+
+def test_restore_from_snapshot_and_torn_journal(tmp_path):
+    state_dir = tmp_path / "state"
+    manager = SessionManager(state_dir=str(state_dir))
+    manager.create_session("lead_1")
+    manager.update_session("lead_1", {'state': 'questioning'})
+    manager.close()
+    assert (state_dir / "sessions.snapshot").exists()
+    assert (state_dir / "sessions.journal").stat().st_size == 0
+
+    manager = SessionManager(state_dir=str(state_dir))
+    manager.record_answer("lead_1", 'age', '30')
+    manager.flush()
+    with open(state_dir / "sessions.journal", 'ab') as journal:
+        journal.write(b'{"op":"answer","lead_id":"lead_1","ke')
+
+    restored = SessionManager(state_dir=str(state_dir))
+    assert dict(restored.get_session("lead_1").data) == {'age': '30'}
+    assert (state_dir / "sessions.journal").read_bytes().endswith(b'}\n')
+
+def test_background_compaction_keeps_journal_short(tmp_path):
+    state_dir = tmp_path / "state"
+    manager = SessionManager(state_dir=str(state_dir), compact_threshold=2048)
+    manager.create_sessions({f"lead_{i}": {} for i in range(50)})
+    for i in range(50):
+        manager.update_session(f"lead_{i}", {'state': 'questioning'})
+        manager.record_answer(f"lead_{i}", 'age', str(i))
+    manager._compact_thread.join()
+    assert (state_dir / "sessions.snapshot").exists()
+    # 150 events were written; compaction folded earlier ones into the snapshot
+    assert len((state_dir / "sessions.journal").read_bytes().splitlines()) < 150
+
+    restored = SessionManager(state_dir=str(state_dir))
+    assert len(restored.sessions) == 50
+    assert restored.get_session("lead_42")['data']['age'] == '42'
+
+def test_interrupted_compaction_is_finished_on_restore(tmp_path):
+    state_dir = tmp_path / "state"
+    manager = SessionManager(state_dir=str(state_dir))
+    manager.create_session("lead_1")
+    manager.update_session("lead_1", {'state': 'questioning'})
+    # Simulate a crash between rotating the journal and writing the snapshot
+    manager._log.rotate()
+    manager.record_answer("lead_1", 'age', '30')
+    manager.flush()
+
+    restored = SessionManager(state_dir=str(state_dir))
+    session = restored.get_session("lead_1")
+    assert session.state == 'questioning'
+    assert session.data['age'] == '30'
+    assert not (state_dir / "sessions.journal.compacting").exists()
+    assert (state_dir / "sessions.journal").stat().st_size == 0
+
+QUALIFICATION_FLOW = [
+    {'key': 'budget', 'text': 'Budget? (A/B/C)', 'branches': {'a': 'end', 'c': 'team_size'}},
+    {'key': 'timeline', 'text': 'When do you plan to buy?'},
+    {'key': 'team_size', 'text': 'How large is your team?', 'next': 'interest'},
+    {'key': 'referral', 'text': 'How did you hear about us?'},
+    {'key': 'interest', 'text': 'What are you interested in?'},
+]
+
+def _walk(manager, lead_id, answers):
+    """Answer questions in order and return the keys that were asked."""
+    manager.create_session(lead_id)
+    asked = []
+    question = manager.get_next_question(lead_id)
+    while question is not None:
+        asked.append(question['key'])
+        manager.record_answer(lead_id, question['key'], answers[question['key']])
+        question = manager.get_next_question(lead_id)
+    assert manager.get_session(lead_id).completed
+    return asked
+
+def test_flow_branches_and_skips_questions():
+    manager = SessionManager(flow=QUALIFICATION_FLOW)
+    answers = {'budget': 'B', 'timeline': 'soon', 'team_size': '5',
+               'referral': 'ad', 'interest': 'Cloud'}
+    assert _walk(manager, "b", answers) == ['budget', 'timeline', 'team_size', 'interest']
+    assert _walk(manager, "c", {**answers, 'budget': ' c '}) == ['budget', 'team_size', 'interest']
+    assert _walk(manager, "a", {**answers, 'budget': 'A'}) == ['budget']
+
+    # Answers already in the session data are not asked again
+    manager.create_session("known", {'budget': 'b', 'timeline': 'now'})
+    assert manager.get_next_question("known")['key'] == 'team_size'
+
+def test_invalid_flows_are_rejected():
+    with pytest.raises(ValueError):
+        Flow([])
+    with pytest.raises(ValueError):
+        Flow([{'key': 'a', 'text': 'A?'}, {'key': 'a', 'text': 'Again?'}])
+    with pytest.raises(ValueError):
+        Flow([{'key': 'a', 'text': 'A?', 'branches': {'x': 'missing'}}])
+
+def test_answered_loop_ends_the_flow():
+    flow = Flow([{'key': 'a', 'text': 'A?', 'next': 'b'},
+                 {'key': 'b', 'text': 'B?', 'next': 'a'}])
+    assert flow.advance(None, {'a': '1', 'b': '2'}) == END
+    assert flow.advance(None, {'a': '1'}) == 1
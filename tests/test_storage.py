@@ -0,0 +1,325 @@
+import pytest
+import pandas as pd
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+from freezegun import freeze_time
+from agent.data_handler import DataHandler
+from agent.storage import CSVLeadStore, LeadConflictError, lead_etag
+from agent.sqlite_store import SQLiteLeadStore, migrate_csv_to_sqlite
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def sqlite_handler(tmp_path):
+    handler = DataHandler(file_path=str(tmp_path / "test_data.db"))
+    yield handler
+    handler.close()
+
+def test_backend_follows_file_extension(tmp_path, sqlite_handler):
+    assert isinstance(sqlite_handler.store, SQLiteLeadStore)
+    csv_handler = DataHandler(file_path=str(tmp_path / "test_data.csv"))
+    assert isinstance(csv_handler.store, CSVLeadStore)
+
+    explicit = DataHandler(file_path=str(tmp_path / "leads.data"), backend='sqlite')
+    assert isinstance(explicit.store, SQLiteLeadStore)
+    explicit.close()
+
+    with pytest.raises(ValueError):
+        DataHandler(file_path=str(tmp_path / "leads.data"), backend='redis')
+
+def test_sqlite_uses_wal_mode(sqlite_handler):
+    conn = sqlite3.connect(sqlite_handler.file_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    conn.close()
+
+def test_sqlite_add_update_get(sqlite_handler):
+    assert sqlite_handler.add_lead("lead_1", "User One")
+    assert not sqlite_handler.add_lead("lead_1", "User One")
+    assert pd.isna(sqlite_handler.get_lead("lead_1")['age'])
+
+    assert sqlite_handler.update_lead("lead_1", {'age': '30', 'status': 'in_progress'})
+    assert not sqlite_handler.update_lead("missing", {'age': '30'})
+
+    lead_data = sqlite_handler.get_lead("lead_1")
+    assert lead_data['age'] == '30'
+    assert lead_data['status'] == 'in_progress'
+    assert sqlite_handler.get_lead("missing") is None
+
+def test_query_matches_across_backends(tmp_path, sqlite_handler):
+    csv_handler = DataHandler(file_path=str(tmp_path / "test_data.csv"))
+    for handler in (csv_handler, sqlite_handler):
+        handler.add_lead("lead_1", "User One")
+        handler.add_lead("lead_2", "User Two")
+        handler.update_lead("lead_2", {'status': 'in_progress', 'country': 'USA'})
+
+        assert list(handler.query(status='in_progress')) == ["lead_2"]
+        assert list(handler.query(status='pending')) == ["lead_1"]
+        assert handler.query(status='in_progress', country='UK') == {}
+        with pytest.raises(ValueError):
+            handler.query(colour='red')
+
+def test_migrate_csv_to_sqlite(tmp_path):
+    csv_path = str(tmp_path / "leads.csv")
+    db_path = str(tmp_path / "leads.db")
+    csv_handler = DataHandler(file_path=csv_path)
+    csv_handler.add_lead("lead_1", "User One")
+    csv_handler.add_lead("lead_2", "User Two")
+    csv_handler.update_lead("lead_1", {'age': '30'})
+
+    assert migrate_csv_to_sqlite(csv_path, db_path) == 2
+    assert migrate_csv_to_sqlite(csv_path, db_path) == 0
+
+    handler = DataHandler(file_path=db_path)
+    assert list(handler.get_all_leads()) == ["lead_1", "lead_2"]
+    assert handler.get_lead("lead_1")['age'] == '30'
+    assert pd.isna(handler.get_lead("lead_2")['age'])
+    handler.close()
+
+def test_sqlite_batch_operations(sqlite_handler):
+    assert sqlite_handler.add_leads([("lead_1", "User One"), ("lead_2", "User Two"),
+                                     ("lead_1", "User One")]) == ["lead_1", "lead_2"]
+    assert sqlite_handler.update_leads({"lead_2": {'age': '25'},
+                                        "missing": {'age': '1'}}) == ["lead_2"]
+
+    leads = sqlite_handler.get_leads(["lead_1", "lead_2", "missing"])
+    assert set(leads) == {"lead_1", "lead_2"}
+    assert leads["lead_2"]['age'] == '25'
+
+@pytest.mark.parametrize("file_name,options", [
+    ("leads.csv", {}),
+    ("leads.csv", {'in_memory': True}),
+    ("leads.csv", {'journal': True}),
+    ("leads.db", {}),
+])
+def test_query_by_index_and_update_time(tmp_path, file_name, options):
+    handler = DataHandler(file_path=str(tmp_path / file_name), **options)
+    with freeze_time("2023-01-01 12:00:00"):
+        handler.add_leads([("lead_1", "One"), ("lead_2", "Two"), ("lead_3", "Three")])
+        handler.update_lead("lead_1", {'status': 'secured', 'interest': 'Cloud'})
+    with freeze_time("2023-01-03 12:00:00"):
+        handler.update_lead("lead_2", {'status': 'secured', 'interest': 'Cloud'})
+        handler.update_lead("lead_3", {'status': 'in_progress', 'country': 'USA'})
+
+    assert list(handler.query(status='secured', interest='Cloud')) == ["lead_1", "lead_2"]
+    assert list(handler.query(status='secured',
+                              updated_before=datetime(2023, 1, 2))) == ["lead_1"]
+    assert list(handler.query(updated_after="2023-01-02")) == ["lead_2", "lead_3"]
+    assert list(handler.query(country='USA')) == ["lead_3"]
+    assert handler.query(status='pending') == {}
+    assert list(handler.get_leads(["lead_3", "lead_2", "missing"],
+                                  status='secured')) == ["lead_2"]
+    assert handler.get_leads(["lead_1"], status='in_progress') == {}
+    with pytest.raises(ValueError):
+        handler.get_leads(["lead_1"], colour='red')
+    handler.close()
+
+def test_in_memory_indexes_follow_updates(tmp_path):
+    handler = DataHandler(file_path=str(tmp_path / "leads.csv"), in_memory=True)
+    handler.add_leads([("lead_1", "One"), ("lead_2", "Two")])
+    handler.update_lead("lead_1", {'status': 'in_progress'})
+    handler.update_leads({"lead_1": {'status': 'secured'},
+                          "lead_2": {'status': 'secured'}})
+
+    index = handler.store._index
+    assert index.values['status'] == {'secured': {"lead_1", "lead_2"}}
+    assert len(index.updated) == 2
+    assert set(handler.query(status='secured')) == {"lead_1", "lead_2"}
+    handler.close()
+
+@pytest.mark.parametrize("file_name,options", [
+    ("leads.csv", {}),
+    ("leads.csv", {'in_memory': True}),
+    ("leads.db", {}),
+])
+def test_iter_leads_and_leads_frame(tmp_path, file_name, options):
+    handler = DataHandler(file_path=str(tmp_path / file_name), **options)
+    handler.add_leads([(f"lead_{i}", f"User {i}") for i in range(5)])
+    handler.update_leads({"lead_1": {'age': '30', 'status': 'secured'},
+                          "lead_2": {'age': 'thirty'}})
+
+    streamed = list(handler.iter_leads(chunksize=2))
+    assert [row['lead_id'] for row in streamed] == [f"lead_{i}" for i in range(5)]
+    assert streamed[1]['age'] == '30'
+    assert pd.isna(streamed[0]['age'])
+
+    frame = handler.leads_frame(columns=['lead_id', 'age', 'status', 'last_updated'])
+    assert list(frame.columns) == ['lead_id', 'age', 'status', 'last_updated']
+    assert str(frame['age'].dtype) == 'Int64'
+    assert frame['age'].tolist()[:3] == [pd.NA, 30, pd.NA]
+    assert isinstance(frame['status'].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_datetime64_any_dtype(frame['last_updated'])
+
+    with pytest.raises(ValueError):
+        handler.leads_frame(columns=['colour'])
+    with pytest.raises(ValueError):
+        handler.iter_leads(chunksize=0)
+    handler.close()
+
+def test_binary_snapshot_serves_unchanged_csv(tmp_path, monkeypatch):
+    data_file = str(tmp_path / "leads.csv")
+    handler = DataHandler(file_path=data_file)
+    handler.add_lead("lead_1", "User One")
+    handler.update_lead("lead_1", {'age': '30'})
+    # Bulk reads go through pandas and leave the snapshot behind
+    handler.get_all_leads()
+    assert os.path.exists(handler.store.snapshot_path)
+
+    def fail_read_csv(*args, **kwargs):
+        raise AssertionError("CSV should not be parsed while the snapshot is fresh")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(pd, 'read_csv', fail_read_csv)
+        lead_data = DataHandler(file_path=data_file).get_all_leads()["lead_1"]
+    assert lead_data['age'] == '30'
+    assert pd.isna(lead_data['country'])
+
+def test_binary_snapshot_rebuilt_after_external_change(tmp_path):
+    data_file = str(tmp_path / "leads.csv")
+    handler = DataHandler(file_path=data_file)
+    handler.add_lead("lead_1", "User One")
+
+    # Edit the CSV behind the handler's back
+    df = pd.read_csv(data_file, dtype=str)
+    df.loc[0, 'name'] = "Edited Name"
+    df.to_csv(data_file, index=False)
+
+    assert handler.get_lead("lead_1")['name'] == "Edited Name"
+
+    # A corrupt snapshot is ignored rather than trusted
+    with open(handler.store.snapshot_path, 'wb') as snapshot:
+        snapshot.write(b'not a pickle')
+    assert handler.get_lead("lead_1")['name'] == "Edited Name"
+
+def test_binary_snapshot_can_be_disabled(tmp_path):
+    handler = DataHandler(file_path=str(tmp_path / "leads.csv"), binary_snapshot=False)
+    handler.add_lead("lead_1", "User One")
+    assert not os.path.exists(handler.store.snapshot_path)
+
+def test_single_lead_calls_skip_pandas(tmp_path):
+    data_file = str(tmp_path / "leads.csv")
+    script = (
+        "import sys\n"
+        "from agent import DataHandler\n"
+        f"handler = DataHandler(file_path={data_file!r})\n"
+        "assert handler.add_lead('lead_1', 'User, One')\n"
+        "assert not handler.add_lead('lead_1', 'User One')\n"
+        "assert handler.update_lead('lead_1', {'age': '30'})\n"
+        "assert not handler.update_lead('missing', {'age': '30'})\n"
+        "assert handler.get_lead('lead_1')['age'] == '30'\n"
+        "assert 'pandas' not in sys.modules\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    # The file written without pandas reads back the same through pandas
+    df = pd.read_csv(data_file, dtype=str)
+    assert df['name'].tolist() == ['User, One']
+    assert df['age'].tolist() == ['30']
+    assert pd.isna(df.loc[0, 'country'])
+
+def test_add_lead_after_unterminated_last_line(tmp_path):
+    data_file = str(tmp_path / "leads.csv")
+    with open(data_file, 'w') as file:
+        file.write("lead_id,name,age,country,interest,status,last_updated\n"
+                   "lead_1,User One,,,,pending,2023-01-01 12:00:00")
+
+    handler = DataHandler(file_path=data_file)
+    assert handler.add_lead("lead_2", "User Two")
+    assert list(handler.get_all_leads()) == ["lead_1", "lead_2"]
+    assert handler.get_lead("lead_1")['last_updated'] == "2023-01-01 12:00:00"
+
+def _increment_age(data_file, times):
+    handler = DataHandler(file_path=data_file)
+    for _ in range(times):
+        handler.modify_lead("counter", lambda lead: {'age': str(int(lead['age']) + 1)},
+                            retries=50)
+    handler.close()
+
+def test_concurrent_processes_do_not_lose_updates(tmp_path):
+    data_file = str(tmp_path / "leads.csv")
+    handler = DataHandler(file_path=data_file)
+    handler.add_lead("counter", "Counter")
+    handler.update_lead("counter", {'age': '0'})
+
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_increment_age, args=(data_file, 10))
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert handler.get_lead("counter")['age'] == '40'
+
+@pytest.mark.parametrize("file_name,options", [
+    ("leads.csv", {}),
+    ("leads.csv", {'in_memory': True}),
+    ("leads.db", {}),
+])
+def test_stale_etag_is_rejected(tmp_path, file_name, options):
+    handler = DataHandler(file_path=str(tmp_path / file_name), **options)
+    handler.add_lead("lead_1", "User One")
+    seen = handler.get_lead("lead_1")
+
+    with freeze_time("2030-01-01 00:00:00"):
+        handler.update_lead("lead_1", {'age': '30'})
+
+    with pytest.raises(LeadConflictError):
+        handler.update_lead("lead_1", {'age': '31'}, expected_etag=lead_etag(seen))
+    assert handler.get_lead("lead_1")['age'] == '30'
+
+    current = handler.get_lead("lead_1")
+    assert handler.update_lead("lead_1", {'age': '31'}, expected_etag=lead_etag(current))
+
+    metrics = handler.metrics()
+    assert metrics['conflicts'] == 1
+    assert metrics['lock_wait_seconds'] >= 0
+    handler.close()
+
+def test_modify_lead_retries_after_conflict(tmp_path):
+    handler = DataHandler(file_path=str(tmp_path / "leads.csv"))
+    handler.add_lead("lead_1", "User One")
+    calls = []
+
+    def modify(lead):
+        calls.append(lead['status'])
+        if len(calls) == 1:
+            # Another writer sneaks in between our read and our write
+            with freeze_time("2030-01-01 00:00:00"):
+                handler.update_lead("lead_1", {'status': 'in_progress'})
+        return {'country': 'USA'}
+
+    assert handler.modify_lead("lead_1", modify)
+    assert calls == ['pending', 'in_progress']
+    lead_data = handler.get_lead("lead_1")
+    assert lead_data['status'] == 'in_progress'
+    assert lead_data['country'] == 'USA'
+    assert not handler.modify_lead("missing", modify)
+
+@pytest.mark.parametrize("file_name,options", [
+    ("leads.csv", {}),
+    ("leads.csv", {'in_memory': True}),
+    ("leads.csv", {'journal': True}),
+    ("leads.db", {}),
+])
+def test_update_cannot_rename_lead(tmp_path, file_name, options):
+    data_file = str(tmp_path / file_name)
+    handler = DataHandler(file_path=data_file, **options)
+    handler.add_lead("old", "User One")
+
+    assert handler.update_lead("old", {'lead_id': 'new', 'age': '30'})
+    assert handler.get_lead("old")['lead_id'] == "old"
+    assert handler.get_lead("old")['age'] == '30'
+    assert handler.get_lead("new") is None
+    handler.close()
+
+    reloaded = DataHandler(file_path=data_file, **options)
+    assert reloaded.get_lead("old")['age'] == '30'
+    assert reloaded.get_lead("new") is None
+    reloaded.close()